@@ -1,5 +1,11 @@
-from .transcribe import  transcribe_audio
-from .text_to_speech import generate_speech
-from .chat import chat
-from .prompts import get_prompts
+from .transcribe import  transcribe_audio, atranscribe_audio
+from .text_to_speech import generate_speech, stream_speech, agenerate_speech, astream_speech, PCM_SAMPLE_RATE
+from .chat import chat, chat_messages, chat_stream, achat, achat_messages, achat_stream
+from .segmenter import SentenceSegmenter
+from .context import ConversationContext, count_tokens
+from .openai import get_openai_client, get_async_openai_client, close_openai_clients
+from .aio import get_loop, stop_loop
+from .prompts import get_prompts, PromptTemplate, PromptRegistry
+from .response_cache import ResponseCache
+from .semantic_cache import SemanticCache, SemanticMatch, load_embedder
 from .ai_manager import AIManager
\ No newline at end of file
@@ -1,17 +1,29 @@
 import logging
 import os
+import asyncio
+import threading
+from collections import defaultdict
 from pathlib import Path
 
-from .chat import chat
-from .openai import init_openai_client
+from .aio import run, iterate, get_loop
+from .chat import achat, achat_messages, achat_stream, build_messages
+from .context import ConversationContext
+from .openai import get_openai_client, get_async_openai_client
 from .prompts import get_prompts
-from .text_to_speech import generate_speech
-from .transcribe import transcribe_audio
+from .response_cache import create_response_cache
+from .semantic_cache import create_semantic_cache
+from .text_to_speech import agenerate_speech, astream_speech
+from .transcribe import atranscribe_audio
 
 class AIManager:
     """
     Wrapper class for AI Manager functionality.
     Initializes OpenAI client and provides access to all functions.
+    
+    Requests are made with the async client on the shared event loop of
+    ai_manager.aio: the a-prefixed methods are coroutines to await from
+    async code, the others block the calling thread until the result is
+    there.
     """
     
     def __init__(self, config):
@@ -22,14 +34,25 @@ class AIManager:
             config: Configuration object with OpenAI settings
         """
         self.config = config
-        self.client = init_openai_client(config)
+        # Shared with every other user of the same settings, see get_openai_client
+        self.client = get_openai_client(config)
+        self.aclient = get_async_openai_client(config)
         self.prompts = get_prompts(config)
         self.logger = logging.getLogger(__name__)
+        # Answers of the prompts opted in with response_cache_prompts
+        self.response_cache = create_response_cache(config)
+        self.cached_prompts = frozenset(getattr(config, 'response_cache_prompts', None) or ())
+        # Answers to utterances with the same meaning, for the prompts in semantic_cache_prompts
+        self.semantic_cache = create_semantic_cache(config)
+        self.semantic_prompts = frozenset(getattr(config, 'semantic_cache_prompts', None) or ())
+        # Entries whose answer is being synthesized
+        self.synthesizing = set()
+        self.synthesizing_lock = threading.Lock()
         
-        if not self.client:
+        if not self.aclient:
             self.logger.error("Failed to initialize OpenAI client")
-            
-    def chat(self, prompt_name, data={}, model=None):
+    
+    def chat(self, prompt_name, data={}, model=None, utterance=None):
         """
         Generate chat completion.
         
@@ -37,21 +60,269 @@ class AIManager:
             prompt_name: Name of the prompt to use
             data: Dictionary of data to format the prompt with
             model: OpenAI model to use (defaults to config value)
+            utterance: What the caller said, answered from the semantic cache
+                when the prompt is in semantic_cache_prompts, for the same data only
             
         Returns:
             Generated text or None on failure
         """
+        return run(self.achat(prompt_name, data, model, utterance))
+    
+    async def achat(self, prompt_name, data=None, model=None, utterance=None):
+        """Generate chat completion, see chat"""
+        if utterance and self.is_semantic(prompt_name):
+            match = await self.alookup_answer(prompt_name, utterance, data)
+            if match is not None:
+                return match.answer
+            result = await self.achat(prompt_name, data, model)
+            if result:
+                await asyncio.get_running_loop().run_in_executor(None, self.store_answer, prompt_name, utterance, result, data)
+            return result
+            
         if not model:
             model = self.config.openai.chat_model
             
-        return chat(
+        if self.is_cached(prompt_name):
+            messages = build_messages(prompt_name, data, self.prompts)
+            if not messages:
+                return None
+            return await self.achat_messages(messages, model, cache=True)
+            
+        return await achat(
             prompt_name=prompt_name,
             data=data,
             model=model,
-            client=self.client,
+            client=self.aclient,
             prompts=self.prompts
         )
     
+    def chat_messages(self, messages, model=None, cache=False):
+        """
+        Generate a reply to a role tagged message history.
+        
+        Args:
+            messages: Message dicts, e.g. ConversationContext.messages()
+            model: OpenAI model to use (defaults to config value)
+            cache: Answer from and store in the response cache
+            
+        Returns:
+            Generated text or None on failure
+        """
+        return run(self.achat_messages(messages, model, cache))
+    
+    async def achat_messages(self, messages, model=None, cache=False):
+        """Generate a reply to a role tagged message history, see chat_messages"""
+        if not model:
+            model = self.config.openai.chat_model
+            
+        key = None
+        if cache and self.response_cache is not None:
+            key = self.response_cache.key(model, messages)
+            result = await self.aget_response(key)
+            if result is not None:
+                return result
+            
+        result = await achat_messages(
+            messages=messages,
+            model=model,
+            client=self.aclient
+        )
+        if key is not None and result:
+            await self.aput_response(key, result, model)
+        return result
+    
+    def chat_stream(self, messages, model=None, cache=False):
+        """
+        Generate a reply to a role tagged message history, token by token.
+        
+        Args:
+            messages: Message dicts, e.g. ConversationContext.messages()
+            model: OpenAI model to use (defaults to config value)
+            cache: Answer from and store in the response cache
+            
+        Returns:
+            Generator of text pieces, closing it ends the request
+        """
+        return iterate(self.achat_stream(messages, model, cache))
+    
+    async def achat_stream(self, messages, model=None, cache=False):
+        """
+        Generate a reply token by token, see chat_stream
+        
+        Yields:
+            Text pieces, a cached answer in one piece
+        """
+        if not model:
+            model = self.config.openai.chat_model
+            
+        key = None
+        if cache and self.response_cache is not None:
+            key = self.response_cache.key(model, messages)
+            result = await self.aget_response(key)
+            if result is not None:
+                yield result
+                return
+            
+        parts = []
+        finished = []
+        async for piece in achat_stream(messages=messages, model=model, client=self.aclient, on_finish=finished.append):
+            parts.append(piece)
+            yield piece
+        # Only replies the model completed are stored, not ones cut off by an error or the length limit
+        if key is not None and finished == ["stop"]:
+            await self.aput_response(key, "".join(parts).strip(), model)
+    
+    async def aget_response(self, key):
+        """Get an answer from the response cache, SQLite is read on a worker thread"""
+        result = self.response_cache.get_memory(key)
+        if result is None:
+            result = await asyncio.get_running_loop().run_in_executor(None, self.response_cache.get_stored, key)
+        return result
+    
+    async def aput_response(self, key, response, model):
+        """Store an answer in the response cache, SQLite is written on a worker thread"""
+        await asyncio.get_running_loop().run_in_executor(None, self.response_cache.put, key, response, model)
+    
+    def is_cached(self, prompt_name):
+        """True if answers to a prompt are taken from the response cache"""
+        return self.response_cache is not None and prompt_name in self.cached_prompts
+    
+    def is_semantic(self, prompt_name):
+        """True if answers to a prompt are looked up by the meaning of the utterance"""
+        return self.semantic_cache is not None and prompt_name in self.semantic_prompts
+    
+    def lookup_answer(self, prompt_name, utterance, context=None):
+        """
+        Find a cached answer to an utterance with the same meaning.
+        
+        The first time an answer is reused its WAV is synthesized in the
+        background, so answers given only once are never synthesized.
+        
+        Args:
+            prompt_name: Prompt the answer was made with
+            utterance: What the caller said
+            context: What the answer depends on besides the utterance, e.g.
+                the messages before it, only answers with the same context match
+            
+        Returns:
+            SemanticMatch with the answer and the path of its WAV (None until
+            synthesized), or None on a miss or when the prompt is not cached
+        """
+        if not utterance or not self.is_semantic(prompt_name):
+            return None
+        try:
+            match = self.semantic_cache.lookup(prompt_name, utterance, context)
+        except Exception as e:
+            self.logger.error(f"Error looking up semantic cache: {e}")
+            return None
+        if match is not None and match.audio_path is None:
+            self.synthesize_answer(match)
+        return match
+    
+    async def alookup_answer(self, prompt_name, utterance, context=None):
+        """Find a cached answer to an utterance, the embedding runs on a worker thread"""
+        return await asyncio.get_running_loop().run_in_executor(None, self.lookup_answer, prompt_name, utterance, context)
+    
+    def store_answer(self, prompt_name, utterance, answer, context=None):
+        """
+        Keep the answer to an utterance in the semantic cache.
+        
+        Args:
+            prompt_name: Prompt the answer was made with
+            utterance: What the caller said
+            answer: The answer given
+            context: What the answer depends on besides the utterance, see lookup_answer
+            
+        Returns:
+            ID of the entry or None when the prompt is not cached
+        """
+        if not utterance or not answer or not self.is_semantic(prompt_name):
+            return None
+        try:
+            return self.semantic_cache.store(prompt_name, utterance, answer, context)
+        except Exception as e:
+            self.logger.error(f"Error storing in semantic cache: {e}")
+            return None
+    
+    def synthesize_answer(self, match):
+        """Synthesize a cached answer in the background unless it already is being synthesized"""
+        with self.synthesizing_lock:
+            if match.entry_id in self.synthesizing:
+                return
+            self.synthesizing.add(match.entry_id)
+        asyncio.run_coroutine_threadsafe(self.asynthesize_answer(match.entry_id, match.answer), get_loop())
+    
+    async def asynthesize_answer(self, entry_id, answer):
+        """Synthesize a cached answer and attach the WAV to its entry"""
+        try:
+            output_path = Path(self.config.output_dir) / "semantic_cache" / f"answer_{entry_id}.wav"
+            path = await self.agenerate_speech(answer, output_path=output_path)
+            if path:
+                await asyncio.get_running_loop().run_in_executor(None, self.semantic_cache.set_audio, entry_id, path)
+        finally:
+            with self.synthesizing_lock:
+                self.synthesizing.discard(entry_id)
+    
+    def semantic_cache_metrics(self):
+        """Get the hit/miss counters of the semantic cache, None when it is off"""
+        return self.semantic_cache.get_metrics() if self.semantic_cache is not None else None
+    
+    def response_cache_metrics(self):
+        """Get the hit/miss counters of the response cache, None when it is off"""
+        return self.response_cache.get_metrics() if self.response_cache is not None else None
+    
+    def create_context(self, prompt_name, budget=3000, summarize=False):
+        """
+        Create the message history of a conversation.
+        
+        Args:
+            prompt_name: Prompt whose system part (or text) becomes the system message
+            budget: Tokens the history may use
+            summarize: Summarize dropped turns instead of forgetting them
+            
+        Returns:
+            ConversationContext
+        """
+        prompt = self.prompts.get(prompt_name)
+        if prompt is not None and prompt.text is None:
+            system = prompt.system
+        elif prompt is not None:
+            # Placeholders of a standard prompt are filled by the history itself
+            system = prompt.text.format_map(defaultdict(str)).strip()
+        else:
+            self.logger.warning(f"Prompt '{prompt_name}' not found, context has no system message")
+            system = None
+            
+        return ConversationContext(
+            system=system,
+            budget=budget,
+            model=self.config.openai.chat_model,
+            summarizer=self.summarize if summarize else None
+        )
+    
+    def summarize(self, summary, messages):
+        """
+        Fold turns dropped from a context into its running summary, in the background.
+        
+        Args:
+            summary: Summary so far or None
+            messages: Dropped message dicts
+            
+        Returns:
+            concurrent.futures.Future of the new summary text (None on failure)
+        """
+        return asyncio.run_coroutine_threadsafe(self.asummarize(summary, messages), get_loop())
+    
+    async def asummarize(self, summary, messages):
+        """Fold dropped turns into a summary, see summarize"""
+        transcript = "\n".join(f"{msg['role']}: {msg['content']}" for msg in messages)
+        if summary:
+            transcript = f"Earlier summary: {summary}\n{transcript}"
+        return await self.achat_messages([
+            {"role": "system", "content": "Summarize this phone conversation in a few sentences. Keep names, numbers and anything the caller asked for."},
+            {"role": "user", "content": transcript},
+        ])
+    
     def generate_speech(self, text, voice=None, model=None, output_path=None):
         """
         Generate speech from text.
@@ -63,8 +334,12 @@ class AIManager:
             output_path: Path where to save WAV file (optional)
             
         Returns:
-            True on success or None on failure
+            Path of the WAV file on success or None on failure
         """
+        return run(self.agenerate_speech(text, voice, model, output_path))
+    
+    async def agenerate_speech(self, text, voice=None, model=None, output_path=None):
+        """Generate speech from text, see generate_speech"""
         if not voice:
             voice = self.config.openai.tts_voice
             
@@ -74,15 +349,46 @@ class AIManager:
         if not output_path:
             # Generate a default output path if none provided
             output_dir = Path(self.config.output_dir) / "speech"
-            output_dir.mkdir(parents=True, exist_ok=True)
             output_path = output_dir / f"speech_{os.urandom(4).hex()}.wav"
             
-        return generate_speech(
+        return await agenerate_speech(
             text=text,
             voice=voice,
             model=model,
             output_path=str(output_path),
-            client=self.client
+            client=self.aclient
+        )
+    
+    def stream_speech(self, text, on_audio, voice=None, model=None):
+        """
+        Generate speech from text, passing the audio on while it is synthesized.
+        
+        Args:
+            text: Text to convert to speech
+            on_audio: Called with each chunk of raw PCM (16 bit mono, 24 kHz),
+                on the event loop thread so it must not block
+            voice: Voice to use (defaults to config value)
+            model: TTS model to use (defaults to config value)
+            
+        Returns:
+            Number of PCM bytes produced or None on failure
+        """
+        return run(self.astream_speech(text, on_audio, voice, model))
+    
+    async def astream_speech(self, text, on_audio, voice=None, model=None):
+        """Generate speech from text while passing the audio on, see stream_speech"""
+        if not voice:
+            voice = self.config.openai.tts_voice
+            
+        if not model:
+            model = self.config.openai.tts_model
+            
+        return await astream_speech(
+            text=text,
+            voice=voice,
+            model=model,
+            on_audio=on_audio,
+            client=self.aclient
         )
     
     def transcribe_audio(self, audio_data=None, audio_path=None):
@@ -96,17 +402,22 @@ class AIManager:
         Returns:
             Transcribed text or None on failure
         """
-        return transcribe_audio(
+        return run(self.atranscribe(audio_data, audio_path))
+    
+    async def atranscribe(self, audio_data=None, audio_path=None):
+        """Transcribe audio using Whisper API, see transcribe_audio"""
+        return await atranscribe_audio(
             audio_data=audio_data,
             audio_path=audio_path,
-            client=self.client
+            client=self.aclient,
+            model=getattr(self.config.openai, 'whisper_model', "whisper-1")
         )
-        
+    
     def get_prompts(self):
         """
         Get available prompts.
         
         Returns:
-            Dictionary of prompts
+            PromptRegistry of the compiled prompts by name
         """
-        return self.prompts
\ No newline at end of file
+        return self.prompts
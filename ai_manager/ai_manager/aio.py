@@ -0,0 +1,102 @@
+import asyncio
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# The loop all async OpenAI requests of the process run on, see get_loop
+loop = None
+loop_thread = None
+loop_lock = threading.Lock()
+
+
+def get_loop():
+    """
+    Get the shared event loop, started on a daemon thread on first use.
+
+    Requests of every call run on this one loop, so any number of them can
+    be in flight without a blocked thread each, and the async client's
+    connections stay with the loop that opened them.
+
+    Returns:
+        asyncio.AbstractEventLoop: The running loop
+    """
+    global loop, loop_thread
+    with loop_lock:
+        if loop is None or loop.is_closed():
+            loop = asyncio.new_event_loop()
+            ready = threading.Event()
+            loop_thread = threading.Thread(target=run_loop, args=(loop, ready), name="ai-loop", daemon=True)
+            loop_thread.start()
+            ready.wait()
+            logger.info("Started the AI event loop")
+        return loop
+
+
+def run_loop(event_loop, ready):
+    asyncio.set_event_loop(event_loop)
+    event_loop.call_soon(ready.set)
+    event_loop.run_forever()
+
+
+def in_loop():
+    """True when called on the shared loop's thread"""
+    return loop_thread is not None and threading.current_thread() is loop_thread
+
+
+def run(coro, timeout=None):
+    """
+    Run a coroutine on the shared loop and wait for its result
+
+    Args:
+        coro: Coroutine to run
+        timeout: Seconds to wait, the coroutine is cancelled when they pass
+
+    Returns:
+        The result of the coroutine
+    """
+    if in_loop():
+        coro.close()
+        raise RuntimeError("Blocking call on the AI event loop, await the async method instead")
+    future = asyncio.run_coroutine_threadsafe(coro, get_loop())
+    try:
+        return future.result(timeout)
+    except Exception:
+        future.cancel()
+        raise
+
+
+def iterate(agen):
+    """
+    Iterate over an async generator from synchronous code
+
+    Args:
+        agen: Async generator, run on the shared loop
+
+    Yields:
+        The items of the generator. Closing the iterator closes the generator.
+    """
+    event_loop = get_loop()
+    try:
+        while True:
+            try:
+                item = asyncio.run_coroutine_threadsafe(agen.__anext__(), event_loop).result()
+            except StopAsyncIteration:
+                return
+            yield item
+    finally:
+        asyncio.run_coroutine_threadsafe(agen.aclose(), event_loop).result()
+
+
+def stop_loop(timeout=5):
+    """Stop the shared loop and wait for its thread"""
+    global loop, loop_thread
+    with loop_lock:
+        event_loop, thread = loop, loop_thread
+        loop = loop_thread = None
+    if event_loop is None:
+        return
+    event_loop.call_soon_threadsafe(event_loop.stop)
+    thread.join(timeout)
+    if not event_loop.is_running():
+        event_loop.close()
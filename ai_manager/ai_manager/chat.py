@@ -5,22 +5,25 @@ import requests
 from datetime import datetime
 import openai
 import logging
+from .prompts import PromptTemplate
 
 logger = logging.getLogger(__name__)
 
-def chat(prompt_name, data={}, model=None, client=None,prompts=None):
-    messages = []
-    try:
-        if not data:
-            data = {}
-        logging.info(f"Generating content with data: {data}")
+def build_messages(prompt_name, data=None, prompts=None):
+    """
+    Build the messages of a named prompt filled in with data
 
-        if not client:
-            logger.error("No OpenAI client available")
-            return None
+    Args:
+        prompt_name: Name of the prompt
+        data: Values of the prompt's placeholders
+        prompts: Available prompts, PromptTemplates or plain text/dict prompts
 
+    Returns:
+        list: Message dicts or None when the prompt or a value is missing
+    """
+    try:
         # Validate prompt existence
-        if prompt_name not in prompts:
+        if not prompts or prompt_name not in prompts:
             logging.error(f"Prompt '{prompt_name}' not found in available prompts.")
             return None
 
@@ -29,46 +32,35 @@ def chat(prompt_name, data={}, model=None, client=None,prompts=None):
             logging.error(f"Prompt '{prompt_name}' exists but is None.")
             return None
 
-        # Extract placeholders from the prompt
-        def extract_placeholders(prompt_text):
-            if not prompt_text:  # Handle None or empty string
-                return []
-            return re.findall(r'{(.*?)}', prompt_text)
-
-        required_keys = set()
-        if isinstance(prompt, dict):
-            if 'user' in prompt and prompt['user']:
-                required_keys.update(extract_placeholders(prompt['user']))
-        elif prompt:  # Only process if prompt is not None or empty
-            required_keys.update(extract_placeholders(prompt))
-
-        # Check if all required keys are present in the data
-        missing_keys = required_keys - set(data.keys())
-        if missing_keys:
-            logging.error(f"Missing required data keys for formatting: {missing_keys}")
+        # Prompts from get_prompts are compiled already
+        if not isinstance(prompt, PromptTemplate):
+            prompt = PromptTemplate.from_prompt(prompt_name, prompt)
+        return prompt.messages(data)
+
+    except KeyError as key_err:
+        logging.error(f"KeyError: Missing data for formatting - {key_err}")
+
+    return None
+
+
+def log_usage(response):
+    """Log the tokens a completion used, including those served from the prompt cache"""
+    usage = getattr(response, 'usage', None)
+    if usage is not None:
+        cached = getattr(getattr(usage, 'prompt_tokens_details', None), 'cached_tokens', None)
+        logger.debug(f"Chat usage: {usage.prompt_tokens} prompt tokens ({cached} cached), {usage.completion_tokens} completion tokens")
+
+
+def chat(prompt_name, data={}, model=None, client=None,prompts=None):
+    try:
+        logging.info(f"Generating content with data: {data}")
+
+        if not client:
+            logger.error("No OpenAI client available")
             return None
 
-        # Build messages based on prompt structure
-        if isinstance(prompt, dict):
-            if 'system' in prompt and prompt['system']:
-                messages.append({
-                    "role": "system",
-                    "content": prompt['system']
-                })
-            if 'user' in prompt and prompt['user']:
-                messages.append({
-                    "role": "user",
-                    "content": prompt['user'].format(**data)
-                })
-        elif prompt:  # Only process if prompt is not None or empty
-            messages.append({
-                "role": "user",
-                "content": prompt.format(**data)
-            })
-
-        # Check if messages is empty
+        messages = build_messages(prompt_name, data, prompts)
         if not messages:
-            logging.error("No messages created from prompt")
             return None
 
         # Send request to the OpenAI client
@@ -81,10 +73,201 @@ def chat(prompt_name, data={}, model=None, client=None,prompts=None):
         logging.info("Content generation successful.")
         return result
 
-    except KeyError as key_err:
-        logging.error(f"KeyError: Missing data for formatting - {key_err}")
     except Exception as ex:
         logging.error(f"Error during content generation: {ex}")
 
     return None
 
+
+async def achat(prompt_name, data=None, model=None, client=None, prompts=None):
+    """
+    Generate content from a named prompt, see chat
+
+    Args:
+        prompt_name: Name of the prompt
+        data: Values of the prompt's placeholders
+        model: OpenAI model to use
+        client: AsyncOpenAI client
+        prompts: Available prompts
+
+    Returns:
+        str: Generated text or None on failure
+    """
+    try:
+        logging.info(f"Generating content with data: {data}")
+
+        if not client:
+            logger.error("No OpenAI client available")
+            return None
+
+        messages = build_messages(prompt_name, data, prompts)
+        if not messages:
+            return None
+
+        response = await client.chat.completions.create(
+            model=model,
+            messages=messages
+        )
+
+        result = response.choices[0].message.content.strip()
+        logging.info("Content generation successful.")
+        return result
+
+    except Exception as ex:
+        logging.error(f"Error during content generation: {ex}")
+
+    return None
+
+
+def chat_messages(messages, model=None, client=None):
+    """
+    Generate a reply to a prepared message history.
+
+    Args:
+        messages: Message dicts with role and content, e.g. from ConversationContext
+        model: OpenAI model to use
+        client: OpenAI client
+
+    Returns:
+        str: Generated text or None on failure
+    """
+    try:
+        if not client:
+            logger.error("No OpenAI client available")
+            return None
+
+        if not messages:
+            logger.error("No messages to send")
+            return None
+
+        response = client.chat.completions.create(
+            model=model,
+            messages=messages
+        )
+
+        log_usage(response)
+        return response.choices[0].message.content.strip()
+
+    except Exception as ex:
+        logger.error(f"Error during chat completion: {ex}")
+
+    return None
+
+
+def chat_stream(messages, model=None, client=None):
+    """
+    Generate a reply to a prepared message history, token by token.
+
+    Args:
+        messages: Message dicts with role and content
+        model: OpenAI model to use
+        client: OpenAI client
+
+    Yields:
+        str: Pieces of the reply as they are generated, stops early on failure
+    """
+    try:
+        if not client:
+            logger.error("No OpenAI client available")
+            return
+
+        if not messages:
+            logger.error("No messages to send")
+            return
+
+        stream = client.chat.completions.create(
+            model=model,
+            messages=messages,
+            stream=True
+        )
+
+        for chunk in stream:
+            if not chunk.choices:
+                continue
+            content = chunk.choices[0].delta.content
+            if content:
+                yield content
+
+    except Exception as ex:
+        logger.error(f"Error during streaming chat completion: {ex}")
+
+
+async def achat_messages(messages, model=None, client=None):
+    """
+    Generate a reply to a prepared message history, see chat_messages
+
+    Args:
+        messages: Message dicts with role and content
+        model: OpenAI model to use
+        client: AsyncOpenAI client
+
+    Returns:
+        str: Generated text or None on failure
+    """
+    try:
+        if not client:
+            logger.error("No OpenAI client available")
+            return None
+
+        if not messages:
+            logger.error("No messages to send")
+            return None
+
+        response = await client.chat.completions.create(
+            model=model,
+            messages=messages
+        )
+
+        log_usage(response)
+        return response.choices[0].message.content.strip()
+
+    except Exception as ex:
+        logger.error(f"Error during chat completion: {ex}")
+
+    return None
+
+
+async def achat_stream(messages, model=None, client=None, on_finish=None):
+    """
+    Generate a reply to a prepared message history token by token, see chat_stream
+
+    Args:
+        messages: Message dicts with role and content
+        model: OpenAI model to use
+        client: AsyncOpenAI client
+        on_finish: Called with the finish reason when the model ends the reply
+
+    Yields:
+        str: Pieces of the reply as they are generated, stops early on failure
+    """
+    try:
+        if not client:
+            logger.error("No OpenAI client available")
+            return
+
+        if not messages:
+            logger.error("No messages to send")
+            return
+
+        stream = await client.chat.completions.create(
+            model=model,
+            messages=messages,
+            stream=True
+        )
+
+        try:
+            async for chunk in stream:
+                if not chunk.choices:
+                    continue
+                content = chunk.choices[0].delta.content
+                if content:
+                    yield content
+                finish_reason = chunk.choices[0].finish_reason
+                if finish_reason and on_finish:
+                    on_finish(finish_reason)
+        finally:
+            # Also closes the HTTP stream of a reply that is abandoned
+            await stream.close()
+
+    except Exception as ex:
+        logger.error(f"Error during streaming chat completion: {ex}")
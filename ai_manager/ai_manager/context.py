@@ -0,0 +1,183 @@
+import logging
+import functools
+
+logger = logging.getLogger(__name__)
+
+# Tokens added per message by the chat format (role, separators)
+MESSAGE_OVERHEAD = 4
+
+
+@functools.lru_cache(maxsize=16)
+def get_encoder(model):
+    """
+    Get the tokenizer of a model, loaded once per model
+
+    Args:
+        model: OpenAI model name
+
+    Returns:
+        The tiktoken encoding or None if tiktoken is not installed
+    """
+    try:
+        import tiktoken
+    except ImportError:
+        logger.warning("tiktoken is not installed (pip install tiktoken), estimating tokens from text length")
+        return None
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+
+
+def count_tokens(text, model=None):
+    """
+    Count the tokens of a text
+
+    Args:
+        text: Text to count
+        model: Model whose tokenizer is used
+
+    Returns:
+        int: Number of tokens, estimated as 4 characters per token without tiktoken
+    """
+    if not text:
+        return 0
+    encoder = get_encoder(model or "gpt-4o")
+    if encoder is None:
+        return len(text) // 4 + 1
+    return len(encoder.encode(text))
+
+
+class ContextMessage:
+    """A message of the context with its token count"""
+
+    __slots__ = ('role', 'content', 'tokens')
+
+    def __init__(self, role, content, model=None):
+        self.role = role
+        self.content = content
+        self.tokens = count_tokens(content, model) + MESSAGE_OVERHEAD
+
+    def to_dict(self):
+        return {"role": self.role, "content": self.content}
+
+
+class ConversationContext:
+    """
+    Role tagged message history of one conversation kept under a token budget.
+
+    Messages are sent as system prompt, summary of the dropped turns (if
+    any) and then the turns in order. When the budget is exceeded the
+    oldest turns are dropped, in one go down to low_water of the budget,
+    so the prefix sent to the model only changes now and then and provider
+    side prompt caching keeps working between trims. A summarizer can fold
+    the dropped turns into the summary instead of losing them. It runs in
+    the background, the new summary is applied when the next turn is added,
+    so a trim never waits for the model.
+    """
+
+    def __init__(self, system=None, budget=3000, model=None, low_water=0.75, keep_recent=2, summarizer=None):
+        """
+        Args:
+            system: System prompt, always sent first
+            budget: Tokens the messages may use
+            model: Model whose tokenizer counts the tokens
+            low_water: Fraction of the budget left after trimming
+            keep_recent: Turns that are never dropped
+            summarizer: Called with (summary, dropped messages), returns a
+                concurrent.futures.Future of the new summary text
+        """
+        self.model = model
+        self.budget = budget
+        self.low_water = low_water
+        self.keep_recent = keep_recent
+        self.summarizer = summarizer
+        self.system = ContextMessage("system", system, model) if system else None
+        self.summary = None
+        # Future of the summary being made and the dropped turns waiting for the next one
+        self.summarizing = None
+        self.unsummarized = []
+        self.turns = []
+        self.tokens = self.system.tokens if self.system else 0
+        self.trimmed = 0
+
+    def add(self, role, content):
+        """
+        Append a turn and trim the history if it is over budget
+
+        Args:
+            role: user or assistant
+            content: Text of the turn
+        """
+        if not content:
+            return
+        self.apply_summary()
+        message = ContextMessage(role, content, self.model)
+        self.turns.append(message)
+        self.tokens += message.tokens
+        if self.tokens > self.budget:
+            self.trim()
+
+    def trim(self):
+        """Drop the oldest turns until the history is down to the low water mark"""
+        target = int(self.budget * self.low_water)
+        dropped = []
+        while self.tokens > target and len(self.turns) > self.keep_recent:
+            message = self.turns.pop(0)
+            self.tokens -= message.tokens
+            dropped.append(message)
+        if not dropped:
+            return
+        self.trimmed += len(dropped)
+        logger.debug(f"Dropped {len(dropped)} turns from the context, {self.tokens} tokens left")
+
+        if self.summarizer:
+            self.unsummarized.extend(message.to_dict() for message in dropped)
+            self.summarize()
+
+    def summarize(self):
+        """Start summarizing the dropped turns unless a summary is being made"""
+        if self.summarizing is not None or not self.unsummarized:
+            return
+        dropped, self.unsummarized = self.unsummarized, []
+        try:
+            self.summarizing = self.summarizer(self.summary.content if self.summary else None, dropped)
+        except Exception as e:
+            logger.error(f"Error summarizing the context: {e}")
+
+    def apply_summary(self):
+        """Replace the summary once the one being made is done"""
+        future = self.summarizing
+        if future is None or not future.done():
+            return
+        self.summarizing = None
+        try:
+            text = future.result()
+        except Exception as e:
+            logger.error(f"Error summarizing the context: {e}")
+            text = None
+        if text:
+            if self.summary:
+                self.tokens -= self.summary.tokens
+            self.summary = ContextMessage("system", f"Summary of the conversation so far: {text}", self.model)
+            self.tokens += self.summary.tokens
+        # Turns dropped while it was being made
+        self.summarize()
+
+    def messages(self):
+        """
+        Get the messages to send to the model
+
+        Returns:
+            list: Message dicts with role and content
+        """
+        result = []
+        if self.system:
+            result.append(self.system.to_dict())
+        if self.summary:
+            result.append(self.summary.to_dict())
+        result.extend(message.to_dict() for message in self.turns)
+        return result
+
+    def __len__(self):
+        return len(self.turns)
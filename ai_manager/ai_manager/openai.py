@@ -1,27 +1,170 @@
 from openai import OpenAI
+import openai
 import logging
+import threading
 
 logger = logging.getLogger(__name__)
 
+# Shared clients by their settings, see get_openai_client
+clients = {}
+async_clients = {}
+clients_lock = threading.Lock()
+
+
+def client_settings(config):
+    """
+    Get the settings a client is built from
+
+    Args:
+        config: Configuration object with openai settings
+
+    Returns:
+        tuple: Hashable settings, equal configurations share a client
+    """
+    options = config.openai
+    return (
+        options.api_key,
+        getattr(options, 'organization_id', None),
+        getattr(options, 'base_url', None),
+        getattr(options, 'max_connections', 100),
+        getattr(options, 'max_keepalive_connections', 20),
+        getattr(options, 'keepalive_expiry', 60.0),
+        getattr(options, 'timeout', 60.0),
+        getattr(options, 'connect_timeout', 5.0),
+        getattr(options, 'max_retries', 2),
+    )
+
+
+def build_client(config, client_class, http_client_class):
+    """
+    Build a client with a tuned connection pool
+
+    Args:
+        config: Configuration object with openai settings
+        client_class: OpenAI or AsyncOpenAI
+        http_client_class: httpx client class matching client_class
+    """
+    import httpx
+    (api_key, organization, base_url, max_connections, max_keepalive,
+     keepalive_expiry, timeout, connect_timeout, max_retries) = client_settings(config)
+    timeout = httpx.Timeout(timeout, connect=connect_timeout)
+    http_client = http_client_class(
+        limits=httpx.Limits(max_connections=max_connections,
+                            max_keepalive_connections=max_keepalive,
+                            keepalive_expiry=keepalive_expiry),
+        timeout=timeout
+    )
+    return client_class(
+        api_key=api_key,
+        organization=organization,
+        base_url=base_url,
+        timeout=timeout,
+        max_retries=max_retries,
+        http_client=http_client
+    )
 
 
 def init_openai_client(config):
     """
-    Initialize the OpenAI client using configuration.
-    
+    Initialize an OpenAI client using configuration.
+
+    The client keeps up to max_keepalive_connections connections open for
+    keepalive_expiry seconds, so requests reuse them instead of paying a
+    TCP and TLS handshake each.
+
     Args:
         config: Configuration object with openai settings
-        
+
     Returns:
         OpenAI: Initialized OpenAI client or None on failure
     """
     try:
-        # Access configuration using dot notation
-        client = OpenAI(
-            api_key=config.openai.api_key,
-            organization=config.openai.organization_id
-        )
-        return client
+        # DefaultHttpxClient keeps the SDK's own httpx defaults (redirects, ...)
+        return build_client(config, OpenAI, openai.DefaultHttpxClient)
     except Exception as e:
         logger.error(f"Error initializing OpenAI client: {e}")
-        return None
\ No newline at end of file
+        return None
+
+
+def init_async_openai_client(config):
+    """
+    Initialize an AsyncOpenAI client using configuration, see init_openai_client.
+    Its connections belong to the event loop it is used on, the shared
+    one of ai_manager.aio.
+
+    Args:
+        config: Configuration object with openai settings
+
+    Returns:
+        AsyncOpenAI: Initialized client or None on failure
+    """
+    try:
+        return build_client(config, openai.AsyncOpenAI, openai.DefaultAsyncHttpxClient)
+    except Exception as e:
+        logger.error(f"Error initializing async OpenAI client: {e}")
+        return None
+
+
+def shared_client(registry, config, init):
+    try:
+        key = client_settings(config)
+    except Exception as e:
+        logger.error(f"Error reading OpenAI settings: {e}")
+        return None
+    with clients_lock:
+        client = registry.get(key)
+        if client is None:
+            client = init(config)
+            if client is not None:
+                registry[key] = client
+                logger.info(f"Created shared {type(client).__name__} client, {len(registry)} in use")
+    return client
+
+
+def get_openai_client(config):
+    """
+    Get the process wide OpenAI client for a configuration, created on
+    first use. Every caller with the same settings shares one client and
+    with it one connection pool.
+
+    Args:
+        config: Configuration object with openai settings
+
+    Returns:
+        OpenAI: Shared OpenAI client or None on failure
+    """
+    return shared_client(clients, config, init_openai_client)
+
+
+def get_async_openai_client(config):
+    """
+    Get the process wide AsyncOpenAI client for a configuration, see get_openai_client
+
+    Args:
+        config: Configuration object with openai settings
+
+    Returns:
+        AsyncOpenAI: Shared client or None on failure
+    """
+    return shared_client(async_clients, config, init_async_openai_client)
+
+
+def close_openai_clients():
+    """Close the shared clients and their connections"""
+    with clients_lock:
+        shared = list(clients.values())
+        clients.clear()
+        shared_async = list(async_clients.values())
+        async_clients.clear()
+    for client in shared:
+        try:
+            client.close()
+        except Exception as e:
+            logger.error(f"Error closing OpenAI client: {e}")
+    if shared_async:
+        from .aio import run
+        for client in shared_async:
+            try:
+                run(client.close())
+            except Exception as e:
+                logger.error(f"Error closing async OpenAI client: {e}")
@@ -1,91 +1,279 @@
 import os
+import re
 import logging
+import threading
 
 logger = logging.getLogger(__name__)
 
+# Placeholders a prompt is formatted with
+placeholder_pattern = re.compile(r'{(.*?)}')
 
-def get_prompts(config):
+
+class PromptTemplate:
     """
-    Load prompt templates from the configured prompt folder.
-    
+    A prompt compiled when it is loaded.
+
+    Its placeholders are extracted once and the system message is built
+    once, so turning the prompt into messages only checks the data and
+    formats the user part.
+    """
+
+    __slots__ = ('name', 'system', 'user', 'text', 'placeholders', 'system_message')
+
+    def __init__(self, name, system=None, user=None, text=None):
+        """
+        Args:
+            name: Name of the prompt
+            system: System part of a system/user prompt
+            user: User part of a system/user prompt
+            text: Text of a standard prompt, sent as the user message
+        """
+        self.name = name
+        self.system = system
+        self.user = user
+        self.text = text
+        body = self.body
+        self.placeholders = frozenset(placeholder_pattern.findall(body)) if body else frozenset()
+        self.system_message = {"role": "system", "content": system} if system else None
+
+    @classmethod
+    def from_prompt(cls, name, prompt):
+        """Compile a prompt given as text or as a dict with system and user parts"""
+        if isinstance(prompt, dict):
+            return cls(name, system=prompt.get('system'), user=prompt.get('user'))
+        return cls(name, text=prompt)
+
+    @property
+    def body(self):
+        """The part of the prompt that is formatted with the data"""
+        return self.text if self.text is not None else self.user
+
+    def messages(self, data=None):
+        """
+        Build the messages of the prompt
+
+        Args:
+            data: Values of the placeholders
+
+        Returns:
+            list: Message dicts or None when a value is missing
+        """
+        data = data or {}
+        missing = self.placeholders.difference(data)
+        if missing:
+            logger.error(f"Missing required data keys for formatting: {set(missing)}")
+            return None
+
+        messages = []
+        if self.system_message:
+            messages.append(dict(self.system_message))
+        body = self.body
+        if body:
+            messages.append({
+                "role": "user",
+                "content": body.format(**data) if self.placeholders else body
+            })
+
+        if not messages:
+            logger.error(f"No messages created from prompt {self.name}")
+            return None
+        return messages
+
+
+def compile_prompts(contents):
+    """
+    Compile the prompt files of a folder
+
     Args:
-        config: Configuration object containing prompt_folder path
-        
+        contents: File name -> text of the file
+
     Returns:
-        dict: Dictionary of prompt templates
+        dict: Name -> PromptTemplate
     """
-    directory_path = config.prompt_folder
     prompts = {}
     system_count = 0
     user_count = 0
     standard_count = 0
-    
-    try:
-        # Check if directory exists
-        if not os.path.exists(directory_path):
-            logging.error(f"Prompt directory not found: {directory_path}")
-            return prompts
-            
-        if not os.path.isdir(directory_path):
-            logging.error(f"Prompt path is not a directory: {directory_path}")
-            return prompts
-            
-        file_list = os.listdir(directory_path)
-        logging.info(f"Found {len(file_list)} files in prompt directory")
-        
-        for filename in file_list:
-            try:
-                if not filename.endswith('.txt'):
-                    logging.debug(f"Skipping non-txt file: {filename}")
+
+    for filename, content in contents.items():
+        basename = filename.split('.')[0]
+        if '.system.txt' in filename:
+            prompts.setdefault(basename, {})['system'] = content
+            system_count += 1
+        elif '.user.txt' in filename:
+            prompts.setdefault(basename, {})['user'] = content
+            user_count += 1
+        else:
+            prompts[basename] = content
+            standard_count += 1
+
+    # Validate that prompts with 'system' also have 'user' parts
+    for name, prompt in prompts.items():
+        if isinstance(prompt, dict):
+            if 'system' in prompt and 'user' not in prompt:
+                logger.warning(f"Prompt {name} has system part but missing user part")
+            if 'user' in prompt and 'system' not in prompt:
+                logger.warning(f"Prompt {name} has user part but missing system part")
+
+    logger.info(f"Loaded {len(prompts)} prompt templates (system: {system_count}, user: {user_count}, standard: {standard_count})")
+    return {name: PromptTemplate.from_prompt(name, prompt) for name, prompt in prompts.items()}
+
+
+class PromptRegistry:
+    """
+    The compiled prompts of a folder, by name.
+
+    Files are read and compiled when they are loaded. A watcher thread
+    compares their modification times every watch_interval seconds and
+    recompiles the folder when one changed, reading only the changed
+    files. The new templates replace the old ones in a single assignment,
+    so a request sees either all old or all new prompts.
+    """
+
+    def __init__(self, directory, watch_interval=2.0):
+        """
+        Args:
+            directory: Folder of the .txt prompt files
+            watch_interval: Seconds between checks for changed files, 0 to not watch
+        """
+        self.directory = directory
+        self.watch_interval = watch_interval
+        self.templates = {}
+        # file name -> ((mtime, size), text)
+        self.files = {}
+        self.stamps = None
+        self.missing = False
+        self.reloads = 0
+        self.lock = threading.Lock()
+        self.stopping = threading.Event()
+        self.thread = None
+
+    def scan(self):
+        """
+        Get the modification time and size of every prompt file
+
+        Returns:
+            dict: File name -> (mtime, size) or None if the folder is missing
+        """
+        if not os.path.isdir(self.directory):
+            if not self.missing:
+                logger.error(f"Prompt directory not found: {self.directory}")
+                self.missing = True
+            return None
+        self.missing = False
+        stamps = {}
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if not entry.name.endswith('.txt'):
+                    continue
+                try:
+                    stat = entry.stat()
+                except OSError:
                     continue
-                    
-                basename = filename.split('.')[0]
-                file_path = os.path.join(directory_path, filename)
-                
-                # Check if file is readable
-                if not os.access(file_path, os.R_OK):
-                    logging.warning(f"Cannot read prompt file (permission denied): {file_path}")
+                stamps[entry.name] = (stat.st_mtime_ns, stat.st_size)
+        return stamps
+
+    def read(self, filename):
+        """Read a prompt file, None if it is empty or can not be read"""
+        file_path = os.path.join(self.directory, filename)
+        try:
+            with open(file_path, 'r') as file:
+                content = file.read()
+        except UnicodeDecodeError as e:
+            logger.error(f"Failed to decode file {file_path}: {e}")
+            return None
+        except OSError as e:
+            logger.warning(f"Cannot read prompt file {file_path}: {e}")
+            return None
+        if not content.strip():
+            logger.warning(f"Empty prompt file: {file_path}")
+            return None
+        return content
+
+    def load(self):
+        """
+        Compile the folder if any file changed since the last load
+
+        Returns:
+            bool: True if the prompts were recompiled
+        """
+        with self.lock:
+            stamps = self.scan()
+            if stamps is None or stamps == self.stamps:
+                return False
+            files = {}
+            for filename, stamp in stamps.items():
+                cached = self.files.get(filename)
+                if cached is not None and cached[0] == stamp:
+                    files[filename] = cached
                     continue
-                
-                with open(file_path, 'r') as file:
-                    try:
-                        content = file.read()
-                        if not content.strip():
-                            logging.warning(f"Empty prompt file: {file_path}")
-                            continue
-                            
-                        if '.system.txt' in filename:
-                            if basename not in prompts:
-                                prompts[basename] = {}
-                            prompts[basename]['system'] = content
-                            system_count += 1
-                            logging.debug(f"Loaded system prompt: {basename}")
-                        elif '.user.txt' in filename:
-                            if basename not in prompts:
-                                prompts[basename] = {}
-                            prompts[basename]['user'] = content
-                            user_count += 1
-                            logging.debug(f"Loaded user prompt: {basename}")
-                        else:
-                            prompts[basename] = content
-                            standard_count += 1
-                            logging.debug(f"Loaded standard prompt: {basename}")
-                    except UnicodeDecodeError as e:
-                        logging.error(f"Failed to decode file {file_path}: {str(e)}")
+                content = self.read(filename)
+                if content is not None:
+                    files[filename] = (stamp, content)
+            self.templates = compile_prompts({filename: content for filename, (stamp, content) in files.items()})
+            if self.stamps is not None:
+                self.reloads += 1
+                logger.info(f"Reloaded prompts from {self.directory}")
+            self.files = files
+            self.stamps = stamps
+            return True
+
+    def start(self):
+        """Start watching the folder"""
+        if self.watch_interval <= 0 or self.thread is not None:
+            return
+        self.thread = threading.Thread(target=self.run, name="prompt-watch", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """Stop watching the folder"""
+        self.stopping.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def run(self):
+        while not self.stopping.wait(self.watch_interval):
+            try:
+                self.load()
             except Exception as e:
-                logging.error(f"Error processing prompt file {filename}: {str(e)}")
-                
-        logging.info(f"Loaded {len(prompts)} prompt templates (system: {system_count}, user: {user_count}, standard: {standard_count})")
-        
-        # Validate that prompts with 'system' also have 'user' parts
-        for name, prompt in prompts.items():
-            if isinstance(prompt, dict):
-                if 'system' in prompt and 'user' not in prompt:
-                    logging.warning(f"Prompt {name} has system part but missing user part")
-                if 'user' in prompt and 'system' not in prompt:
-                    logging.warning(f"Prompt {name} has user part but missing system part")
-                    
+                logger.error(f"Error reloading prompts: {e}")
+
+    def get(self, name, default=None):
+        return self.templates.get(name, default)
+
+    def __getitem__(self, name):
+        return self.templates[name]
+
+    def __contains__(self, name):
+        return name in self.templates
+
+    def __iter__(self):
+        return iter(self.templates)
+
+    def __len__(self):
+        return len(self.templates)
+
+    def items(self):
+        return self.templates.items()
+
+
+def get_prompts(config):
+    """
+    Load prompt templates from the configured prompt folder.
+
+    The folder is watched for changes unless prompt_watch_interval is 0.
+
+    Args:
+        config: Configuration object containing prompt_folder path
+
+    Returns:
+        PromptRegistry: Compiled prompt templates by name
+    """
+    prompts = PromptRegistry(config.prompt_folder, watch_interval=getattr(config, 'prompt_watch_interval', 2.0))
+    try:
+        prompts.load()
     except Exception as e:
-        logging.error(f"Failed to load prompts: {str(e)}")
-        
-    return prompts
\ No newline at end of file
+        logger.error(f"Failed to load prompts: {e}")
+    prompts.start()
+    return prompts
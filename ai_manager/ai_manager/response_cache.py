@@ -0,0 +1,215 @@
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+class ResponseCache:
+    """
+    Completions by a hash of the request that produced them.
+
+    The key covers the model, the rendered messages and the request
+    parameters, so only an identical request gets a cached answer. Recent
+    answers are held in an in-memory LRU, all of them in SQLite when a path
+    is given, so they survive restarts and are shared by the processes
+    using the same file. Answers expire ttl seconds after they were stored.
+    The LRU and SQLite have separate locks, so get_memory() never waits
+    for a query another thread is running.
+    """
+
+    def __init__(self, path=None, memory_entries=1024, ttl=86400, purge_interval=60):
+        """
+        Args:
+            path: SQLite file, None to only cache in memory
+            memory_entries: Answers held in memory at most
+            ttl: Seconds an answer is valid
+            purge_interval: Seconds between removals of expired rows
+        """
+        self.path = path
+        self.memory_entries = memory_entries
+        self.ttl = ttl
+        self.purge_interval = purge_interval
+        # key -> (response, expires), least recently used first
+        self.entries = OrderedDict()
+        # Guards entries and the counters
+        self.lock = threading.Lock()
+        # Guards db
+        self.db_lock = threading.Lock()
+        self.db = None
+        self.last_purge = time.time()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.errors = 0
+        if path:
+            self.open()
+
+    def open(self):
+        try:
+            self.db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute("PRAGMA synchronous=NORMAL")
+            self.db.execute("CREATE TABLE IF NOT EXISTS responses ("
+                            "key TEXT PRIMARY KEY, model TEXT, response TEXT, created REAL, expires REAL)")
+            self.db.execute("CREATE INDEX IF NOT EXISTS responses_expires ON responses (expires)")
+            logger.info(f"Response cache at {self.path}")
+        except sqlite3.Error as e:
+            logger.error(f"Error opening response cache {self.path}, caching in memory only: {e}")
+            self.db = None
+
+    @staticmethod
+    def key(model, messages, **params):
+        """
+        Get the cache key of a request
+
+        Args:
+            model: Model of the request
+            messages: Message dicts sent
+            params: Other request parameters that change the answer
+
+        Returns:
+            str: Hex digest
+        """
+        request = json.dumps([model, messages, params], sort_keys=True, separators=(',', ':'), default=str)
+        return hashlib.sha256(request.encode()).hexdigest()
+
+    def get(self, key):
+        """
+        Get a cached answer
+
+        Returns:
+            str: The answer or None if it is not cached or expired
+        """
+        result = self.get_memory(key)
+        if result is None:
+            result = self.get_stored(key)
+        return result
+
+    def get_memory(self, key):
+        """
+        Get a cached answer held in memory, never touches SQLite
+
+        Returns:
+            str: The answer or None, in which case get_stored() has to be asked
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if entry[1] > time.time():
+                self.entries.move_to_end(key)
+                self.memory_hits += 1
+                return entry[0]
+            del self.entries[key]
+            return None
+
+    def get_stored(self, key):
+        """
+        Get a cached answer from SQLite, counts a miss when it is not there
+
+        Returns:
+            str: The answer or None if it is not cached or expired
+        """
+        row = None
+        if self.db is not None:
+            with self.db_lock:
+                try:
+                    if self.db is not None:
+                        row = self.db.execute("SELECT response, expires FROM responses WHERE key = ? AND expires > ?",
+                                              (key, time.time())).fetchone()
+                except sqlite3.Error as e:
+                    with self.lock:
+                        self.errors += 1
+                    logger.error(f"Error reading response cache: {e}")
+        with self.lock:
+            if row is None:
+                self.misses += 1
+                return None
+            self.remember(key, row[0], row[1])
+            self.disk_hits += 1
+            return row[0]
+
+    def put(self, key, response, model=None):
+        """
+        Cache an answer
+
+        Args:
+            key: Key of the request, see key()
+            response: The answer
+            model: Model that answered, kept for inspection of the store
+        """
+        if not response:
+            return
+        now = time.time()
+        expires = now + self.ttl
+        with self.lock:
+            self.remember(key, response, expires)
+            self.stores += 1
+        if self.db is None:
+            return
+        with self.db_lock:
+            try:
+                if self.db is None:
+                    return
+                self.db.execute("INSERT OR REPLACE INTO responses (key, model, response, created, expires) VALUES (?, ?, ?, ?, ?)",
+                                (key, model, response, now, expires))
+                if now - self.last_purge >= self.purge_interval:
+                    self.last_purge = now
+                    purged = self.db.execute("DELETE FROM responses WHERE expires <= ?", (now,)).rowcount
+                    if purged:
+                        logger.debug(f"Removed {purged} expired responses from the cache")
+            except sqlite3.Error as e:
+                with self.lock:
+                    self.errors += 1
+                logger.error(f"Error writing response cache: {e}")
+
+    def remember(self, key, response, expires):
+        """Hold an answer in memory, evicting the least recently used ones"""
+        self.entries[key] = (response, expires)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.memory_entries:
+            self.entries.popitem(last=False)
+
+    def get_metrics(self):
+        """Get hits from memory and SQLite, misses, stores and the hit rate"""
+        with self.lock:
+            hits = self.memory_hits + self.disk_hits
+            lookups = hits + self.misses
+            return {
+                'memory_hits': self.memory_hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'hit_rate': hits / lookups if lookups else 0.0,
+                'stores': self.stores,
+                'errors': self.errors,
+                'entries': len(self.entries),
+            }
+
+    def close(self):
+        with self.db_lock:
+            if self.db is not None:
+                self.db.close()
+                self.db = None
+
+
+def create_response_cache(config):
+    """
+    Create the response cache configured in the ai_manager config
+
+    Args:
+        config: ai_manager configuration
+
+    Returns:
+        ResponseCache: The cache or None when response_cache is off
+    """
+    if not getattr(config, 'response_cache', False):
+        return None
+    return ResponseCache(getattr(config, 'response_cache_path', "response_cache.sqlite"),
+                         memory_entries=getattr(config, 'response_cache_entries', 1024),
+                         ttl=getattr(config, 'response_cache_ttl', 86400))
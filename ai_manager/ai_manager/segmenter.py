@@ -0,0 +1,112 @@
+import re
+import logging
+
+logger = logging.getLogger(__name__)
+
+# End of a sentence: punctuation, closing quotes/brackets, then whitespace
+sentence_end = re.compile(r'[.!?…]+["\')\]”]*\s+')
+# Clause breaks used when a sentence gets too long
+clause_end = re.compile(r'[,;:—–]\s+|\s+-\s+')
+
+# Words ending in a dot that do not end a sentence
+abbreviations = frozenset(("mr", "mrs", "ms", "dr", "st", "sr", "jr", "vs", "etc", "e.g", "i.e", "approx"))
+
+
+class SentenceSegmenter:
+    """
+    Cuts text arriving token by token into chunks that can be spoken on
+    their own.
+
+    A chunk ends at the end of a sentence. The first chunk of a reply may
+    be short so audio starts early, later ones are at least min_chars
+    long so TTS is not called for every few words. A sentence longer than
+    max_chars is cut at a clause break, or at a space when there is none.
+    """
+
+    def __init__(self, min_chars=40, first_min_chars=10, max_chars=250):
+        """
+        Args:
+            min_chars: Shortest chunk after the first one
+            first_min_chars: Shortest first chunk
+            max_chars: Longest chunk
+        """
+        self.min_chars = min_chars
+        self.first_min_chars = first_min_chars
+        self.max_chars = max_chars
+        self.buffer = ""
+        self.chunks = 0
+
+    def feed(self, text):
+        """
+        Add streamed text
+
+        Args:
+            text: Next piece of the reply
+
+        Returns:
+            list: Chunks that are complete now
+        """
+        if text:
+            self.buffer += text
+        return self.cut()
+
+    def flush(self):
+        """
+        End of the reply
+
+        Returns:
+            list: The chunks left in the buffer
+        """
+        chunks = self.cut()
+        rest = self.buffer.strip()
+        self.buffer = ""
+        if rest:
+            chunks.append(rest)
+            self.chunks += 1
+        return chunks
+
+    def cut(self):
+        chunks = []
+        while True:
+            end = self.find_end()
+            if end is None:
+                break
+            chunk = self.buffer[:end].strip()
+            self.buffer = self.buffer[end:]
+            if chunk:
+                chunks.append(chunk)
+                self.chunks += 1
+        return chunks
+
+    def find_end(self):
+        """Get where the next chunk ends or None if it is not complete yet"""
+        min_chars = self.first_min_chars if self.chunks == 0 else self.min_chars
+        for match in sentence_end.finditer(self.buffer):
+            if match.start() < min_chars:
+                continue
+            if match.start() >= self.max_chars:
+                break
+            if self.is_abbreviation(match):
+                continue
+            return match.end()
+
+        if len(self.buffer) <= self.max_chars:
+            return None
+        window = self.buffer[:self.max_chars]
+        breaks = [match.end() for match in clause_end.finditer(window) if match.start() >= min_chars]
+        if breaks:
+            return breaks[-1]
+        space = window.rfind(" ", min_chars)
+        return space + 1 if space > 0 else self.max_chars
+
+    def is_abbreviation(self, match):
+        """True when the dot of a sentence end match belongs to an abbreviation or initial"""
+        position = match.start()
+        if self.buffer[position] != ".":
+            return False
+        word = self.buffer[:position].rsplit(None, 1)[-1].lower() if self.buffer[:position].strip() else ""
+        if word == "no":
+            # "No. 5" is a number, "the answer is no. Call" ends a sentence, undecided until the next character arrives
+            following = self.buffer[match.end():match.end() + 1]
+            return not following or following.isdigit()
+        return word in abbreviations or (len(word) == 1 and word.isalpha())
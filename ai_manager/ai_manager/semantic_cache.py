@@ -0,0 +1,389 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def load_embedder(model_name="paraphrase-mpnet-base-v2"):
+    """
+    Load a SentenceTransformer model as an embedding function
+
+    Args:
+        model_name: Model to load, the one intent_manager's qa_matcher uses by default
+
+    Returns:
+        Function turning a text into a unit length vector, None if
+        sentence-transformers is not installed or the model fails to load
+    """
+    try:
+        from sentence_transformers import SentenceTransformer
+    except ImportError:
+        logger.warning("sentence-transformers is not installed (pip install sentence-transformers), semantic cache is off")
+        return None
+    try:
+        model = SentenceTransformer(model_name)
+    except Exception as e:
+        logger.error(f"Error loading embedding model {model_name}: {e}")
+        return None
+
+    def embed(text):
+        return model.encode(text, convert_to_numpy=True, normalize_embeddings=True)
+
+    embed.model_name = model_name
+    return embed
+
+
+def context_key(context):
+    """
+    Get the key of what an answer depends on besides the utterance
+
+    Args:
+        context: E.g. the messages before the utterance or the prompt data, None for nothing
+
+    Returns:
+        str: Hex digest
+    """
+    data = json.dumps(context, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(data.encode()).hexdigest()
+
+
+class SemanticMatch:
+    """A cached answer to an utterance similar to the one asked"""
+
+    __slots__ = ('entry_id', 'utterance', 'answer', 'audio_path', 'score')
+
+    def __init__(self, entry_id, utterance, answer, audio_path, score):
+        self.entry_id = entry_id
+        self.utterance = utterance
+        self.answer = answer
+        self.audio_path = audio_path
+        self.score = score
+
+
+class SemanticIndex:
+    """Unit vectors of the answered utterances of one prompt and context, searched by dot product"""
+
+    def __init__(self, dimensions):
+        self.vectors = np.zeros((16, dimensions), dtype=np.float32)
+        self.ids = []
+        self.utterances = []
+        self.answers = []
+        self.audio = []
+        # entry id -> position
+        self.positions = {}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def add(self, entry_id, vector, utterance, answer, audio_path=None):
+        count = len(self.ids)
+        if count == len(self.vectors):
+            grown = np.zeros((count * 2, self.vectors.shape[1]), dtype=np.float32)
+            grown[:count] = self.vectors
+            self.vectors = grown
+        self.vectors[count] = vector
+        self.positions[entry_id] = count
+        self.ids.append(entry_id)
+        self.utterances.append(utterance)
+        self.answers.append(answer)
+        self.audio.append(audio_path)
+
+    def remove(self, entry_id):
+        """Drop an entry by moving the last one into its place, returns its audio path"""
+        position = self.positions.pop(entry_id)
+        audio_path = self.audio[position]
+        last = len(self.ids) - 1
+        if position != last:
+            self.vectors[position] = self.vectors[last]
+            for column in (self.ids, self.utterances, self.answers, self.audio):
+                column[position] = column[last]
+            self.positions[self.ids[position]] = position
+        for column in (self.ids, self.utterances, self.answers, self.audio):
+            column.pop()
+        return audio_path
+
+    def nearest(self, vector):
+        """Get the position and similarity of the closest utterance"""
+        scores = self.vectors[:len(self.ids)] @ vector
+        best = int(np.argmax(scores))
+        return best, float(scores[best])
+
+
+class SemanticCache:
+    """
+    Answers by the meaning of the utterance they answered.
+
+    Every answered utterance is embedded and kept, per prompt and context,
+    with its answer and, once synthesized, the WAV of the answer. The
+    context is whatever the answer depends on besides the utterance, e.g.
+    the conversation before it, so an answer is only given again to the
+    same question asked at the same point. A new utterance whose embedding
+    has a cosine similarity of at least threshold with a kept one gets
+    that answer, so paraphrases of a question hit the cache too. Entries
+    are stored in SQLite and loaded into memory at start, only those of
+    the current embedding model. max_entries are kept at most and
+    max_audio of them with a WAV, the oldest are dropped first and their
+    WAV files removed.
+    """
+
+    def __init__(self, embed, path=None, threshold=0.9, max_entries=10000, max_audio=500):
+        """
+        Args:
+            embed: Function turning a text into a unit length vector
+            path: SQLite file, None to keep the entries in memory only
+            threshold: Lowest similarity that counts as the same question
+            max_entries: Entries kept
+            max_audio: Synthesized answers kept
+        """
+        self.embed = embed
+        self.model_name = getattr(embed, 'model_name', None)
+        self.path = path
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.max_audio = max_audio
+        # (prompt name, context key) -> SemanticIndex
+        self.indexes = {}
+        # entry id -> its index key, oldest first
+        self.entries = OrderedDict()
+        # entry id -> WAV of the answer, oldest first
+        self.audio = OrderedDict()
+        self.lock = threading.Lock()
+        self.db = None
+        self.next_id = 1
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.errors = 0
+        if path:
+            self.open()
+
+    def open(self):
+        try:
+            self.db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute("CREATE TABLE IF NOT EXISTS semantic_answers ("
+                            "id INTEGER PRIMARY KEY, prompt TEXT, model TEXT, utterance TEXT, answer TEXT, "
+                            "audio TEXT, vector BLOB, created REAL, context TEXT)")
+            columns = [row[1] for row in self.db.execute("PRAGMA table_info(semantic_answers)")]
+            if 'context' not in columns:
+                # Entries stored without their context could be answers to any point of a conversation
+                self.db.execute("ALTER TABLE semantic_answers ADD COLUMN context TEXT")
+                self.db.execute("DELETE FROM semantic_answers")
+            rows = self.db.execute("SELECT id, prompt, context, utterance, answer, audio, vector FROM semantic_answers "
+                                   "WHERE model IS ? AND context IS NOT NULL ORDER BY id", (self.model_name,)).fetchall()
+            last = self.db.execute("SELECT MAX(id) FROM semantic_answers").fetchone()[0]
+            self.next_id = (last or 0) + 1
+        except sqlite3.Error as e:
+            logger.error(f"Error opening semantic cache {self.path}, keeping it in memory only: {e}")
+            self.db = None
+            return
+        with self.lock:
+            for entry_id, prompt, context, utterance, answer, audio_path, blob in rows:
+                vector = np.frombuffer(blob, dtype=np.float32)
+                self.index((prompt, context), len(vector)).add(entry_id, vector, utterance, answer, audio_path)
+                self.entries[entry_id] = (prompt, context)
+                if audio_path:
+                    self.audio[entry_id] = audio_path
+            files = self.evict()
+        self.remove_files(files)
+        logger.info(f"Loaded {len(rows)} semantic cache entries from {self.path}")
+
+    def index(self, key, dimensions):
+        index = self.indexes.get(key)
+        if index is None:
+            index = self.indexes[key] = SemanticIndex(dimensions)
+        return index
+
+    def vector(self, text):
+        return np.asarray(self.embed(text), dtype=np.float32)
+
+    def lookup(self, prompt_name, utterance, context=None, vector=None):
+        """
+        Find the answer to an utterance with the same meaning
+
+        Args:
+            prompt_name: Prompt the answer was made with
+            utterance: What the caller said
+            context: What the answer depends on besides the utterance, see context_key
+            vector: Embedding of the utterance, computed when not given
+
+        Returns:
+            SemanticMatch: The closest answer or None if none is similar enough
+        """
+        if vector is None:
+            vector = self.vector(utterance)
+        with self.lock:
+            index = self.indexes.get((prompt_name, context_key(context)))
+            if index is not None and len(index):
+                best, score = index.nearest(vector)
+                if score >= self.threshold:
+                    self.hits += 1
+                    logger.debug(f"Semantic cache hit ({score:.3f}): '{utterance}' ~ '{index.utterances[best]}'")
+                    return SemanticMatch(index.ids[best], index.utterances[best], index.answers[best],
+                                         index.audio[best], score)
+            self.misses += 1
+        return None
+
+    def store(self, prompt_name, utterance, answer, context=None):
+        """
+        Keep the answer to an utterance
+
+        Args:
+            prompt_name: Prompt the answer was made with
+            utterance: What the caller said
+            answer: The answer given
+            context: What the answer depends on besides the utterance, see context_key
+
+        Returns:
+            int: ID of the entry, for set_audio
+        """
+        vector = self.vector(utterance)
+        key = (prompt_name, context_key(context))
+        with self.lock:
+            entry_id = self.next_id
+            self.next_id += 1
+            self.index(key, len(vector)).add(entry_id, vector, utterance, answer)
+            self.entries[entry_id] = key
+            self.stores += 1
+            if self.db is not None:
+                try:
+                    self.db.execute("INSERT INTO semantic_answers (id, prompt, model, utterance, answer, audio, vector, created, context) "
+                                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                                    (entry_id, prompt_name, self.model_name, utterance, answer, None,
+                                     vector.tobytes(), time.time(), key[1]))
+                except sqlite3.Error as e:
+                    self.errors += 1
+                    logger.error(f"Error writing semantic cache: {e}")
+            files = self.evict()
+        self.remove_files(files)
+        return entry_id
+
+    def set_audio(self, entry_id, audio_path):
+        """
+        Attach the synthesized WAV of an answer to its entry
+
+        The file is removed when the entry or its audio is evicted, right
+        away if the entry is gone already.
+        """
+        with self.lock:
+            key = self.entries.get(entry_id)
+            if key is None:
+                files = [audio_path]
+            else:
+                index = self.indexes[key]
+                position = index.positions[entry_id]
+                files = [index.audio[position]] if index.audio[position] else []
+                index.audio[position] = audio_path
+                self.audio[entry_id] = audio_path
+                self.audio.move_to_end(entry_id)
+                self.update_audio([(audio_path, entry_id)])
+                files.extend(self.evict())
+        self.remove_files(files)
+
+    def evict(self):
+        """
+        Drop the oldest entries over max_entries and the oldest WAVs over max_audio
+
+        Returns:
+            list: Paths of the WAV files to remove
+        """
+        files = []
+        removed = []
+        while len(self.entries) > self.max_entries:
+            entry_id, key = self.entries.popitem(last=False)
+            index = self.indexes[key]
+            index.remove(entry_id)
+            if not len(index):
+                del self.indexes[key]
+            audio_path = self.audio.pop(entry_id, None)
+            if audio_path:
+                files.append(audio_path)
+            removed.append((entry_id,))
+        cleared = []
+        while len(self.audio) > self.max_audio:
+            entry_id, audio_path = self.audio.popitem(last=False)
+            index = self.indexes[self.entries[entry_id]]
+            index.audio[index.positions[entry_id]] = None
+            files.append(audio_path)
+            cleared.append((None, entry_id))
+        if self.db is not None and (removed or cleared):
+            try:
+                self.db.executemany("DELETE FROM semantic_answers WHERE id = ?", removed)
+            except sqlite3.Error as e:
+                self.errors += 1
+                logger.error(f"Error writing semantic cache: {e}")
+            self.update_audio(cleared)
+        return files
+
+    def update_audio(self, rows):
+        if self.db is None or not rows:
+            return
+        try:
+            self.db.executemany("UPDATE semantic_answers SET audio = ? WHERE id = ?", rows)
+        except sqlite3.Error as e:
+            self.errors += 1
+            logger.error(f"Error writing semantic cache: {e}")
+
+    def remove_files(self, paths):
+        # A player that still has a removed file open keeps reading it
+        for path in paths:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.warning(f"Error removing cached answer {path}: {e}")
+
+    def get_metrics(self):
+        """Get hits, misses, stores, synthesized answers and the entries per prompt"""
+        with self.lock:
+            lookups = self.hits + self.misses
+            entries = {}
+            for (prompt_name, context), index in self.indexes.items():
+                entries[prompt_name] = entries.get(prompt_name, 0) + len(index)
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'stores': self.stores,
+                'errors': self.errors,
+                'audio': len(self.audio),
+                'entries': entries,
+            }
+
+    def close(self):
+        with self.lock:
+            if self.db is not None:
+                self.db.close()
+                self.db = None
+
+
+def create_semantic_cache(config, embed=None):
+    """
+    Create the semantic cache configured in the ai_manager config
+
+    Args:
+        config: ai_manager configuration
+        embed: Embedding function, semantic_cache_model is loaded when not given
+
+    Returns:
+        SemanticCache: The cache or None when semantic_cache is off or no model is available
+    """
+    if not getattr(config, 'semantic_cache', False):
+        return None
+    if embed is None:
+        embed = load_embedder(getattr(config, 'semantic_cache_model', "paraphrase-mpnet-base-v2"))
+        if embed is None:
+            return None
+    return SemanticCache(embed,
+                         path=getattr(config, 'semantic_cache_path', "semantic_cache.sqlite"),
+                         threshold=getattr(config, 'semantic_cache_threshold', 0.9),
+                         max_entries=getattr(config, 'semantic_cache_entries', 10000),
+                         max_audio=getattr(config, 'semantic_cache_audio', 500))
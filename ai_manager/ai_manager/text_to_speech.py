@@ -5,6 +5,7 @@ Provides TTS functionality using OpenAI's API.
 
 import logging
 import os
+import asyncio
 from pathlib import Path
 import uuid
 import openai
@@ -13,6 +14,8 @@ from .openai import init_openai_client
 
 logger = logging.getLogger(__name__)
 
+# response_format="pcm" is raw 16 bit little endian mono at this rate
+PCM_SAMPLE_RATE = 24000
 
 
 def generate_speech(text, voice, model, output_path, client=None):
@@ -58,4 +61,134 @@ def generate_speech(text, voice, model, output_path, client=None):
         
     except Exception as e:
         logger.error(f"Error generating speech: {e}")
-        return None
\ No newline at end of file
+        return None
+
+
+def stream_speech(text, voice, model, on_audio, client=None, chunk_size=4096):
+    """
+    Generate speech using OpenAI's TTS API and hand over the audio while it
+    is still being synthesized.
+
+    Args:
+        text: Text to convert to speech
+        voice: Voice to use
+        model: TTS model to use
+        on_audio: Called with each chunk of raw PCM (16 bit mono at PCM_SAMPLE_RATE)
+        client: OpenAI client
+        chunk_size: Bytes per chunk
+
+    Returns:
+        int: Number of PCM bytes produced or None on failure
+    """
+    try:
+        if not client:
+            logger.error("No OpenAI client available")
+            return None
+
+        logger.info(f"Streaming TTS for: '{text[:50]}...' using voice: {voice}, model: {model}")
+
+        total = 0
+        with client.audio.speech.with_streaming_response.create(
+            model=model,
+            voice=voice,
+            input=text,
+            response_format="pcm"
+        ) as response:
+            for chunk in response.iter_bytes(chunk_size):
+                if chunk:
+                    total += len(chunk)
+                    on_audio(chunk)
+
+        logger.info(f"Streamed {total} bytes of TTS audio")
+        return total
+
+    except Exception as e:
+        logger.error(f"Error streaming speech: {e}")
+        return None
+
+
+def write_file(path, data):
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+async def agenerate_speech(text, voice, model, output_path, client=None):
+    """
+    Generate speech using OpenAI's TTS API and save it as WAV file, see generate_speech
+
+    Args:
+        text: Text to convert to speech
+        voice: Voice to use
+        model: TTS model to use
+        output_path: Path where to save WAV file
+        client: AsyncOpenAI client
+
+    Returns:
+        str: The output path on success or None on failure
+    """
+    try:
+        if not client:
+            logger.error("No OpenAI client available")
+            return None
+
+        logger.info(f"Generating TTS for: '{text[:50]}...' using voice: {voice}, model: {model}")
+
+        response = await client.audio.speech.create(
+            model=model,
+            voice=voice,
+            input=text,
+            response_format="wav"
+        )
+
+        # Disk writes stay off the event loop
+        Path(output_path).parent.mkdir(parents=True, exist_ok=True)
+        await asyncio.get_running_loop().run_in_executor(None, write_file, output_path, response.content)
+
+        logger.info(f"Saved WAV file: {output_path}")
+        return output_path
+
+    except Exception as e:
+        logger.error(f"Error generating speech: {e}")
+        return None
+
+
+async def astream_speech(text, voice, model, on_audio, client=None, chunk_size=4096):
+    """
+    Generate speech and hand over the audio while it is synthesized, see stream_speech
+
+    Args:
+        text: Text to convert to speech
+        voice: Voice to use
+        model: TTS model to use
+        on_audio: Called on the event loop with each chunk of raw PCM, must not block
+        client: AsyncOpenAI client
+        chunk_size: Bytes per chunk
+
+    Returns:
+        int: Number of PCM bytes produced or None on failure
+    """
+    try:
+        if not client:
+            logger.error("No OpenAI client available")
+            return None
+
+        logger.info(f"Streaming TTS for: '{text[:50]}...' using voice: {voice}, model: {model}")
+
+        total = 0
+        async with client.audio.speech.with_streaming_response.create(
+            model=model,
+            voice=voice,
+            input=text,
+            response_format="pcm"
+        ) as response:
+            async for chunk in response.iter_bytes(chunk_size):
+                if chunk:
+                    total += len(chunk)
+                    on_audio(chunk)
+
+        logger.info(f"Streamed {total} bytes of TTS audio")
+        return total
+
+    except Exception as e:
+        logger.error(f"Error streaming speech: {e}")
+        return None
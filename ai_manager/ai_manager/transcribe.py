@@ -4,6 +4,8 @@ Provides audio transcription functionality using OpenAI's Whisper API.
 """
 
 import os
+import io
+import asyncio
 import logging
 import wave
 import tempfile
@@ -13,15 +15,16 @@ import openai
 
 logger = logging.getLogger(__name__)
 
-def transcribe_audio(audio_data=None, audio_path=None, client=None):
+def transcribe_audio(audio_data=None, audio_path=None, client=None, model="whisper-1", sample_rate=44100):
     """
     Transcribe audio using OpenAI Whisper API
     
     Args:
         audio_data: Can be either raw binary data or numpy array
         audio_path: Optional existing file path that contains audio
-        config: Configuration object with openai settings
         client: Optional pre-initialized OpenAI client
+        model: Transcription model to use
+        sample_rate: Sample rate of a numpy array in audio_data
         
     Returns:
         The transcribed text or None on failure
@@ -43,15 +46,12 @@ def transcribe_audio(audio_data=None, audio_path=None, client=None):
             logger.debug(f"Using existing audio file: {audio_path}")
             with open(audio_path, "rb") as audio_file:
                 transcript = client.audio.transcriptions.create(
-                    model=config.openai.whisper_model,
+                    model=model,
                     file=audio_file
                 )
         # Otherwise, create a temporary file
         else:
-            temp_dir = getattr(config, "temp_dir", "/tmp")
-            sample_rate = getattr(config, "sample_rate", 44100)
-            
-            logger.debug(f"Creating temporary file for transcription in {temp_dir}")
+            logger.debug("Creating temporary file for transcription")
             with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as f:
                 temp_path = f.name
                 
@@ -66,7 +66,7 @@ def transcribe_audio(audio_data=None, audio_path=None, client=None):
                 logger.debug(f"Opening temp file for transcription: {temp_path}")
                 with open(temp_path, "rb") as audio_file:
                     transcript = client.audio.transcriptions.create(
-                        model=config.openai.whisper_model,
+                        model=model,
                         file=audio_file
                     )
             finally:
@@ -80,3 +80,57 @@ def transcribe_audio(audio_data=None, audio_path=None, client=None):
     except Exception as e:
         logger.error(f"Error in transcription: {e}")
         return None
+
+
+def audio_upload(audio_data=None, audio_path=None, sample_rate=44100):
+    """
+    Get audio as the file of a transcription request, without a temporary file
+
+    Returns:
+        tuple: (file name, WAV bytes)
+    """
+    if audio_path and os.path.exists(audio_path):
+        with open(audio_path, "rb") as audio_file:
+            return os.path.basename(audio_path), audio_file.read()
+    if isinstance(audio_data, bytes):
+        return "audio.wav", audio_data
+    buffer = io.BytesIO()
+    sf.write(buffer, audio_data, sample_rate, format='WAV')
+    return "audio.wav", buffer.getvalue()
+
+
+async def atranscribe_audio(audio_data=None, audio_path=None, client=None, model="whisper-1", sample_rate=44100):
+    """
+    Transcribe audio using OpenAI Whisper API, see transcribe_audio
+
+    Args:
+        audio_data: Can be either raw binary data or numpy array
+        audio_path: Optional existing file path that contains audio
+        client: AsyncOpenAI client
+        model: Transcription model to use
+        sample_rate: Sample rate of a numpy array in audio_data
+
+    Returns:
+        The transcribed text or None on failure
+    """
+    if audio_data is None and (not audio_path or not os.path.exists(audio_path)):
+        logger.error("No valid audio data or path provided")
+        return None
+
+    if not client:
+        logger.error("No OpenAI client available")
+        return None
+
+    try:
+        # File reads and WAV encoding stay off the event loop
+        upload = await asyncio.get_running_loop().run_in_executor(None, audio_upload, audio_data, audio_path, sample_rate)
+        transcript = await client.audio.transcriptions.create(
+            model=model,
+            file=upload
+        )
+        logger.info(f"Transcription result: {transcript.text}")
+        return transcript.text
+
+    except Exception as e:
+        logger.error(f"Error in transcription: {e}")
+        return None
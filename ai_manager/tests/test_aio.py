@@ -0,0 +1,69 @@
+import asyncio
+
+import pytest
+
+# ai_manager imports openai and soundfile when it is loaded
+pytest.importorskip("openai")
+pytest.importorskip("soundfile")
+
+from ai_manager.aio import run, iterate, get_loop
+
+
+class TestSharedLoop:
+    """Test running coroutines on the shared event loop"""
+
+    def test_run(self):
+        """Test that run returns the result of a coroutine"""
+        async def add(a, b):
+            await asyncio.sleep(0)
+            return a + b
+        assert run(add(2, 3)) == 5
+
+    def test_run_raises(self):
+        """Test that an exception of the coroutine is raised to the caller"""
+        async def fail():
+            raise ValueError("bad")
+        with pytest.raises(ValueError):
+            run(fail())
+
+    def test_run_timeout(self):
+        """Test that a coroutine taking too long is given up"""
+        with pytest.raises(Exception):
+            run(asyncio.sleep(5), timeout=0.05)
+
+    def test_blocking_on_the_loop(self):
+        """Test that waiting for a result on the loop's own thread is refused"""
+        async def nested():
+            inner = asyncio.sleep(0)
+            run(inner)
+        with pytest.raises(RuntimeError):
+            run(nested())
+
+    def test_iterate(self):
+        """Test that an async generator is iterated from synchronous code"""
+        async def count(n):
+            for i in range(n):
+                await asyncio.sleep(0)
+                yield i
+        assert list(iterate(count(3))) == [0, 1, 2]
+
+    def test_iterate_close(self):
+        """Test that closing the iterator closes the async generator"""
+        closed = []
+
+        async def endless():
+            try:
+                while True:
+                    yield 1
+            finally:
+                closed.append(True)
+
+        items = iterate(endless())
+        assert next(items) == 1
+        items.close()
+        assert closed == [True]
+
+    def test_one_loop(self):
+        """Test that every caller gets the same running loop"""
+        assert get_loop() is get_loop()
+        assert get_loop().is_running()
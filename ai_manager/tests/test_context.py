@@ -0,0 +1,114 @@
+from concurrent.futures import Future
+
+import pytest
+
+# ai_manager imports openai and soundfile when it is loaded
+pytest.importorskip("openai")
+pytest.importorskip("soundfile")
+
+from ai_manager.context import ConversationContext, count_tokens
+
+
+class StubSummarizer:
+    """Summarizer whose summaries are finished by the test"""
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, summary, messages):
+        future = Future()
+        self.calls.append((summary, messages, future))
+        return future
+
+
+class TestConversationContext:
+    """Test the ConversationContext class"""
+
+    def turn(self, n):
+        return f"turn {n} " + "word " * 36
+
+    def test_messages_order(self):
+        """Test that the system prompt comes first, then the turns in order"""
+        context = ConversationContext(system="Be brief", budget=1000)
+        context.add("user", "hello")
+        context.add("assistant", "hi")
+        context.add("user", "")
+        assert context.messages() == [
+            {"role": "system", "content": "Be brief"},
+            {"role": "user", "content": "hello"},
+            {"role": "assistant", "content": "hi"},
+        ]
+        assert len(context) == 2
+
+    def test_token_count(self):
+        """Test that the running token count matches the messages"""
+        context = ConversationContext(system="Be brief", budget=1000)
+        context.add("user", "hello there")
+        assert context.tokens == count_tokens("Be brief") + count_tokens("hello there") + 8
+
+    def test_trim_to_low_water(self):
+        """Test that the oldest turns are dropped down to the low water mark at once"""
+        context = ConversationContext(budget=200, low_water=0.5, keep_recent=1)
+        added = 0
+        while context.trimmed == 0:
+            context.add("user", self.turn(added))
+            added += 1
+        assert context.tokens <= 100
+        assert context.messages()[-1]["content"] == self.turn(added - 1)
+        assert context.trimmed + len(context) == added
+
+    def test_keep_recent(self):
+        """Test that the most recent turns are kept even over budget"""
+        context = ConversationContext(budget=10, keep_recent=2)
+        for n in range(4):
+            context.add("user", self.turn(n))
+        assert [message["content"] for message in context.messages()] == [self.turn(2), self.turn(3)]
+
+    def test_summary_does_not_block(self):
+        """Test that a trim only starts the summary, it is applied with the next turn"""
+        summarizer = StubSummarizer()
+        context = ConversationContext(budget=100, low_water=0.5, keep_recent=1, summarizer=summarizer)
+        context.add("user", self.turn(0))
+        context.add("assistant", self.turn(1))
+        context.add("user", self.turn(2))
+        assert len(summarizer.calls) == 1
+        summary, dropped, future = summarizer.calls[0]
+        assert summary is None
+        assert dropped[0] == {"role": "user", "content": self.turn(0)}
+        assert all(message["role"] != "system" for message in context.messages())
+
+        future.set_result("The caller said hello")
+        assert all(message["role"] != "system" for message in context.messages())
+        context.add("assistant", "ok")
+        assert context.messages()[0] == {"role": "system", "content": "Summary of the conversation so far: The caller said hello"}
+
+    def test_turns_dropped_while_summarizing(self):
+        """Test that turns dropped during a summary go into the next one"""
+        summarizer = StubSummarizer()
+        context = ConversationContext(budget=100, low_water=0.5, keep_recent=1, summarizer=summarizer)
+        for n in range(3):
+            context.add("user", self.turn(n))
+        for n in range(3, 5):
+            context.add("user", self.turn(n))
+        assert len(summarizer.calls) == 1
+
+        summarizer.calls[0][2].set_result("first")
+        context.add("user", self.turn(5))
+        assert len(summarizer.calls) == 2
+        summary, dropped, future = summarizer.calls[1]
+        assert summary == "Summary of the conversation so far: first"
+        # Every turn is summarized once or still in the context
+        summarized = summarizer.calls[0][1] + dropped + context.unsummarized
+        kept = [message["content"] for message in context.messages() if message["role"] == "user"]
+        assert [message["content"] for message in summarized] + kept == [self.turn(n) for n in range(6)]
+
+    def test_failed_summary_keeps_the_old_one(self):
+        """Test that an error of the summarizer leaves the summary as it was"""
+        summarizer = StubSummarizer()
+        context = ConversationContext(budget=100, low_water=0.5, keep_recent=1, summarizer=summarizer)
+        for n in range(3):
+            context.add("user", self.turn(n))
+        summarizer.calls[0][2].set_exception(RuntimeError("timeout"))
+        context.add("user", "next")
+        assert context.summary is None
+        assert context.summarizing is not summarizer.calls[0][2]
@@ -0,0 +1,42 @@
+from types import SimpleNamespace
+
+import pytest
+
+# ai_manager imports openai and soundfile when it is loaded
+openai = pytest.importorskip("openai")
+pytest.importorskip("soundfile")
+
+from ai_manager import openai as clients
+
+
+@pytest.fixture
+def config():
+    """Provide openai settings"""
+    return SimpleNamespace(openai=SimpleNamespace(api_key="sk-test"))
+
+
+@pytest.fixture
+def built(monkeypatch):
+    """Record the classes build_client is called with"""
+    calls = []
+
+    def build_client(config, client_class, http_client_class):
+        calls.append((client_class, http_client_class))
+        return object()
+
+    monkeypatch.setattr(clients, 'build_client', build_client)
+    return calls
+
+
+class TestClients:
+    """Test the construction of the shared OpenAI clients"""
+
+    def test_sync_client_keeps_sdk_http_defaults(self, config, built):
+        """Test that the sync client is built on the SDK's httpx client"""
+        assert clients.init_openai_client(config) is not None
+        assert built == [(openai.OpenAI, openai.DefaultHttpxClient)]
+
+    def test_async_client_keeps_sdk_http_defaults(self, config, built):
+        """Test that the async client is built on the SDK's async httpx client"""
+        assert clients.init_async_openai_client(config) is not None
+        assert built == [(openai.AsyncOpenAI, openai.DefaultAsyncHttpxClient)]
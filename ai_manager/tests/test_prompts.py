@@ -0,0 +1,112 @@
+import os
+
+import pytest
+
+# ai_manager imports openai and soundfile when it is loaded
+pytest.importorskip("openai")
+pytest.importorskip("soundfile")
+
+from ai_manager.prompts import PromptRegistry, PromptTemplate
+
+
+def write(directory, name, text, mtime_ns=None):
+    path = directory / name
+    path.write_text(text)
+    if mtime_ns is not None:
+        os.utime(path, ns=(mtime_ns, mtime_ns))
+    return path
+
+
+class TestPromptTemplate:
+    """Test the PromptTemplate class"""
+
+    def test_standard_prompt(self):
+        """Test that a standard prompt becomes one user message"""
+        prompt = PromptTemplate("greet", text="Greet {name}")
+        assert prompt.placeholders == {"name"}
+        assert prompt.messages({"name": "Ann"}) == [{"role": "user", "content": "Greet Ann"}]
+
+    def test_system_user_prompt(self):
+        """Test that a system/user prompt becomes a system and a user message"""
+        prompt = PromptTemplate("answer", system="Be brief", user="{question}")
+        assert prompt.messages({"question": "Hours?"}) == [
+            {"role": "system", "content": "Be brief"},
+            {"role": "user", "content": "Hours?"},
+        ]
+
+    def test_missing_data(self):
+        """Test that a missing placeholder value gives no messages"""
+        assert PromptTemplate("greet", text="Greet {name}").messages({}) is None
+
+
+class TestPromptRegistry:
+    """Test the PromptRegistry class"""
+
+    def test_load(self, tmp_path):
+        """Test that the prompt files of a folder are compiled by name"""
+        write(tmp_path, "greet.txt", "Hello {name}")
+        write(tmp_path, "answer.system.txt", "Be brief")
+        write(tmp_path, "answer.user.txt", "{question}")
+        write(tmp_path, "notes.md", "ignored")
+        registry = PromptRegistry(str(tmp_path), watch_interval=0)
+        assert registry.load()
+        assert sorted(registry) == ["answer", "greet"]
+        assert registry["answer"].system == "Be brief"
+        assert registry.get("missing") is None
+
+    def test_unchanged_folder_is_not_reloaded(self, tmp_path):
+        """Test that load does nothing while no file changed"""
+        write(tmp_path, "greet.txt", "Hello")
+        registry = PromptRegistry(str(tmp_path), watch_interval=0)
+        registry.load()
+        templates = registry.templates
+        assert not registry.load()
+        assert registry.templates is templates
+        assert registry.reloads == 0
+
+    def test_reload_changed_file(self, tmp_path):
+        """Test that a changed file is read again and replaces its template"""
+        write(tmp_path, "greet.txt", "Hello", mtime_ns=1_000_000_000)
+        write(tmp_path, "bye.txt", "Bye", mtime_ns=1_000_000_000)
+        registry = PromptRegistry(str(tmp_path), watch_interval=0)
+        registry.load()
+        bye = registry.files["bye.txt"]
+        write(tmp_path, "greet.txt", "Hello there", mtime_ns=2_000_000_000)
+        assert registry.load()
+        assert registry["greet"].text == "Hello there"
+        # Unchanged files are not read again
+        assert registry.files["bye.txt"] is bye
+        assert registry.reloads == 1
+
+    def test_removed_file(self, tmp_path):
+        """Test that a deleted file's prompt is dropped on reload"""
+        write(tmp_path, "greet.txt", "Hello")
+        path = write(tmp_path, "bye.txt", "Bye")
+        registry = PromptRegistry(str(tmp_path), watch_interval=0)
+        registry.load()
+        path.unlink()
+        assert registry.load()
+        assert "bye" not in registry
+
+    def test_missing_folder(self, tmp_path):
+        """Test that a missing folder leaves the prompts empty"""
+        registry = PromptRegistry(str(tmp_path / "missing"), watch_interval=0)
+        assert not registry.load()
+        assert len(registry) == 0
+
+    def test_watcher(self, tmp_path):
+        """Test that the watcher thread picks up a new file"""
+        write(tmp_path, "greet.txt", "Hello")
+        registry = PromptRegistry(str(tmp_path), watch_interval=0.01)
+        registry.load()
+        registry.start()
+        try:
+            write(tmp_path, "bye.txt", "Bye")
+            for _ in range(500):
+                if "bye" in registry:
+                    break
+                registry.stopping.wait(0.01)
+            assert "bye" in registry
+        finally:
+            registry.stop()
+        assert registry.thread is None
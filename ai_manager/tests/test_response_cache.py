@@ -0,0 +1,103 @@
+import pytest
+
+# ai_manager imports openai and soundfile when it is loaded
+pytest.importorskip("openai")
+pytest.importorskip("soundfile")
+
+from ai_manager.response_cache import ResponseCache
+
+MESSAGES = [{"role": "system", "content": "Be brief"}, {"role": "user", "content": "Hours?"}]
+
+
+class TestResponseCache:
+    """Test the ResponseCache class"""
+
+    def setup_method(self):
+        self.cache = None
+
+    def teardown_method(self):
+        if self.cache is not None:
+            self.cache.close()
+
+    def test_key(self):
+        """Test that only identical requests share a key"""
+        key = ResponseCache.key("gpt-4o", MESSAGES)
+        assert key == ResponseCache.key("gpt-4o", [dict(message) for message in MESSAGES])
+        assert key != ResponseCache.key("gpt-4o-mini", MESSAGES)
+        assert key != ResponseCache.key("gpt-4o", MESSAGES[1:])
+        assert key != ResponseCache.key("gpt-4o", MESSAGES, temperature=0.5)
+
+    def test_memory(self):
+        """Test that a stored answer is returned from memory"""
+        self.cache = ResponseCache()
+        key = ResponseCache.key("gpt-4o", MESSAGES)
+        assert self.cache.get(key) is None
+        self.cache.put(key, "Nine to five")
+        assert self.cache.get(key) == "Nine to five"
+        metrics = self.cache.get_metrics()
+        assert metrics['memory_hits'] == 1
+        assert metrics['misses'] == 1
+
+    def test_lru(self):
+        """Test that the least recently used answers leave memory first"""
+        self.cache = ResponseCache(memory_entries=2)
+        self.cache.put("a", "1")
+        self.cache.put("b", "2")
+        self.cache.get("a")
+        self.cache.put("c", "3")
+        assert list(self.cache.entries) == ["a", "c"]
+
+    def test_ttl(self):
+        """Test that an expired answer is not returned"""
+        self.cache = ResponseCache(ttl=-1)
+        self.cache.put("a", "1")
+        assert self.cache.get("a") is None
+        assert "a" not in self.cache.entries
+
+    def test_empty_answer_is_not_stored(self):
+        """Test that an empty answer is not cached"""
+        self.cache = ResponseCache()
+        self.cache.put("a", "")
+        assert self.cache.get_metrics()['stores'] == 0
+
+    def test_sqlite(self, tmp_path):
+        """Test that answers survive a restart through SQLite"""
+        path = str(tmp_path / "responses.sqlite")
+        first = ResponseCache(path)
+        first.put("a", "1", "gpt-4o")
+        first.close()
+
+        self.cache = ResponseCache(path, memory_entries=1)
+        assert self.cache.get("a") == "1"
+        assert self.cache.get_metrics()['disk_hits'] == 1
+        assert self.cache.get("a") == "1"
+        assert self.cache.get_metrics()['memory_hits'] == 1
+
+    def test_sqlite_purge(self, tmp_path):
+        """Test that expired rows are removed from SQLite"""
+        self.cache = ResponseCache(str(tmp_path / "responses.sqlite"), ttl=-1, purge_interval=0)
+        self.cache.put("a", "1")
+        self.cache.put("b", "2")
+        assert self.cache.db.execute("SELECT COUNT(*) FROM responses").fetchone()[0] <= 1
+
+    def test_unwritable_path(self, tmp_path):
+        """Test that a cache that can not open its file works in memory"""
+        self.cache = ResponseCache(str(tmp_path / "missing" / "responses.sqlite"))
+        assert self.cache.db is None
+        self.cache.put("a", "1")
+        assert self.cache.get("a") == "1"
+
+    def test_memory_lookup_does_not_count_misses(self):
+        """Test that get_memory leaves the miss to get_stored"""
+        self.cache = ResponseCache()
+        assert self.cache.get_memory("a") is None
+        assert self.cache.get_metrics()['misses'] == 0
+        assert self.cache.get_stored("a") is None
+        assert self.cache.get_metrics()['misses'] == 1
+
+    def test_memory_lookup_while_sqlite_is_busy(self, tmp_path):
+        """Test that answers in memory are returned while another thread holds SQLite"""
+        self.cache = ResponseCache(str(tmp_path / "responses.sqlite"))
+        self.cache.put("a", "1")
+        with self.cache.db_lock:
+            assert self.cache.get_memory("a") == "1"
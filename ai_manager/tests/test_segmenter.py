@@ -0,0 +1,62 @@
+import pytest
+
+# ai_manager imports openai and soundfile when it is loaded
+pytest.importorskip("openai")
+pytest.importorskip("soundfile")
+
+from ai_manager.segmenter import SentenceSegmenter
+
+
+def stream(segmenter, text, size=3):
+    """Feed text in small pieces like a streamed reply"""
+    chunks = []
+    for start in range(0, len(text), size):
+        chunks.extend(segmenter.feed(text[start:start + size]))
+    return chunks + segmenter.flush()
+
+
+class TestSentenceSegmenter:
+    """Test the SentenceSegmenter class"""
+
+    def test_first_chunk_is_short(self):
+        """Test that the first sentence is cut early and later ones are merged to min_chars"""
+        segmenter = SentenceSegmenter(min_chars=40, first_min_chars=5)
+        text = "Hello there. Yes. I can help. Your order ships on Monday next week."
+        assert stream(segmenter, text) == ["Hello there.", "Yes. I can help. Your order ships on Monday next week."]
+
+    def test_sentence_ending_in_no(self):
+        """Test that a sentence ending with the word no is split"""
+        segmenter = SentenceSegmenter(min_chars=5, first_min_chars=5)
+        assert stream(segmenter, "The answer is no. Call back tomorrow.") == ["The answer is no.", "Call back tomorrow."]
+
+    def test_number_abbreviation(self):
+        """Test that No. before a number does not end a sentence"""
+        segmenter = SentenceSegmenter(min_chars=5, first_min_chars=5)
+        assert stream(segmenter, "Your ticket is No. 42 in line. Please hold.") == ["Your ticket is No. 42 in line.", "Please hold."]
+
+    def test_abbreviations_and_initials(self):
+        """Test that titles and initials do not end a sentence"""
+        segmenter = SentenceSegmenter(min_chars=5, first_min_chars=5)
+        assert stream(segmenter, "Dr. Smith and J. Doe are in. They will call.") == ["Dr. Smith and J. Doe are in.", "They will call."]
+
+    def test_no_end_waits_for_more_text(self):
+        """Test that a dot after no is not cut before the next character is known"""
+        segmenter = SentenceSegmenter(min_chars=5, first_min_chars=5)
+        assert segmenter.feed("That is No. ") == []
+        assert segmenter.feed("7 on the list. Next") == ["That is No. 7 on the list."]
+
+    def test_long_sentence_cut_at_clause(self):
+        """Test that a sentence over max_chars is cut at a clause break"""
+        segmenter = SentenceSegmenter(min_chars=10, first_min_chars=10, max_chars=60)
+        text = "We open at nine in the morning, and we close at six in the evening on weekdays only."
+        chunks = stream(segmenter, text)
+        assert chunks[0] == "We open at nine in the morning,"
+        assert " ".join(chunks) == text
+        assert all(len(chunk) <= 60 for chunk in chunks)
+
+    def test_flush_returns_rest(self):
+        """Test that text without a sentence end is returned by flush"""
+        segmenter = SentenceSegmenter()
+        assert segmenter.feed("Thank you") == []
+        assert segmenter.flush() == ["Thank you"]
+        assert segmenter.flush() == []
@@ -0,0 +1,147 @@
+import os
+import zlib
+
+import numpy as np
+import pytest
+
+# ai_manager imports openai and soundfile when it is loaded
+pytest.importorskip("openai")
+pytest.importorskip("soundfile")
+
+from ai_manager.semantic_cache import SemanticCache, context_key
+
+
+def embed(text):
+    """Bag of words embedding, utterances with the same words are the same question"""
+    vector = np.zeros(64, dtype=np.float32)
+    for word in text.lower().replace("?", "").split():
+        vector[zlib.crc32(word.encode()) % 64] += 1
+    return vector / np.linalg.norm(vector)
+
+
+embed.model_name = "bag-of-words"
+
+SYSTEM = [{"role": "system", "content": "You answer for a bakery"}]
+
+
+class TestSemanticCache:
+    """Test the SemanticCache class"""
+
+    def setup_method(self):
+        self.cache = None
+
+    def teardown_method(self):
+        if self.cache is not None:
+            self.cache.close()
+
+    def create(self, **kwargs):
+        self.cache = SemanticCache(embed, threshold=0.9, **kwargs)
+        return self.cache
+
+    def test_paraphrase_hits(self):
+        """Test that the same words in another order get the stored answer"""
+        cache = self.create()
+        entry_id = cache.store("generic", "when do you open", "At nine.", SYSTEM)
+        match = cache.lookup("generic", "When do you open?", SYSTEM)
+        assert match.entry_id == entry_id
+        assert match.answer == "At nine."
+        assert match.audio_path is None
+        assert cache.lookup("generic", "do you sell bread", SYSTEM) is None
+        assert cache.get_metrics()['hit_rate'] == 0.5
+
+    def test_context_separates_answers(self):
+        """Test that an answer is only given again at the same point of a conversation"""
+        cache = self.create()
+        later = SYSTEM + [{"role": "user", "content": "My name is Ann"}, {"role": "assistant", "content": "Hi Ann"}]
+        cache.store("generic", "what is my name", "Ann.", later)
+        assert cache.lookup("generic", "what is my name", SYSTEM) is None
+        assert cache.lookup("generic", "what is my name", later).answer == "Ann."
+        assert cache.lookup("other", "what is my name", later) is None
+
+    def test_context_key(self):
+        """Test that equal contexts share a key"""
+        assert context_key(SYSTEM) == context_key([dict(SYSTEM[0])])
+        assert context_key(SYSTEM) != context_key(None)
+        assert context_key({'b': 1, 'a': 2}) == context_key({'a': 2, 'b': 1})
+
+    def test_max_entries(self):
+        """Test that the oldest entries are dropped across all contexts"""
+        cache = self.create(max_entries=2)
+        first = cache.store("generic", "when do you open", "At nine.", SYSTEM)
+        cache.store("generic", "do you sell bread", "Yes.", SYSTEM)
+        cache.store("generic", "where are you", "Main street.", [{"role": "user", "content": "hi"}])
+        assert list(cache.entries) == [first + 1, first + 2]
+        assert cache.lookup("generic", "when do you open", SYSTEM) is None
+        assert cache.lookup("generic", "do you sell bread", SYSTEM).answer == "Yes."
+
+    def test_removal_keeps_other_entries(self):
+        """Test that dropping an entry does not mix up the ones left"""
+        cache = self.create(max_entries=3)
+        cache.store("generic", "when do you open", "At nine.", SYSTEM)
+        cache.store("generic", "do you sell bread", "Yes.", SYSTEM)
+        cache.store("generic", "where are you", "Main street.", SYSTEM)
+        cache.store("generic", "can I pay by card", "Sure.", SYSTEM)
+        assert cache.lookup("generic", "where are you", SYSTEM).answer == "Main street."
+        assert cache.lookup("generic", "can I pay by card", SYSTEM).answer == "Sure."
+        assert cache.lookup("generic", "do you sell bread", SYSTEM).answer == "Yes."
+
+    def test_audio_is_bounded(self, tmp_path):
+        """Test that the oldest WAVs are removed beyond max_audio"""
+        cache = self.create(max_audio=1)
+        first = cache.store("generic", "when do you open", "At nine.", SYSTEM)
+        second = cache.store("generic", "do you sell bread", "Yes.", SYSTEM)
+        first_wav = tmp_path / "first.wav"
+        second_wav = tmp_path / "second.wav"
+        first_wav.write_bytes(b"RIFF")
+        second_wav.write_bytes(b"RIFF")
+        cache.set_audio(first, str(first_wav))
+        assert cache.lookup("generic", "when do you open", SYSTEM).audio_path == str(first_wav)
+        cache.set_audio(second, str(second_wav))
+        assert not first_wav.exists()
+        assert cache.lookup("generic", "when do you open", SYSTEM).audio_path is None
+        assert cache.lookup("generic", "do you sell bread", SYSTEM).audio_path == str(second_wav)
+        assert cache.get_metrics()['audio'] == 1
+
+    def test_evicted_entry_removes_its_audio(self, tmp_path):
+        """Test that a WAV goes with its entry, also when it arrives after the entry was dropped"""
+        cache = self.create(max_entries=1)
+        first = cache.store("generic", "when do you open", "At nine.", SYSTEM)
+        wav = tmp_path / "first.wav"
+        wav.write_bytes(b"RIFF")
+        cache.set_audio(first, str(wav))
+        cache.store("generic", "do you sell bread", "Yes.", SYSTEM)
+        assert not wav.exists()
+
+        late = tmp_path / "late.wav"
+        late.write_bytes(b"RIFF")
+        cache.set_audio(first, str(late))
+        assert not late.exists()
+
+    def test_sqlite(self, tmp_path):
+        """Test that entries and their WAVs are loaded again with their context"""
+        path = str(tmp_path / "semantic.sqlite")
+        wav = tmp_path / "answer.wav"
+        wav.write_bytes(b"RIFF")
+        cache = SemanticCache(embed, path=path)
+        entry_id = cache.store("generic", "when do you open", "At nine.", SYSTEM)
+        cache.set_audio(entry_id, str(wav))
+        cache.close()
+
+        cache = self.create(path=path)
+        match = cache.lookup("generic", "open when do you", SYSTEM)
+        assert match.answer == "At nine."
+        assert match.audio_path == str(wav)
+        assert cache.lookup("generic", "open when do you", None) is None
+        assert cache.store("generic", "hello", "Hi.", SYSTEM) == entry_id + 1
+
+    def test_sqlite_limits_on_load(self, tmp_path):
+        """Test that a smaller max_entries is applied to the stored entries"""
+        path = str(tmp_path / "semantic.sqlite")
+        cache = SemanticCache(embed, path=path)
+        for question in ("when do you open", "do you sell bread", "where are you"):
+            cache.store("generic", question, "Answer.", SYSTEM)
+        cache.close()
+
+        cache = self.create(path=path, max_entries=1)
+        assert len(cache.entries) == 1
+        assert cache.db.execute("SELECT COUNT(*) FROM semantic_answers").fetchone()[0] == 1
@@ -22,9 +22,11 @@ from .db import Database, AIIdentityRecord, UserIdentityRecord, FileRecord, Reco
 logger = logging.getLogger(__name__)
 
 class AudioManager:
-    def __init__(self, config):
+    def __init__(self, config, client=None):
         # Access config via dot notation
         self.config = config
+        # OpenAI client to share, e.g. ai_manager's, one is made from config otherwise
+        self.client = client
 
         self.db = Database(self.config.db_path)
         self.file_manager = FileManager()
@@ -140,7 +142,8 @@ class AudioManager:
                 voice=self._ai_identity.voice,  # Fixed: using _ai_identity
                 model=self._ai_identity.model,  # Fixed: using _ai_identity
                 output_path=output_path,
-                config=self.config
+                config=self.config,
+                client=self.client
             )
             
             if not res:
@@ -292,7 +295,8 @@ class AudioManager:
             transcription = transcribe_audio(
                 audio_data=audio_data,
                 audio_path=audio_path,
-                config=self.config
+                config=self.config,
+                client=self.client
             )
 
             # Transcribe the audio
@@ -666,6 +670,7 @@ class AudioManager:
             speech_segment: Dictionary containing segment metadata with keys:
                 - pcm_start_byte: Starting byte position in the file
                 - pcm_end_byte: Ending byte position in the file
+                - pcm_data: Optional raw PCM of the segment, used instead of the file
                 - duration_ms: Optional duration in milliseconds
                 - start_ms: Optional start time in milliseconds
                 - end_ms: Optional end time in milliseconds
@@ -677,7 +682,7 @@ class AudioManager:
             from .transcriber import transcribe_segment
             
             # Check if file exists
-            if not os.path.exists(file_path):
+            if not speech_segment.get('pcm_data') and not (file_path and os.path.exists(file_path)):
                 logger.error(f"Audio file not found: {file_path}")
                 return None
                 
@@ -685,7 +690,8 @@ class AudioManager:
             transcription = transcribe_segment(
                 file_path=file_path,
                 speech_segment=speech_segment,
-                config=self.config
+                config=self.config,
+                client=self.client
             )
             
             if not transcription:
@@ -9,12 +9,12 @@ import wave
 import tempfile
 from pathlib import Path
 import soundfile as sf
-from openai import OpenAI
 from .sound import extract_audio_segment
+from .tts import init_openai_client
 
 logger = logging.getLogger(__name__)
 
-def transcribe_audio(audio_data=None, audio_path=None, config=None):
+def transcribe_audio(audio_data=None, audio_path=None, config=None, client=None):
     """
     Transcribe audio using OpenAI Whisper API
     
@@ -22,34 +22,20 @@ def transcribe_audio(audio_data=None, audio_path=None, config=None):
         audio_data: Can be either raw binary data or numpy array
         audio_path: Optional existing file path that contains audio
         config: Configuration object with openai settings
-        client: Optional pre-initialized OpenAI client
+        client: Optional pre-initialized OpenAI client, the one of config otherwise
         
     Returns:
         The transcribed text or None on failure
     """
     logger.debug(f"Transcribing audio, data type: {type(audio_data) if audio_data else 'None'}, path: {audio_path}")
 
-  
-    # Get OpenAI client
-    client = OpenAI(
-        api_key=config.openai.api_key,
-        organization=config.openai.organization_id
-    )
-
     if audio_data is None and (not audio_path or not os.path.exists(audio_path)):
         logger.error("No valid audio data or path provided")
         return None
     
-    # Use provided client or initialize a new one
+    # Use provided client or the shared one of config
     if not client and config:
-        try:
-            client = OpenAI(
-                api_key=config.openai.api_key,
-                organization=config.openai.organization_id
-            )
-        except Exception as e:
-            logger.error(f"Error initializing OpenAI client: {e}")
-            return None
+        client = init_openai_client(config)
     
     if not client:
         logger.error("No OpenAI client available")
@@ -99,17 +85,21 @@ def transcribe_audio(audio_data=None, audio_path=None, config=None):
         logger.error(f"Error in transcription: {e}")
         return None
 
-def transcribe_segment(file_path, speech_segment, config=None):
+def transcribe_segment(file_path, speech_segment, config=None, client=None):
     """
     Extract an audio segment and transcribe it using OpenAI
     """
-    # Extract the audio segment
-    audio_data, segment_info = extract_audio_segment(
-        file_path, 
-        speech_segment,
-        sample_rate=getattr(config, 'sample_rate', 8000),
-        sample_width=getattr(config, 'sample_width', 2)
-    )
+    # Segments captured in memory carry their own audio
+    if speech_segment.get('pcm_data'):
+        audio_data = speech_segment['pcm_data']
+    else:
+        # Extract the audio segment
+        audio_data, segment_info = extract_audio_segment(
+            file_path, 
+            speech_segment,
+            sample_rate=getattr(config, 'sample_rate', 8000),
+            sample_width=getattr(config, 'sample_width', 2)
+        )
     
     if audio_data is None:
         logger.error("Failed to extract audio segment")
@@ -130,7 +120,8 @@ def transcribe_segment(file_path, speech_segment, config=None):
         # Send the WAV file for transcription
         result = transcribe_audio(
             audio_path=temp_path,
-            config=config
+            config=config,
+            client=client
         )
         return result
     finally:
@@ -7,13 +7,19 @@ import logging
 import os
 from pathlib import Path
 import uuid
+import threading
 from openai import OpenAI
 
 logger = logging.getLogger(__name__)
 
+# Clients by api key and organization, reused so requests share their connections
+clients = {}
+clients_lock = threading.Lock()
+
 def init_openai_client(config):
     """
-    Initialize the OpenAI client using configuration.
+    Get the OpenAI client for a configuration, created on first use.
+    Used when no client is handed in, e.g. ai_manager's shared one.
     
     Args:
         config: Configuration object with openai settings
@@ -23,16 +29,20 @@ def init_openai_client(config):
     """
     try:
         # Access configuration using dot notation
-        client = OpenAI(
-            api_key=config.openai.api_key,
-            organization=config.openai.organization_id
-        )
+        key = (config.openai.api_key, getattr(config.openai, 'organization_id', None))
+        with clients_lock:
+            client = clients.get(key)
+            if client is None:
+                client = clients[key] = OpenAI(
+                    api_key=key[0],
+                    organization=key[1]
+                )
         return client
     except Exception as e:
         logger.error(f"Error initializing OpenAI client: {e}")
         return None
 
-def generate_speech(text, voice, model, output_path, config=None):
+def generate_speech(text, voice, model, output_path, config=None, client=None):
     """
     Generate speech using OpenAI's TTS API and save it as WAV file.
     
@@ -42,13 +52,14 @@ def generate_speech(text, voice, model, output_path, config=None):
         model: TTS model to use
         output_path: Path where to save WAV file
         config: Configuration object with openai settings
+        client: Optional OpenAI client, the one of config otherwise
         
     Returns:
         str: True on success or None on failure
     """
     try:
-        # Initialize OpenAI client
-        client = init_openai_client(config)
+        if not client:
+            client = init_openai_client(config)
         if not client:
             logger.error("Failed to initialize OpenAI client")
             return None
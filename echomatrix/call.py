@@ -3,14 +3,260 @@ import yaml
 import uuid
 from datetime import datetime
 from typing import List, Dict, Optional, Any
+import time
+import threading
 import logging
+from collections import OrderedDict, deque
 
 logger = logging.getLogger(__name__)
 
 
-calls = []
+class CallStore:
+    """
+    Calls by call id.
+
+    A call is active until it is disconnected, then it is archived: late
+    events still find it, but it is no longer iterated. Archived calls are
+    evicted persisted_ttl seconds after they were saved, archive_ttl
+    seconds after they ended at the latest, and the oldest ones first when
+    more than max_archived are held. Expiry runs on every lookup and
+    archive and only looks at the oldest archived and persisted calls, so
+    it costs nothing while no call is due. Events arriving for an evicted
+    call go to a throwaway Call instead of creating a new active one.
+    """
+
+    def __init__(self, archive_ttl=600, persisted_ttl=30, max_archived=1000):
+        """
+        Args:
+            archive_ttl: Seconds an ended call is kept at most
+            persisted_ttl: Seconds an ended call is kept after it was saved
+            max_archived: Ended calls kept at most
+        """
+        self.archive_ttl = archive_ttl
+        self.persisted_ttl = persisted_ttl
+        self.max_archived = max_archived
+        self.active = {}
+        # call id -> (call, time it expires), in archive order
+        self.archived = OrderedDict()
+        # (time it expires, call id) of saved calls, in save order
+        self.saved = deque()
+        # Ids of evicted calls, bounded
+        self.evicted = OrderedDict()
+        self.lock = threading.Lock()
+
+    def configure(self, archive_ttl=None, persisted_ttl=None, max_archived=None):
+        """Change the eviction limits"""
+        if archive_ttl is not None:
+            self.archive_ttl = archive_ttl
+        if persisted_ttl is not None:
+            self.persisted_ttl = persisted_ttl
+        if max_archived is not None:
+            self.max_archived = max_archived
+
+    def get(self, call_id):
+        """Get an active or archived call or None"""
+        self.expire()
+        call = self.active.get(call_id)
+        if call is None:
+            archived = self.archived.get(call_id)
+            if archived is not None:
+                call = archived[0]
+        return call
+
+    def get_or_create(self, call_id, factory=None):
+        """
+        Get a call, creating an active one if it is not known
+
+        Args:
+            call_id: ID of the call
+            factory: Class used to create the call
+
+        Returns:
+            Call: The call
+        """
+        call = self.get(call_id)
+        if call is not None:
+            return call
+        factory = factory or Call
+        with self.lock:
+            call = self.active.get(call_id)
+            if call is None:
+                if call_id in self.evicted:
+                    logger.debug(f"Event for evicted call {call_id} dropped")
+                    return factory(call_id=call_id)
+                logger.info(f"Creating new call with ID: {call_id}")
+                call = self.active[call_id] = factory(call_id=call_id)
+        return call
+
+    def archive(self, call_id):
+        """
+        Move a call that ended out of the active calls
+
+        Returns:
+            Call: The call or None if it is not active
+        """
+        now = time.time()
+        with self.lock:
+            call = self.active.pop(call_id, None)
+            if call is not None:
+                self.archived[call_id] = (call, now + self.archive_ttl)
+        self.expire(now)
+        return call
+
+    def persisted(self, call_id):
+        """Shorten the lifetime of an archived call once it has been saved"""
+        expires = time.time() + self.persisted_ttl
+        with self.lock:
+            archived = self.archived.get(call_id)
+            if archived is not None and expires < archived[1]:
+                self.archived[call_id] = (archived[0], expires)
+                self.saved.append((expires, call_id))
+
+    def expire(self, now=None):
+        """
+        Evict archived calls whose time is up or that exceed max_archived
+
+        Returns:
+            int: Number of calls evicted
+        """
+        now = now or time.time()
+        expired = []
+        with self.lock:
+            # Calls are archived with the same ttl, so the oldest expires first
+            while self.archived:
+                call_id, (call, expires) = next(iter(self.archived.items()))
+                if expires > now and len(self.archived) <= self.max_archived:
+                    break
+                self.evict(call_id, expired)
+            # Saved calls expire in the order they were saved
+            while self.saved and self.saved[0][0] <= now:
+                expires, call_id = self.saved.popleft()
+                archived = self.archived.get(call_id)
+                if archived is not None and archived[1] <= now:
+                    self.evict(call_id, expired)
+            while len(self.evicted) > max(self.max_archived, 1024):
+                self.evicted.popitem(last=False)
+        if expired:
+            logger.debug(f"Evicted {len(expired)} ended calls, {len(self.active)} active, {len(self.archived)} archived")
+        return len(expired)
+
+    def evict(self, call_id, expired):
+        del self.archived[call_id]
+        self.evicted[call_id] = True
+        expired.append(call_id)
+
+    def __iter__(self):
+        """Iterate over the active calls"""
+        with self.lock:
+            return iter(list(self.active.values()))
+
+    def __len__(self):
+        return len(self.active)
+
+    def __contains__(self, call_id):
+        return call_id in self.active or call_id in self.archived
+
+
+calls = CallStore()
+
+# Events kept for the whole call, all others only in a bounded history
+KEY_EVENTS = frozenset((
+    "call_answered",
+    "call_disconnected",
+    "recording_started",
+    "recording_stopped",
+    "speech_segment_complete",
+))
+
+plain_types = (str, int, float, bool, type(None))
+
+
+def plain_value(value):
+    """
+    Reduce an event value to plain data, None for anything that is not
+    (SWIG objects, audio buffers, ...)
+    """
+    if isinstance(value, plain_types):
+        return value
+    if isinstance(value, dict):
+        return plain_fields(value)
+    if isinstance(value, (list, tuple)):
+        return [item for item in map(plain_value, value) if item is not None]
+    return None
+
+
+def plain_fields(data):
+    """Keep the plain data of an event, see plain_value"""
+    result = {}
+    for key, value in data.items():
+        value = plain_value(value)
+        if value is not None:
+            result[key] = value
+    return result
+
+
+def iso_time(timestamp):
+    return datetime.fromtimestamp(timestamp).isoformat() if timestamp else None
+
+
+class ChatMessage:
+    """One message of the conversation"""
+
+    __slots__ = ('role', 'text', 'timestamp', 'processed')
+
+    def __init__(self, role, text, processed=None):
+        """
+        Args:
+            role: user, system or assistant
+            text: Text of the message
+            processed: Time it was processed, None while it is not
+        """
+        self.role = role
+        self.text = text
+        self.timestamp = time.time()
+        self.processed = processed
+
+    def to_dict(self):
+        return {
+            "role": self.role,
+            "text": self.text,
+            "timestamp": iso_time(self.timestamp),
+            "processed": iso_time(self.processed),
+        }
+
+
+class CallEvent:
+    """An event of a call, reduced to plain data"""
+
+    __slots__ = ('event_type', 'timestamp', 'data')
+
+    def __init__(self, event_type, data):
+        self.event_type = event_type
+        self.timestamp = time.time()
+        self.data = plain_fields(data)
+
+    def to_dict(self):
+        return {"event_type": self.event_type, "timestamp": iso_time(self.timestamp), **self.data}
+
+
+class OutgoingAudio:
+    """Audio played to the caller, by reference to its file"""
+
+    __slots__ = ('path', 'metadata', 'timestamp')
+
+    def __init__(self, path, metadata=None):
+        self.path = path
+        self.metadata = plain_fields(metadata or {})
+        self.timestamp = time.time()
+
+    def to_dict(self):
+        return {"path": self.path, "timestamp": iso_time(self.timestamp), **self.metadata}
+
 
 class Call:
+    # Events outside KEY_EVENTS kept per call
+    event_history = 200
+
     def __init__(self, call_id: Optional[str] = None):
         """
         Initialize a new Call object to track a conversation
@@ -23,37 +269,38 @@ class Call:
         self.end_time = None
         self.duration_sec = 0
         self.processed = None
-        self.chat = []  # List of text messages/transcripts
+        self.chat = []  # ChatMessage list
         self.unprocessed  =[]
         self.actions = []  # Actions taken during call
-        self.input_audio = None  # Full input audio path or data
-        self.outgoing_audio = []  # List of outgoing audio segments
+        self.input_audio = None  # Full input audio path
+        self.outgoing_audio = []  # OutgoingAudio list
         self.metadata = {}  # Additional call metadata
-        self.events= []
+        self.events = []  # CallEvent list of KEY_EVENTS
+        self.recent_events = deque(maxlen=self.event_history)  # Every other CallEvent, oldest dropped
+        self.context = None  # ConversationContext sent to the LLM
+        self.speculation = None  # Committed Speculation answering the next turn
 
     def add_speech_segment(self, segment: Dict[str, Any]) -> None:
         """Add a speech segment to unprocessed list"""
         self.unprocessed.append(segment)
 
-    def add_event(self, event: Dict[str, Any]) -> None:
-        """Add an event to the events list"""
-        self.events.append(event)
+    def add_event(self, event_type: str, event: Dict[str, Any]) -> None:
+        """
+        Record an event, reduced to its plain data
+        
+        Args:
+            event_type: Type of the event
+            event: Keyword arguments of the event
+        """
+        record = CallEvent(event_type, event)
+        if event_type in KEY_EVENTS:
+            self.events.append(record)
+        else:
+            self.recent_events.append(record)
         
     def add_chat_message(self, role: str, text: str,processed: bool = None) -> None:
         """Add a chat message to the conversation history"""
-        
-        if processed:
-            processed_time=datetime.now()
-        else :
-            processed_time=None
-
-        self.chat.append({
-            "processed_time": None,
-            "processed": processed_time,
-            "role": role,
-            "text": text,
-            "timestamp": datetime.now()
-        })
+        self.chat.append(ChatMessage(role, text, time.time() if processed else None))
         if not processed:
             self.processed=None
         
@@ -61,17 +308,13 @@ class Call:
         """Record an action taken during the call"""
         self.actions.append({
             "type": action_type,
-            "details": details,
+            "details": plain_fields(details),
             "timestamp": datetime.now()
         })
     
-    def add_outgoing_audio(self, audio_data: bytes, metadata: Dict[str, Any]) -> None:
-        """Add outgoing audio data with metadata"""
-        self.outgoing_audio.append({
-            "audio": audio_data,
-            "metadata": metadata,
-            "timestamp": datetime.now()
-        })
+    def add_outgoing_audio(self, path: str, metadata: Optional[Dict[str, Any]] = None) -> None:
+        """Record audio played to the caller by the path of its file"""
+        self.outgoing_audio.append(OutgoingAudio(path, metadata))
     
     def end_call(self) -> None:
         """Mark the call as ended and calculate duration"""
@@ -85,52 +328,42 @@ class Call:
             "start_time": self.start_time.isoformat(),
             "end_time": self.end_time.isoformat() if self.end_time else None,
             "duration_sec": self.duration_sec,
-            "chat": self.chat,
+            "chat": [msg.to_dict() for msg in self.chat],
             "actions": self.actions,
+            "events": [event.to_dict() for event in self.events],
+            "recent_events": [event.to_dict() for event in self.recent_events],
             "unprocessed_count": len(self.unprocessed),
-            "outgoing_audio_count": len(self.outgoing_audio),
+            "outgoing_audio": [audio.to_dict() for audio in self.outgoing_audio],
             "metadata": self.metadata
         }
 
     @staticmethod
-    def get_by_id(calls_list: List["Call"], call_id: str) -> Optional["Call"]:
+    def get_by_id(calls_list: "CallStore", call_id: str) -> Optional["Call"]:
         """
-        Find a call by its ID in a list of calls
+        Find a call by its ID
         
         Args:
-            calls_list: List of Call objects to search
+            calls_list: CallStore to search
             call_id: ID of the call to find
             
         Returns:
             Call object if found, None otherwise
         """
-        for call in calls_list:
-            if call.id == call_id:
-                return call
-        return None
+        return calls_list.get(call_id)
 
     @classmethod
-    def get_or_create_call(cls, calls_list: List["Call"], call_id: str) -> "Call":
+    def get_or_create_call(cls, calls_list: "CallStore", call_id: str) -> "Call":
         """
         Get a call by ID or create a new one if it doesn't exist
         
         Args:
-            calls_list: List of Call objects
+            calls_list: CallStore holding the calls
             call_id: ID of the call to find or create
             
         Returns:
             Existing or newly created Call object
         """
-        # Try to find existing call
-        call = cls.get_by_id(calls_list, call_id)
-        
-        # Create new call if not found
-        if not call:
-            logger.info(f"Creating new call with ID: {call_id}")
-            call = cls(call_id=call_id)
-            calls_list.append(call)
-        
-        return call
+        return calls_list.get_or_create(call_id, cls)
 
     def save(self, file_path: Optional[str] = None) -> str:
             """
@@ -176,7 +409,7 @@ class Call:
             return False
             
         # Check if all messages are processed
-        all_processed = all(msg.get("processed") is not None for msg in self.chat)
+        all_processed = all(msg.processed is not None for msg in self.chat)
         
         # Update the Call's processed state
         if all_processed:
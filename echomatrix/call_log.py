@@ -0,0 +1,218 @@
+import os
+import json
+import time
+import queue
+import logging
+import threading
+import yaml
+from datetime import datetime, date
+
+logger = logging.getLogger(__name__)
+
+
+def plain(value):
+    """Turn values json/msgpack can not encode into strings"""
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, (set, tuple)):
+        return list(value)
+    return str(value)
+
+
+class CallLogWriter:
+    """
+    Writes the logs of finished calls on a background thread.
+
+    submit() takes a snapshot of the call on the caller's thread, so events
+    added to the call later can not break its log, and queues it. The writer
+    thread takes the snapshots off the queue in batches and appends one record per call to a segment file,
+    JSON lines or a msgpack stream, which is rotated once it reaches
+    segment_mb. Segments are flushed after every batch and fsynced every
+    fsync_interval seconds. One YAML file per call can still be exported.
+    """
+
+    def __init__(self, directory, log_format="jsonl", batch_size=100, flush_interval=1.0,
+                 fsync_interval=5.0, segment_mb=64, yaml_export=False, on_written=None):
+        """
+        Args:
+            directory: Directory of the segment files
+            log_format: "jsonl" or "msgpack" (needs the msgpack package)
+            batch_size: Calls written at most per batch
+            flush_interval: Seconds a call waits at most before its batch is written
+            fsync_interval: Seconds between fsyncs of the segment
+            segment_mb: Size after which a new segment is started
+            yaml_export: Also save every call as a YAML file in directory
+            on_written: Called with the call id once its log is written
+        """
+        self.directory = directory
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.fsync_interval = fsync_interval
+        self.segment_bytes = int(segment_mb * 1024 * 1024)
+        self.yaml_export = yaml_export
+        self.on_written = on_written
+        self.msgpack = None
+        if log_format == "msgpack":
+            try:
+                import msgpack
+                self.msgpack = msgpack
+            except ImportError:
+                logger.warning("call_log_format 'msgpack' needs the msgpack package (pip install msgpack), using jsonl")
+                log_format = "jsonl"
+        self.log_format = log_format
+        self.queue = queue.Queue()
+        self.thread = None
+        self.segment = None
+        self.segment_path = None
+        self.segment_count = 0
+        self.last_fsync = time.monotonic()
+        self.dirty = False
+        self.written = 0
+        self.errors = 0
+
+    def start(self):
+        """Start the writer thread"""
+        os.makedirs(self.directory, exist_ok=True)
+        self.thread = threading.Thread(target=self.run, name="call-log", daemon=True)
+        self.thread.start()
+
+    def submit(self, call):
+        """
+        Queue the log of a finished call
+
+        Args:
+            call: The Call to write
+        """
+        try:
+            record = call.to_dict()
+        except Exception as e:
+            self.errors += 1
+            logger.error(f"Error building log of call {call.id}: {e}")
+            return
+        self.queue.put((call.id, record))
+
+    def stop(self, timeout=10):
+        """Write what is queued, fsync and stop the writer thread"""
+        if self.thread is None:
+            return
+        self.queue.put(None)
+        self.thread.join(timeout)
+        self.thread = None
+
+    def run(self):
+        running = True
+        while running:
+            try:
+                entry = self.queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                self.sync()
+                continue
+            batch = []
+            while entry is not None:
+                batch.append(entry)
+                if len(batch) >= self.batch_size:
+                    break
+                try:
+                    entry = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+            if entry is None:
+                running = False
+            if batch:
+                self.write_batch(batch)
+            if time.monotonic() - self.last_fsync >= self.fsync_interval:
+                self.sync()
+        self.sync()
+        self.close_segment()
+
+    def encode(self, record):
+        if self.msgpack is not None:
+            return self.msgpack.packb(record, default=plain, use_bin_type=True)
+        return (json.dumps(record, default=plain, separators=(',', ':')) + "\n").encode()
+
+    def write_batch(self, batch):
+        """
+        Append a batch of call logs to the current segment
+
+        Args:
+            batch: (call id, record) pairs, the records taken by submit()
+        """
+        data = []
+        # Only the calls that were encoded are written, the others stay archived until they expire
+        encoded = []
+        for call_id, record in batch:
+            try:
+                data.append(self.encode(record))
+            except Exception as e:
+                self.errors += 1
+                logger.error(f"Error encoding log of call {call_id}: {e}")
+                continue
+            encoded.append((call_id, record))
+        if not encoded:
+            return
+        try:
+            segment = self.open_segment()
+            segment.write(b"".join(data))
+            segment.flush()
+            self.dirty = True
+        except Exception as e:
+            self.errors += len(encoded)
+            logger.error(f"Error writing {len(encoded)} call logs to {self.segment_path}: {e}")
+            return
+
+        for call_id, record in encoded:
+            if self.yaml_export:
+                self.export_yaml(call_id, record)
+            if self.on_written:
+                self.on_written(call_id)
+        self.written += len(encoded)
+        logger.debug(f"Wrote {len(encoded)} call logs to {self.segment_path}")
+
+    def export_yaml(self, call_id, record):
+        """Save the record of a call as its own YAML file, like Call.save()"""
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        file_path = os.path.join(self.directory, f"call_{call_id}_{timestamp}.yaml")
+        try:
+            with open(file_path, 'w') as yaml_file:
+                yaml.dump(record, yaml_file, default_flow_style=False, sort_keys=False)
+        except Exception as e:
+            logger.error(f"Error exporting call {call_id} as YAML: {e}")
+
+    def open_segment(self):
+        if self.segment is not None and self.segment.tell() >= self.segment_bytes:
+            self.sync()
+            self.close_segment()
+        if self.segment is None:
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            extension = "msgpack" if self.msgpack is not None else "jsonl"
+            self.segment_count += 1
+            self.segment_path = os.path.join(self.directory, f"calls_{timestamp}_{os.getpid()}_{self.segment_count}.{extension}")
+            self.segment = open(self.segment_path, "ab")
+            logger.info(f"Writing call logs to {self.segment_path}")
+        return self.segment
+
+    def sync(self):
+        """fsync the current segment"""
+        self.last_fsync = time.monotonic()
+        if self.segment is None or not self.dirty:
+            return
+        try:
+            self.segment.flush()
+            os.fsync(self.segment.fileno())
+            self.dirty = False
+        except Exception as e:
+            logger.error(f"Error syncing {self.segment_path}: {e}")
+
+    def close_segment(self):
+        if self.segment is not None:
+            self.segment.close()
+            self.segment = None
+
+    def get_metrics(self):
+        """Get calls written, errors and calls waiting"""
+        return {
+            'written': self.written,
+            'errors': self.errors,
+            'pending': self.queue.qsize(),
+            'segment': self.segment_path,
+        }
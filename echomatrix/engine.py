@@ -2,10 +2,16 @@ import os
 import logging
 import time
 import sys
+import threading
+import asyncio
+import functools
 from .config import default_config, engine_instance
 from .log import set_logging
 from .event_handlers import *
-from .call import calls
+from .call import calls, Call
+from .pipeline import TurnScheduler
+from .call_log import CallLogWriter
+from .speculation import Speculator
 
 # Simplified path handling
 parent_dir = os.path.abspath(os.path.join(os.path.dirname(os.path.dirname(__file__)),"config_manager"))
@@ -19,7 +25,7 @@ sys.path.append(parent_dir)
 
 from  config_manager  import Config
 from  audio_manager import AudioManager
-from  ai_manager import AIManager
+from  ai_manager import AIManager, SentenceSegmenter, PCM_SAMPLE_RATE, get_loop, stop_loop, close_openai_clients
 import sip_manager
 
 logger = logging.getLogger(__name__)
@@ -32,16 +38,51 @@ class engine:
             global config,audio_manager
             # Load configuration
             self.config= Config(config_path=config_path, default_config=default_config, env_prefix='AUDIO_MANAGER_')
-            self.audio_manager=AudioManager(self.config.audio_manager)
             self.ai_manager=AIManager(self.config.ai_manager)
+            # Transcription and TTS go through the same pooled client as the LLM requests
+            self.audio_manager=AudioManager(self.config.audio_manager, client=self.ai_manager.client)
             
             set_logging(self.config.echomatrix.log_level)
             
-            # Create the agent
-            agent = sip_manager.create_agent(self.config.sip_manager, agent_id="emit_event")
+            # Create the agent, a pool of agent processes when more than one worker is configured
+            if getattr(self.config.sip_manager, 'workers', 1) > 1:
+                agent = sip_manager.create_agent_pool(self.config.sip_manager, agent_id="emit_event")
+            else:
+                agent = sip_manager.create_agent(self.config.sip_manager, agent_id="emit_event")
             
             self.agent=agent
             engine_instance["instance"] = self
+
+            # Ended calls are evicted once saved or after a TTL
+            calls.configure(archive_ttl=getattr(self.config.echomatrix, 'call_archive_ttl', 600),
+                            persisted_ttl=getattr(self.config.echomatrix, 'call_persisted_ttl', 30),
+                            max_archived=getattr(self.config.echomatrix, 'call_max_archived', 1000))
+            Call.event_history = getattr(self.config.echomatrix, 'call_event_history', 200)
+            options = self.config.echomatrix
+            self.call_log = CallLogWriter(getattr(options, 'call_log_dir', "/var/log/echomatrix/calls"),
+                                          log_format=getattr(options, 'call_log_format', "jsonl"),
+                                          batch_size=getattr(options, 'call_log_batch_size', 100),
+                                          flush_interval=getattr(options, 'call_log_flush_interval', 1.0),
+                                          fsync_interval=getattr(options, 'call_log_fsync_interval', 5.0),
+                                          segment_mb=getattr(options, 'call_log_segment_mb', 64),
+                                          yaml_export=getattr(options, 'call_log_yaml', False),
+                                          on_written=calls.persisted)
+            self.call_log.start()
+
+            # Calls with a new transcript are handed to the turn workers
+            self.stopping = threading.Event()
+            self.turns = TurnScheduler(self.process_call, workers=getattr(self.config.echomatrix, 'turn_workers', 8))
+            # Conversation turns answered from the response cache when their prompt opted in
+            self.context_prompt = getattr(options, 'context_prompt', "generic")
+            self.cache_replies = self.ai_manager.is_cached(self.context_prompt)
+            # Later turns are looked up in the semantic cache too, by the whole conversation before them
+            self.semantic_all_turns = getattr(options, 'semantic_cache_all_turns', False)
+            # Prepares replies while the caller pauses, see Speculator
+            self.speculator = None
+            if getattr(options, 'speculative', False):
+                self.speculator = Speculator(self.transcribe, functools.partial(self.ai_manager.chat_stream, cache=self.cache_replies),
+                                             max_per_call=getattr(options, 'speculation_max_per_call', 20),
+                                             workers=getattr(options, 'speculation_workers', 8))
             
             # Register event handlers for all event types
             # Call events
@@ -55,6 +96,8 @@ class engine:
             # Speech events
             agent.register_event(sip_manager.EventType.SPEECH_DETECTED, on_speech_detected)
             agent.register_event(sip_manager.EventType.SPEECH_SEGMENT_COMPLETE, on_speech_segment_complete)
+            agent.register_event(sip_manager.EventType.SPEECH_PAUSED, on_speech_paused)
+            agent.register_event(sip_manager.EventType.SPEECH_RESUMED, on_speech_resumed)
             
             # Audio playback events
             agent.register_event(sip_manager.EventType.AUDIO_PLAYING, on_audio_playing)
@@ -85,16 +128,22 @@ class engine:
             
             start_time = time.time()
             try:
-                while 1:
-                    self.process_calls()
-                    time.sleep(.01)
-                    
+                # Turns are started by the event handlers, this thread only waits for shutdown
+                while not self.stopping.wait(1):
+                    pass
                         
             except KeyboardInterrupt:
                 logger.info("Interrupted by user")
             
             # Stop the agent
             agent.stop()
+            if self.speculator is not None:
+                self.speculator.shutdown()
+            self.turns.shutdown()
+            close_openai_clients()
+            stop_loop()
+            sip_manager.shutdown_events()
+            self.call_log.stop()
             
         except Exception as e:
             logger.error(f"Error: {e}")
@@ -102,36 +151,183 @@ class engine:
             logger.error(traceback.format_exc())
             sys.exit(1)
 
-    def process_calls(self):
+    def process_call(self, call):
+        """
+        Run one conversation turn: answer the transcripts of a call that
+        have not been processed yet. Runs on a turn worker, never twice
+        at the same time for the same call.
+        """
+        if call.processed:
+            return
+        try:
+            context = self.get_context(call)
+            # Only answers that do not depend on anything the caller said before are shared between calls
+            semantic = (len(context) == 0 and context.summary is None) or self.semantic_all_turns
+            basis = context.messages() if semantic else None
+            said = []
+            for msg in list(call.chat):
+                if not msg.processed:
+                    context.add(msg.role, msg.text)
+                    if msg.role == "user":
+                        said.append(msg.text)
+                    msg.processed=time.time()
+            utterance = " ".join(said)
+            speculation, call.speculation = call.speculation, None
+            # A question answered before, also in other words, skips the LLM and TTS
+            match = self.ai_manager.lookup_answer(self.context_prompt, utterance, basis) if semantic and speculation is None else None
+            if match is not None:
+                result=match.answer
+                self.play_answer(call, match)
+            elif speculation is not None:
+                # Generated while the caller was still pausing, often complete by now
+                result=self.reply_streaming(call, speculation.pieces())
+            elif getattr(self.config.echomatrix, 'chat_stream', True):
+                # Each sentence is spoken as soon as it is complete
+                result=self.reply_streaming(call, self.ai_manager.chat_stream(context.messages(), cache=self.cache_replies))
+            else:
+                result=self.ai_manager.chat_messages(context.messages(), cache=self.cache_replies)
+                if result:
+                    self.speak(call, result)
+            logger.info(f"processing result: {result}")
+            if not result:
+                return
+            context.add("assistant", result)
+            if semantic and match is None:
+                self.ai_manager.store_answer(self.context_prompt, utterance, result, basis)
+
+            call.add_chat_message(role="system",text=result,processed=True)
+
+            call.update_processed_state()    
+        except Exception as e:
+            logger.error(f"Error processing call segment: {e}")
+
+    def get_context(self, call):
+        """Get the role tagged history of a call, kept under the token budget"""
+        if call.context is None:
+            options = self.config.echomatrix
+            call.context = self.ai_manager.create_context(getattr(options, 'context_prompt', "generic"),
+                                                          budget=getattr(options, 'context_token_budget', 3000),
+                                                          summarize=getattr(options, 'context_summarize', False))
+        return call.context
+
+    def schedule_call(self, call):
+        """Queue a turn for a call that received new input"""
+        self.turns.schedule(call)
+
+    def transcribe(self, segment):
+        """Transcribe a speech segment, from its file or its own audio"""
+        return self.audio_manager.transcribe_segment(segment.get("audio_path"), segment)
+
+    def speculate(self, call, segment):
         """
-        Process all active calls and handle any new unprocessed transcriptions
-        This should be called periodically from your main loop
+        Start answering the segment the caller paused in. Only done while
+        the call is idle, so the reply is based on the whole conversation.
         """
-        
-        for call in calls:
-            # Check if there are unprocessed transcriptions to handle
-            if not call.processed:
-                try:
-                    old_transcript = []
-                    new_transcript= []
-                    for msg in call.chat:
-                       # if msg['processed']:
-                       #     old_transcript .append( f"{msg['role']} : {msg['text']} ")
-                       # else:
-                       if not msg['processed']:
-                            new_transcript .append( f"{msg['role']} : {msg['text']} ")
-                       msg['processed']=True
-                    # ok now we have what we WERE talkinmg about
-                    # and what we ARe talking about...
-                    messages=old_transcript+new_transcript
-                    result=self.ai_manager.chat("generic",{'text':"\n".join(messages)})
-                    logger.info(f"processing result: {result}")
-
-                    call.add_chat_message(role="system",text=result,processed=True)
-                    path=self.ai_manager.generate_speech(result)
-                    logger.info(f"Engine:_PLAY_WAV {path},{call.id}")
-                    self.agent.play_wav_to_call(path,call.id)
-
-                    call.update_processed_state()    
-                except Exception as e:
-                    logger.error(f"Error processing call segment: {e}")
+        if self.speculator is None or self.turns.busy(call) or call.speculation is not None:
+            return
+        if not (segment.get("audio_path") or segment.get("pcm_data")):
+            return
+        if any(not msg.processed for msg in call.chat):
+            return
+        self.speculator.start(call.id, segment, self.get_context(call).messages(), len(call.chat))
+
+    def cancel_speculation(self, call, ended=False):
+        """Drop the speculation of a call whose caller spoke again or hung up"""
+        if self.speculator is None:
+            return
+        if ended:
+            self.speculator.forget(call.id)
+        else:
+            self.speculator.cancel(call.id)
+
+    def commit_speculation(self, call, segment):
+        """
+        Answer a completed segment with the reply prepared for it
+
+        Returns:
+            bool: True if the turn was scheduled with the speculation,
+            False if the segment has to be transcribed and answered as usual
+        """
+        if self.speculator is None:
+            return False
+        speculation = self.speculator.commit(call.id, segment, len(call.chat))
+        if speculation is None:
+            return False
+        logger.info(f"Transcript: {speculation.transcript} created for call {call.id} while paused")
+        call.add_chat_message("user", speculation.transcript)
+        call.speculation = speculation
+        self.schedule_call(call)
+        return True
+
+    def reply_streaming(self, call, pieces):
+        """
+        Queue every sentence of a streamed reply for playback as soon as
+        it is complete
+
+        Args:
+            call: The Call to answer
+            pieces: Iterable of the pieces of the reply
+
+        Returns:
+            str: The whole reply
+        """
+        options = self.config.echomatrix
+        segmenter = SentenceSegmenter(min_chars=getattr(options, 'tts_chunk_min_chars', 40),
+                                      first_min_chars=getattr(options, 'tts_first_chunk_min_chars', 10),
+                                      max_chars=getattr(options, 'tts_chunk_max_chars', 250))
+        parts = []
+        spoken = 0
+        for piece in pieces:
+            parts.append(piece)
+            for sentence in segmenter.feed(piece):
+                # The first sentence interrupts what is playing, the others queue behind it
+                self.speak(call, sentence, enqueue=spoken > 0)
+                spoken += 1
+        for sentence in segmenter.flush():
+            self.speak(call, sentence, enqueue=spoken > 0)
+            spoken += 1
+        return "".join(parts).strip()
+
+    def play_answer(self, call, match):
+        """Play a semantic cache hit, its WAV if it was synthesized already"""
+        logger.info(f"Answer for call {call.id} from the semantic cache ({match.score:.3f}): {match.utterance}")
+        if match.audio_path and os.path.exists(match.audio_path):
+            self.agent.play_wav_to_call(match.audio_path, call.id)
+        else:
+            self.speak(call, match.answer)
+
+    def speak(self, call, text, enqueue=False):
+        """
+        Say a text on a call. The TTS audio is streamed into the call while
+        it is synthesized, falling back to a WAV file when streaming is
+        turned off (ai_manager.openai.tts_stream) or the agent can not stream.
+
+        Args:
+            call: The Call to speak on
+            text: Text to say
+            enqueue: Play after what is already queued instead of interrupting it
+        """
+        stream = None
+        if getattr(self.config.ai_manager.openai, 'tts_stream', True):
+            stream = self.agent.play_stream(call.id, sample_rate=PCM_SAMPLE_RATE, enqueue=enqueue)
+
+        if stream is None:
+            path=self.ai_manager.generate_speech(text)
+            logger.info(f"Engine:_PLAY_WAV {path},{call.id}")
+            if enqueue:
+                self.agent.enqueue_wav_to_call(path,call.id)
+            else:
+                self.agent.play_wav_to_call(path,call.id)
+            return
+
+        # The stream already holds its place in the playback queue, so
+        # sentences are synthesized in parallel and still play in order
+        logger.info(f"Engine:_PLAY_STREAM {call.id}")
+        asyncio.run_coroutine_threadsafe(self.fill_stream(stream, text), get_loop())
+
+    async def fill_stream(self, stream, text):
+        """Synthesize a text into a playback stream, runs on the AI event loop"""
+        try:
+            await self.ai_manager.astream_speech(text, stream.write)
+        finally:
+            stream.finish()
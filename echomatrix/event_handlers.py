@@ -37,7 +37,7 @@ def on_recording_started(event_type, **data):
     logger.info(f"MAIN APP: Recording started for call {call_id}: {path}")
 
     call = Call.get_or_create_call(calls, call_id)
-    call.add_event(data)
+    call.add_event(event_type, data)
 
 
 def on_recording_paused(event_type, **data):
@@ -46,7 +46,7 @@ def on_recording_paused(event_type, **data):
     logger.info(f"MAIN APP: Recording paused for call {call_id}")
 
     call = Call.get_or_create_call(calls, call_id)
-    call.add_event(data)
+    call.add_event(event_type, data)
 
 def on_recording_resumed(event_type, **data):
     """Handler for recording resumed events"""
@@ -54,7 +54,7 @@ def on_recording_resumed(event_type, **data):
     logger.info(f"MAIN APP: Recording resumed for call {call_id}")
 
     call = Call.get_or_create_call(calls, call_id)
-    call.add_event(data)
+    call.add_event(event_type, data)
 
 def on_recording_stopped(event_type, **data):
     """Handler for recording stopped events"""
@@ -64,19 +64,28 @@ def on_recording_stopped(event_type, **data):
     logger.info(f"MAIN APP: Recording stopped for call {call_id}: {path}, duration: {duration:.2f}s")
 
     call = Call.get_or_create_call(calls, call_id)
-    call.add_event(data)
+    call.add_event(event_type, data)
 
 
 # Call related events
 def on_call_answered(event_type, **data):
     """Handler for call answered events"""
     call_id = data.get('call_id')
-    logger.info(f"MAIN APP: Call answered: {call_id} {call_info.remoteUri}")
-    call_info = data.get('call_iinfo')
+    logger.info(f"MAIN APP: Call answered: {call_id} {data.get('remote_uri')}")
+
+    # Keep the plain fields of the SWIG CallInfo, not the object
+    call_info = data.get('call_info')
+    if call_info is not None:
+        data['call_info'] = {
+            'remote_uri': call_info.remoteUri,
+            'local_uri': call_info.localUri,
+            'remote_contact': call_info.remoteContact,
+            'call_id_string': call_info.callIdString,
+        }
 
      # Get or create call
     call = Call.get_or_create_call(calls, call_id)
-    call.add_event(data)
+    call.add_event(event_type, data)
 
     
 
@@ -86,24 +95,21 @@ def on_call_disconnected(event_type, **data):
     duration = data.get('duration', 0)
     logger.info(f"MAIN APP: Call disconnected: {call_id}, duration: {duration:.2f}s")
 
-    # Get the call object
-    call = Call.get_by_id(calls, call_id)
+    # Move the call out of the active calls, late events still find it
+    call = calls.archive(call_id)
     if not call:
         logger.warning(f"Call not found for ID: {call_id}")
         return
     
     # Complete the call data
     call.end_call()
-    call.add_event(data)
-    
-    # Create directory for call logs if it doesn't exist
-    call_log_dir = "/var/log/echomatrix/calls"
-    
-    # Generate filename with timestamp
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    filename = f"{call_log_dir}/call_{call_id}_{timestamp}.yaml"
+    call.add_event(event_type, data)
+
+    engine=engine_instance.get("instance")
+    engine.cancel_speculation(call, ended=True)
     
-    call.save(filename)
+    # Snapshot taken here, written in batches by the call log thread, which releases the call afterwards
+    engine.call_log.submit(call)
     
 
 # Silence detection events
@@ -114,7 +120,7 @@ def on_silence_detected(event_type, **data):
     logger.info(f"MAIN APP: Silence detected on call {call_id} for {duration:.2f}s")
 
     call = Call.get_or_create_call(calls, call_id)
-    call.add_event(data)
+    call.add_event(event_type, data)
 
 def on_silence_ended(event_type, **data):
     """Handler for silence ended events"""
@@ -123,7 +129,7 @@ def on_silence_ended(event_type, **data):
     logger.info(f"MAIN APP: Silence ended on call {call_id} after {duration:.2f}s")
 
     call = Call.get_or_create_call(calls, call_id)
-    call.add_event(data)
+    call.add_event(event_type, data)
 
 # Speech segment events
 def on_speech_detected(event_type, **data):
@@ -133,7 +139,7 @@ def on_speech_detected(event_type, **data):
     logger.info(f"MAIN APP: Speech detected on call {call_id} at {start_ms}ms")
 
     call = Call.get_or_create_call(calls, call_id)
-    call.add_event(data)
+    call.add_event(event_type, data)
 
 def on_speech_segment_complete(event_type, **data):
     """Handler for speech segment complete events"""
@@ -143,23 +149,51 @@ def on_speech_segment_complete(event_type, **data):
     logger.info(f"MAIN APP: Speech segment completed on call {call_id}: {segment}")
 
     call = Call.get_or_create_call(calls, call_id)
-    call.add_event(data)
+    call.add_event(event_type, data)
 
-    # Transcribe the segment
+    # The reply may already be under way since the caller paused
     engine=engine_instance.get("instance")
+    if engine.commit_speculation(call, segment):
+        return
+
+    # Transcribe the segment
     audio_path = segment.get("audio_path")
 
-    if audio_path:
+    if audio_path or segment.get("pcm_data"):
         transcript = engine.audio_manager.transcribe_segment(audio_path, segment)
         if transcript:
             call.add_chat_message("user", transcript)
             logger.info(f"Transcript: {transcript} created for call {call_id}")
+            engine.schedule_call(call)
         else:
             logger.warning(f"Segment:  Transcript failed for call {call_id}")
     else:
         logger.warning(f"Segment: No audiopath for for call {call_id}")
 
 
+def on_speech_paused(event_type, **data):
+    """Handler for speech paused events"""
+    call_id = data.get('call_id')
+    segment = data.get('segment', {})
+    logger.info(f"MAIN APP: Speech paused on call {call_id} at {segment.get('end_ms', 0)}ms")
+
+    call = Call.get_or_create_call(calls, call_id)
+    call.add_event(event_type, data)
+
+    # Start answering, the reply is used if the segment completes unchanged
+    engine_instance.get("instance").speculate(call, segment)
+
+def on_speech_resumed(event_type, **data):
+    """Handler for speech resumed events"""
+    call_id = data.get('call_id')
+    logger.info(f"MAIN APP: Speech resumed on call {call_id}")
+
+    call = Call.get_or_create_call(calls, call_id)
+    call.add_event(event_type, data)
+
+    # The segment goes on, a reply to its first part is of no use
+    engine_instance.get("instance").cancel_speculation(call)
+
 
 # Audio playback events
 def on_audio_playing(event_type, **data):
@@ -170,7 +204,8 @@ def on_audio_playing(event_type, **data):
     logger.info(f"MAIN APP: Audio playback started on call {call_id}: {file_path}, duration: {duration:.2f}s")
 
     call = Call.get_or_create_call(calls, call_id)
-    call.add_event(data)
+    call.add_event(event_type, data)
+    call.add_outgoing_audio(file_path, {'duration': duration, 'item_id': data.get('item_id')})
 
 def on_audio_ended(event_type, **data):
     """Handler for audio ended events"""
@@ -179,5 +214,5 @@ def on_audio_ended(event_type, **data):
     logger.info(f"MAIN APP: Audio playback ended on call {call_id}: {file_path}")
 
     call = Call.get_or_create_call(calls, call_id)
-    call.add_event(data)
+    call.add_event(event_type, data)
 
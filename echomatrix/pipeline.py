@@ -0,0 +1,79 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+class TurnScheduler:
+    """
+    Runs conversation turns for many calls at once.
+
+    A call is scheduled when something new arrives for it (e.g. a
+    transcript). Turns of different calls run concurrently on a bounded
+    thread pool, turns of the same call never overlap: a call scheduled
+    while its turn is running is run once more right after it, however
+    often it was scheduled in between.
+    """
+
+    def __init__(self, handler, workers=8):
+        """
+        Args:
+            handler: Called with the call to run one turn
+            workers: Turns running at the same time
+        """
+        self.handler = handler
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="turn")
+        self.lock = threading.Lock()
+        # call id -> True when the call was scheduled again while running
+        self.active = {}
+        self.stopped = False
+
+    def schedule(self, call):
+        """
+        Make a call ready to run a turn
+
+        Args:
+            call: The Call with new input
+
+        Returns:
+            bool: True if a turn was started, False if it is already queued or running
+        """
+        with self.lock:
+            if self.stopped:
+                return False
+            if call.id in self.active:
+                self.active[call.id] = True
+                return False
+            self.active[call.id] = False
+        self.executor.submit(self.run, call)
+        return True
+
+    def run(self, call):
+        """Run turns of a call until nothing new arrived while running"""
+        while True:
+            try:
+                self.handler(call)
+            except Exception as e:
+                logger.error(f"Error running turn for call {call.id}: {e}")
+            with self.lock:
+                if not self.active.get(call.id) or self.stopped:
+                    self.active.pop(call.id, None)
+                    return
+                self.active[call.id] = False
+
+    def busy(self, call):
+        """True while a turn of the call is queued or running"""
+        with self.lock:
+            return call.id in self.active
+
+    def pending(self):
+        """Number of calls queued or running"""
+        with self.lock:
+            return len(self.active)
+
+    def shutdown(self, wait=True):
+        """Stop accepting calls and let the running turns finish"""
+        with self.lock:
+            self.stopped = True
+        self.executor.shutdown(wait=wait)
@@ -0,0 +1,228 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+class Speculation:
+    """
+    Reply to a speech segment prepared before the segment is complete.
+
+    A speculation worker fills in the transcript and then the reply as it
+    is streamed. Once the segment is committed, pieces() replays what was
+    generated so far and follows the rest as it arrives.
+    """
+
+    __slots__ = ('call_id', 'start_ms', 'end_ms', 'basis', 'transcript', 'parts',
+                 'done', 'cancelled', 'transcribed', 'condition')
+
+    def __init__(self, call_id, segment, basis):
+        """
+        Args:
+            call_id: ID of the call
+            segment: The partial speech segment
+            basis: Number of chat messages the reply is based on
+        """
+        self.call_id = call_id
+        self.start_ms = segment.get('start_ms')
+        self.end_ms = segment.get('end_ms')
+        self.basis = basis
+        self.transcript = None
+        self.parts = []
+        self.done = False
+        self.cancelled = False
+        self.transcribed = threading.Event()
+        self.condition = threading.Condition()
+
+    def add(self, piece):
+        """Append a piece of the reply"""
+        with self.condition:
+            self.parts.append(piece)
+            self.condition.notify_all()
+
+    def finish(self):
+        """Mark the reply as complete, also when it failed or was cancelled"""
+        with self.condition:
+            self.done = True
+            self.condition.notify_all()
+        self.transcribed.set()
+
+    def cancel(self):
+        """Stop generating, the reply will not be used"""
+        self.cancelled = True
+        self.finish()
+
+    def pieces(self):
+        """
+        Get the reply
+
+        Yields:
+            str: The pieces generated so far, then the rest as they are generated
+        """
+        index = 0
+        while True:
+            with self.condition:
+                while index >= len(self.parts) and not self.done:
+                    self.condition.wait()
+                if index >= len(self.parts):
+                    return
+                piece = self.parts[index]
+            index += 1
+            yield piece
+
+
+class Speculator:
+    """
+    Starts answering while the caller is still pausing.
+
+    When the caller pauses inside a segment, the segment so far is
+    transcribed and the LLM request is started on a worker. Speech
+    resuming cancels it and the next pause starts over. If the segment
+    then completes unchanged, the speculation is committed and its reply,
+    complete or still streaming, answers the turn. One speculation runs per
+    call at a time and at most max_per_call are started per call, which
+    caps what replies that are thrown away cost.
+    """
+
+    def __init__(self, transcribe, generate, max_per_call=20, workers=8):
+        """
+        Args:
+            transcribe: Called with a speech segment, returns its transcript
+            generate: Called with the messages, yields the pieces of the reply
+            max_per_call: Speculations started at most per call
+            workers: Speculations running at the same time
+        """
+        self.transcribe = transcribe
+        self.generate = generate
+        self.max_per_call = max_per_call
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="speculate")
+        self.lock = threading.Lock()
+        # call id -> running Speculation
+        self.running = {}
+        # call id -> speculations started
+        self.counts = {}
+        self.started = 0
+        self.committed = 0
+        self.cancelled = 0
+        self.limited = 0
+
+    def start(self, call_id, segment, messages, basis):
+        """
+        Start answering a partial segment, cancelling the call's previous speculation
+
+        Args:
+            call_id: ID of the call
+            segment: The speech segment so far
+            messages: Messages of the conversation before the segment
+            basis: Number of chat messages of the call
+
+        Returns:
+            Speculation: The started speculation or None when the call's limit is reached
+        """
+        with self.lock:
+            count = self.counts.get(call_id, 0)
+            if count >= self.max_per_call:
+                self.limited += 1
+                return None
+            previous = self.running.pop(call_id, None)
+            if previous is not None:
+                self.cancelled += 1
+            speculation = self.running[call_id] = Speculation(call_id, segment, basis)
+            self.counts[call_id] = count + 1
+            self.started += 1
+        if previous is not None:
+            previous.cancel()
+        logger.debug(f"Speculating on call {call_id} at {speculation.end_ms}ms ({count + 1}/{self.max_per_call})")
+        self.executor.submit(self.run, speculation, segment, messages)
+        return speculation
+
+    def cancel(self, call_id):
+        """Cancel the running speculation of a call"""
+        with self.lock:
+            speculation = self.running.pop(call_id, None)
+            if speculation is not None:
+                self.cancelled += 1
+        if speculation is not None:
+            speculation.cancel()
+            logger.debug(f"Speculation on call {call_id} cancelled")
+
+    def commit(self, call_id, segment, basis):
+        """
+        Take the speculation of a segment that completed
+
+        Waits for the transcript if it is still being made.
+
+        Args:
+            call_id: ID of the call
+            segment: The complete speech segment
+            basis: Number of chat messages of the call now
+
+        Returns:
+            Speculation: The speculation with its transcript, None if there is
+            none or it does not match the segment
+        """
+        with self.lock:
+            speculation = self.running.pop(call_id, None)
+        if speculation is None:
+            return None
+        if speculation.start_ms != segment.get('start_ms') or speculation.basis != basis:
+            with self.lock:
+                self.cancelled += 1
+            speculation.cancel()
+            return None
+        speculation.transcribed.wait()
+        if speculation.cancelled or not speculation.transcript:
+            return None
+        with self.lock:
+            self.committed += 1
+        logger.debug(f"Speculation on call {call_id} committed")
+        return speculation
+
+    def forget(self, call_id):
+        """Cancel and drop the state of a call that ended"""
+        self.cancel(call_id)
+        with self.lock:
+            self.counts.pop(call_id, None)
+
+    def run(self, speculation, segment, messages):
+        try:
+            if speculation.cancelled:
+                return
+            speculation.transcript = self.transcribe(segment)
+            speculation.transcribed.set()
+            if speculation.cancelled or not speculation.transcript:
+                return
+            stream = self.generate(messages + [{"role": "user", "content": speculation.transcript}])
+            try:
+                for piece in stream:
+                    if speculation.cancelled:
+                        break
+                    speculation.add(piece)
+            finally:
+                # Closing the generator closes the HTTP stream of a cancelled reply
+                stream.close()
+        except Exception as e:
+            logger.error(f"Error speculating on call {speculation.call_id}: {e}")
+        finally:
+            speculation.finish()
+
+    def get_metrics(self):
+        """Get speculations started, committed, cancelled and refused by the per call limit"""
+        with self.lock:
+            return {
+                'started': self.started,
+                'committed': self.committed,
+                'cancelled': self.cancelled,
+                'limited': self.limited,
+                'running': len(self.running),
+            }
+
+    def shutdown(self, wait=True):
+        """Cancel all speculations and stop the workers"""
+        with self.lock:
+            running = list(self.running.values())
+            self.running.clear()
+        for speculation in running:
+            speculation.cancel()
+        self.executor.shutdown(wait=wait)
@@ -2,30 +2,34 @@ from .log import set_logging
 from .account import Account
 from .call import Call
 from .agent import SipAgent
+from .commands import CommandType
+from .stream import StreamBuffer, create_stream
+from .prompt_cache import PromptCache, get_prompt_cache
+from .supervisor import AgentPool, create_agent_pool
 import threading
 import logging
 import time
-import queue
 
 logger = logging.getLogger(__name__)
 
 
-from .events import EventType
+from .events import EventType, ANY_EVENT, ANY_AGENT, configure_events, get_event_metrics, shutdown_events
 
 def create_agent(config, agent_id=None):
     set_logging(config.log_level)
+    # Listeners run on the PJSUA thread (sync) or on the event workers (async)
+    configure_events(config)
     # Set agent ID for namespacing
     agent_id = agent_id or f"agent-{threading.get_ident()}"
     
     # Enhance the agent with event methods
     from .events import register_listener, unregister_listener, EventType, emit_event
 
-    audio_command_queue = queue.Queue()
-
     # Use a shared Event object instead of thread_local
     agent_running = threading.Event()
     agent_initialized = threading.Event()
     agent_object = [None]  # Use a list to allow mutation from inside the thread
+    loop_stamp = [None]  # time.monotonic() of the PJSUA thread's last loop pass
     
     def pjsua_thread_main():
         """
@@ -37,28 +41,22 @@ def create_agent(config, agent_id=None):
             logger.debug(f"Starting agent {agent_id} in PJSUA thread")
             
             # Initialize the agent in this thread
-            agent = SipAgent(config)
+            agent = SipAgent(config, agent_id=agent_id)
             agent_object[0] = agent
             
-            # Store the ID
-            agent.id = agent_id
-            
-            # Add event methods to agent
+            # Add event methods to agent, listeners are indexed by agent ID
             def register_namespaced_event(event_type, callback):
-                def namespaced_callback(evt_type, **kwargs):
-                    if kwargs.get('agent_id', agent.id) == agent.id:
-                        return callback(evt_type, **kwargs)
-                return register_listener(event_type, namespaced_callback)
+                return register_listener(event_type, callback, agent_id=agent.id)
+
+            def unregister_namespaced_event(event_type, callback):
+                return unregister_listener(event_type, callback, agent_id=agent.id)
             
             def emit_namespaced_event(event_type, **kwargs):
                 kwargs['agent_id'] = agent.id
                 return emit_event(event_type, **kwargs)
-            
- 
-                        
 
             agent.register_event = register_namespaced_event
-            agent.unregister_event = unregister_listener
+            agent.unregister_event = unregister_namespaced_event
             agent.emit_event = emit_namespaced_event
             agent.EventType = EventType
             
@@ -77,13 +75,24 @@ def create_agent(config, agent_id=None):
             agent.ep.utilTimerSchedule(config.welcome_message_length, None)
 
   
-            # In the main loop, add queue processing:
+            # Between passes this thread sleeps on the command channel, so a
+            # queued command runs as soon as it arrives. With PJSUA worker
+            # threads (thread_count > 0, the default) they poll the network
+            # and the thread only wakes for commands or after command_idle_ms.
+            # With thread_count 0 it has to poll SIP/media itself and also
+            # wakes every command_poll_ms.
+            worker_threads = getattr(config, 'thread_count', 1) > 0 and not getattr(config, 'main_thread_only', False)
+            if worker_threads:
+                wait_ms = getattr(config, 'command_idle_ms', 100)
+            else:
+                wait_ms = getattr(config, 'command_poll_ms', 2)
+                logger.info(f"No PJSUA worker threads, agent {agent.id} polls SIP/media every {wait_ms}ms")
+
             while agent_running.is_set():
-                # Process any pending audio commands
-                agent.process_audio_queue()
-                
-                event_count = agent.ep.libHandleEvents(100)
-                time.sleep(0.01)  # Small sleep to prevent CPU hogging
+                loop_stamp[0] = time.monotonic()
+                agent.process_commands()
+                agent.commands.wait(wait_ms / 1000)
+                agent.ep.libHandleEvents(0)
                         
             # Cleanup
             logger.info(f"Shutting down agent {agent.id}")
@@ -158,59 +167,136 @@ def create_agent(config, agent_id=None):
         def is_running(self):
             """Check if the agent is currently running"""
             return agent_running.is_set() and self._thread and self._thread.is_alive()
+        
+        def loop_age(self):
+            """Seconds since the PJSUA thread last ran its loop, None before it started"""
+            stamp = loop_stamp[0]
+            return time.monotonic() - stamp if stamp is not None else None
             
         def register_event(self, event_type, callback):
-            """Register an event listener"""
-            def namespaced_callback(evt_type, **kwargs):
-                if kwargs.get('agent_id', self.id) == self.id:
-                    return callback(evt_type, **kwargs)
-            return register_listener(event_type, namespaced_callback)
+            """Register an event listener for this agent's events (ANY_EVENT for all of them)"""
+            return register_listener(event_type, callback, agent_id=self.id)
         
         def unregister_event(self, event_type, callback):
             """Unregister an event listener"""
-            return unregister_listener(event_type, callback)
+            return unregister_listener(event_type, callback, agent_id=self.id)
         
         def emit_event(self, event_type, **kwargs):
             """Emit an event"""
             kwargs['agent_id'] = self.id
             return emit_event(event_type, **kwargs)
+
+        def event_metrics(self):
+            """Get event queue depth and handler latency statistics"""
+            return get_event_metrics()
                 
     
-        def play_wav_to_call(self, file_path, call_id):
+        def send_command(self, command_type, **params):
             """
-            Queue a WAV file to play on a specific call
+            Queue a command for the PJSUA thread, which wakes up to run it
             
             Args:
-                file_path: Path to the WAV file
-                call_id: ID of the call to play the file on
+                command_type: One of CommandType
+                **params: Parameters of the command (call_id, file_path, ...)
             
             Returns:
                 bool: True if successfully queued, False otherwise
             """
             if not self.is_running():
-                logger.error("Agent not running, cannot play WAV file")
+                logger.error(f"Agent not running, cannot send {command_type}")
                 return False
                     
             if not agent_object[0]:
-                logger.error("Agent not initialized, cannot play WAV file")
+                logger.error(f"Agent not initialized, cannot send {command_type}")
                 return False
+
+            logger.debug(f"Queueing {command_type} for call {params.get('call_id')}")
+            agent_object[0].commands.put(command_type, **params)
+            return True
+
+        def play_wav_to_call(self, file_path, call_id):
+            """
+            Queue a WAV file to play on a specific call
             
-            try:
-                logger.info(f"Queueing WAV file {file_path} for call {call_id}")
-                
-                # Access the agent's queue directly
-                agent_object[0].audio_command_queue.put({
-                    'type': 'play_wav',
-                    'file_path': file_path,
-                    'call_id': call_id,
-                    'timestamp': time.time()
-                })
-                
-                logger.info(f"Successfully queued audio playback request")
-                return True
-            except Exception as e:
-                logger.error(f"Error queueing WAV file: {e}")
-                import traceback
-                logger.error(traceback.format_exc())
-                return False
+            Args:
+                file_path: Path to the WAV file
+                call_id: ID of the call to play the file on
+            
+            Returns:
+                bool: True if successfully queued, False otherwise
+            """
+            return self.send_command(CommandType.PLAY_WAV, file_path=file_path, call_id=call_id)
+
+        def enqueue_wav_to_call(self, file_path, call_id):
+            """
+            Queue a WAV file to play after what is already playing on a call
+            
+            Args:
+                file_path: Path to the WAV file
+                call_id: ID of the call to play the file on
+            """
+            return self.send_command(CommandType.ENQUEUE_WAV, file_path=file_path, call_id=call_id)
+
+        def play_stream(self, call_id, sample_rate, enqueue=False):
+            """
+            Start playing PCM that is still being produced, e.g. a streaming TTS response
+            
+            Args:
+                call_id: ID of the call to play the stream on
+                sample_rate: Sample rate of the PCM that will be written
+                enqueue: Play after what is already queued instead of interrupting it
+            
+            Returns:
+                StreamBuffer: Call write() with 16 bit mono PCM chunks and finish()
+                              at the end, None if the command could not be queued
+            """
+            stream = create_stream(config, sample_rate)
+            if not self.send_command(CommandType.PLAY_STREAM, stream=stream, call_id=call_id, enqueue=enqueue):
+                return None
+            return stream
+
+        def skip_audio(self, call_id):
+            """Queue skipping to the next queued item of a call"""
+            return self.send_command(CommandType.SKIP_AUDIO, call_id=call_id)
+
+        def clear_audio_queue(self, call_id):
+            """Queue dropping the items waiting behind the one playing on a call"""
+            return self.send_command(CommandType.CLEAR_AUDIO_QUEUE, call_id=call_id)
+
+        def stop_audio(self, call_id):
+            """Queue stopping the audio playing on a call"""
+            return self.send_command(CommandType.STOP_AUDIO, call_id=call_id)
+
+        def hangup(self, call_id, status_code=None):
+            """Queue hanging up a call"""
+            return self.send_command(CommandType.HANGUP, call_id=call_id, status_code=status_code)
+
+        def pause_recording(self, call_id):
+            """Queue pausing the recording of a call"""
+            return self.send_command(CommandType.PAUSE_RECORDING, call_id=call_id)
+
+        def resume_recording(self, call_id):
+            """Queue resuming the recording of a call"""
+            return self.send_command(CommandType.RESUME_RECORDING, call_id=call_id)
+
+        def transfer(self, call_id, destination):
+            """
+            Queue a blind transfer
+            
+            Args:
+                call_id: ID of the call to transfer
+                destination: SIP URI to transfer the call to
+            """
+            return self.send_command(CommandType.TRANSFER, call_id=call_id, destination=destination)
+
+        def prompt_cache_metrics(self):
+            """Get hits, misses, conversions and disk use of the prompt cache"""
+            cache = get_prompt_cache()
+            return cache.get_metrics() if cache else {}
+
+        def command_metrics(self):
+            """Get pending commands and enqueue to execute latency per command type"""
+            if not agent_object[0]:
+                return {}
+            return agent_object[0].commands.get_metrics()
     return AgentWrapper()
\ No newline at end of file
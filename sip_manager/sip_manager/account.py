@@ -4,24 +4,32 @@ import pjsua2 as pj
 import time
 from .call import Call
 from .player import AudioPlayer
+from .registry import call_registry
 
 logger = logging.getLogger(__name__)
 
 
 # Extend Account class to handle callbacks
 class Account(pj.Account):
-    def __init__(self,config):
+    def __init__(self,config,agent_id=None,commands=None):
         pj.Account.__init__(self)
-        self.calls = []
+        # Live calls by Call-ID string, shared with the recorder and player
+        self.calls = call_registry
         self.config=config
+        # Stamped on every event of this account's calls
+        self.agent_id=agent_id
+        # Command channel of the agent, media callbacks post back to the PJSUA thread through it
+        self.commands=commands
         
     def onIncomingCall(self, prm):
         logger.info(f"Incoming call received with ID: {prm.callId}")
         call = Call(self, prm.callId,self.config)
-        self.calls.append(call)
         
         try:
             call_info = call.getInfo()
+            call.call_id = call_info.callIdString
+            # The registry also keeps the Python object alive for pjsua
+            self.calls.add(call.call_id, call, self.agent_id)
             logger.info(f"Call from: {call_info.remoteUri}")
             
             # Answer directly - don't wait
@@ -38,6 +46,18 @@ class Account(pj.Account):
         except Exception as e:
             logger.error(f"Error in onIncomingCall: {e}")
         
+    def find_call(self, call_id):
+        """
+        Find one of this account's calls
+
+        Args:
+            call_id: Call-ID string of the call
+
+        Returns:
+            Call: The call or None
+        """
+        return self.calls.find_call(call_id)
+
     def play_wav_to_call(self, wav_file_path, call_id=None):
         """
         Play a WAV file to a specific call or the first active call
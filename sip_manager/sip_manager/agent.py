@@ -2,20 +2,47 @@ import os
 import time
 import logging
 import pjsua2 as pj
-import queue
 from .events import emit_event, EventType
 from .account import Account
-from .recorder import audio_recorders
+from .recorder import AudioRecorder
+from .registry import call_registry
+from .player import AudioPlayer
+from .commands import CommandChannel, CommandType
+from .stream import create_stream
+from .prompt_cache import get_prompt_cache
 from .endpoint import CustomEndpoint
 
 logger = logging.getLogger(__name__)
 
 class SipAgent:
-    def __init__(self, config=None):
+    # Class used for the SIP account, the pool distributor swaps it for a redirecting one
+    account_class = Account
+
+    def __init__(self, config=None, agent_id=None):
+        self.id = agent_id
         self.account = None
         self.running = False
         self.config = config
-        self.audio_command_queue = queue.Queue()
+        self.commands = CommandChannel()
+        # Streams fed by STREAM_WRITE commands, by stream_id
+        self.streams = {}
+        # WAV playback is served from bridge native copies
+        get_prompt_cache(self.config)
+        self.command_handlers = {
+            CommandType.PLAY_WAV: self.command_play_wav,
+            CommandType.ENQUEUE_WAV: self.command_enqueue_wav,
+            CommandType.PLAY_STREAM: self.command_play_stream,
+            CommandType.STREAM_WRITE: self.command_stream_write,
+            CommandType.STREAM_END: self.command_stream_end,
+            CommandType.SKIP_AUDIO: self.command_skip_audio,
+            CommandType.CLEAR_AUDIO_QUEUE: self.command_clear_audio_queue,
+            CommandType.PLAYBACK_EOF: self.command_playback_eof,
+            CommandType.STOP_AUDIO: self.command_stop_audio,
+            CommandType.HANGUP: self.command_hangup,
+            CommandType.PAUSE_RECORDING: self.command_pause_recording,
+            CommandType.RESUME_RECORDING: self.command_resume_recording,
+            CommandType.TRANSFER: self.command_transfer,
+        }
             
         # Create endpoint
         self.ep = CustomEndpoint(self.config.silence_check_interval)
@@ -113,10 +140,10 @@ class SipAgent:
         acc_cfg.sipConfig.authCreds.append(cred)
         
         # Create the account
-        self.account = Account(self.config)
+        self.account = self.account_class(self.config, agent_id=self.id, commands=self.commands)
         self.account.create(acc_cfg)
 
-        emit_event(EventType.ACCOUNT_REGISTERED, account_uri=acc_cfg.idUri,registrar=acc_cfg.regConfig.registrarUri)
+        emit_event(EventType.ACCOUNT_REGISTERED, agent_id=self.id, account_uri=acc_cfg.idUri,registrar=acc_cfg.regConfig.registrarUri)
 
         logger.info(f"SIP account created: {acc_cfg.idUri}")
 
@@ -177,30 +204,111 @@ class SipAgent:
             logger.warning("No active account or calls to play audio to")
             return False
                     
-    def process_audio_queue(self):
-        """Process any pending audio playback commands"""
-        try:
-            # Only try to get a command if the queue isn't empty
-            if not self.audio_command_queue.empty():
-                cmd = self.audio_command_queue.get_nowait()
-                if cmd.get('type') == 'play_wav':
-                    file_path = cmd.get('file_path')
-                    call_id = cmd.get('call_id')
-                    logger.info(f"Processing audio command to play {file_path} on call {call_id}")
-                    if self.account and file_path and call_id:
-                        success = self.account.play_wav_to_call(file_path, call_id)
-                        logger.info(f"Audio command processed successfully: {success}")
-                        # Mark the task as done
-                        self.audio_command_queue.task_done()
-                        return success
-                # Mark the task as done even if we couldn't process it
-                self.audio_command_queue.task_done()
-        except queue.Empty:
-            # Queue was empty - this is normal, not an error
-            pass
-        except Exception as e:
-            logger.error(f"Error processing audio queue: {e}")
-            import traceback
-            logger.error(traceback.format_exc())
-        
-        return False
\ No newline at end of file
+    def process_commands(self):
+        """
+        Run every pending command from the command channel.
+        Must be called on the PJSUA thread.
+
+        Returns:
+            int: Number of commands run
+        """
+        return self.commands.drain(self.run_command)
+
+    def run_command(self, cmd):
+        """Run a single command dict from the command channel"""
+        handler = self.command_handlers.get(cmd.get('type'))
+        if handler is None:
+            logger.warning(f"Unknown command: {cmd.get('type')}")
+            return False
+        if not self.account:
+            logger.warning(f"No account, dropping command {cmd.get('type')}")
+            return False
+        success = handler(cmd)
+        logger.info(f"Command {cmd.get('type')} for call {cmd.get('call_id')} processed: {success}")
+        return success
+
+    def command_play_wav(self, cmd):
+        file_path = cmd.get('file_path')
+        call_id = cmd.get('call_id')
+        if not file_path or not call_id:
+            return False
+        return self.account.play_wav_to_call(file_path, call_id)
+
+    def command_enqueue_wav(self, cmd):
+        file_path = cmd.get('file_path')
+        call_id = cmd.get('call_id')
+        if not file_path or not call_id:
+            return False
+        return AudioPlayer.play_wav_to_call(self.account, file_path, call_id, enqueue=True)
+
+    def command_play_stream(self, cmd):
+        # In process callers hand over the buffer itself, the agent pool
+        # sends its PCM as STREAM_WRITE commands instead
+        stream = cmd.get('stream')
+        if stream is None:
+            stream = create_stream(self.config, cmd.get('sample_rate'))
+            self.streams[cmd.get('stream_id')] = stream
+        return AudioPlayer.play_stream_to_call(self.account, stream, cmd.get('call_id'),
+                                               enqueue=cmd.get('enqueue', False))
+
+    def command_stream_write(self, cmd):
+        stream = self.streams.get(cmd.get('stream_id'))
+        if stream is None:
+            return False
+        stream.write(cmd.get('pcm', b''))
+        return True
+
+    def command_stream_end(self, cmd):
+        stream = self.streams.pop(cmd.get('stream_id'), None)
+        if stream is None:
+            return False
+        stream.finish()
+        return True
+
+    def command_skip_audio(self, cmd):
+        return AudioPlayer.skip_audio(self.account, cmd.get('call_id'))
+
+    def command_clear_audio_queue(self, cmd):
+        return AudioPlayer.clear_queue(self.account, cmd.get('call_id'))
+
+    def command_playback_eof(self, cmd):
+        return AudioPlayer.playback_eof(self.account, cmd.get('call_id'), cmd.get('item_id'))
+
+    def command_stop_audio(self, cmd):
+        return AudioPlayer.stop_audio(self.account, cmd.get('call_id'))
+
+    def command_hangup(self, cmd):
+        call = self.account.find_call(cmd.get('call_id'))
+        if not call:
+            logger.warning(f"Call with ID {cmd.get('call_id')} not found")
+            return False
+        prm = pj.CallOpParam(True)
+        if cmd.get('status_code'):
+            prm.statusCode = cmd['status_code']
+        call.hangup(prm)
+        return True
+
+    def command_pause_recording(self, cmd):
+        entry = call_registry.get(cmd.get('call_id'))
+        recorder = entry.recorder if entry else None
+        if not recorder:
+            logger.warning(f"No recording for call {cmd.get('call_id')}")
+            return False
+        return AudioRecorder.pause_recording(recorder)
+
+    def command_resume_recording(self, cmd):
+        entry = call_registry.get(cmd.get('call_id'))
+        recorder = entry.recorder if entry else None
+        if not recorder:
+            logger.warning(f"No recording for call {cmd.get('call_id')}")
+            return False
+        return AudioRecorder.resume_recording(recorder)
+
+    def command_transfer(self, cmd):
+        call = self.account.find_call(cmd.get('call_id'))
+        destination = cmd.get('destination')
+        if not call or not destination:
+            logger.warning(f"Cannot transfer call {cmd.get('call_id')} to {destination}")
+            return False
+        call.xfer(destination, pj.CallOpParam(True))
+        return True
@@ -4,8 +4,8 @@ import logging
 import pjsua2 as pj
 
 from .events import emit_event, EventType
-from .player import audio_players  
-from .recorder import AudioRecorder, audio_recorders
+from .recorder import AudioRecorder
+from .registry import call_registry
 
 logger = logging.getLogger(__name__)
 
@@ -15,17 +15,24 @@ class Call(pj.Call):
         pj.Call.__init__(self, acc, call_id)
         self.config = config
         self.acc = acc
+        self.agent_id = getattr(acc, 'agent_id', None)
+        # Call-ID string and active audio media, cached to avoid SWIG round trips
+        self.call_id = None
+        self.audio_media = None
         self.current_recording_path = None
         self.silence_detection_active = False
         
     def onCallState(self, prm):
         ci = self.getInfo()
         call_id = ci.callIdString
+        self.call_id = call_id
         logger.info(f"Call state: {ci.stateText}")
         
         if ci.state == pj.PJSIP_INV_STATE_CONFIRMED:
             # This state is triggered when the call is established
-            emit_event(EventType.CALL_ANSWERED, call_id=call_id,remote_uri=ci.remoteUri,call_info=ci)
+            entry = call_registry.add(call_id, self, self.agent_id)
+            entry.confirmed = True
+            emit_event(EventType.CALL_ANSWERED, agent_id=self.agent_id, call_id=call_id,remote_uri=ci.remoteUri,call_info=ci)
             
                   # Start recording immediately
             self.start_recording(call_id)
@@ -33,23 +40,23 @@ class Call(pj.Call):
         # If call is disconnected, clean up
         elif ci.state == pj.PJSIP_INV_STATE_DISCONNECTED:
             logger.info("Call disconnected")
+            entry = call_registry.remove(call_id)
             # Clean up devices
-            try:
-                if call_id in audio_players:
-                    del audio_players[call_id]
+            if entry is not None:
+                if entry.playback is not None:
+                    entry.playback.close()
+                    entry.playback = None
                     logger.info(f"Cleaned up audio player for call {call_id}")
-            except Exception as e:
-                logger.warning(f"Error cleaning up audio player: {e}")
-            try:
-                if call_id in audio_recorders:
-                    del audio_recorders[call_id]
-                    logger.info(f"Cleaned up recorder for call {call_id}")
-            except Exception as e:
-                logger.warning(f"Error cleaning up recorder: {e}")
+                try:
+                    if entry.recorder is not None:
+                        AudioRecorder.release(entry.recorder)
+                        entry.recorder = None
+                        logger.info(f"Cleaned up recorder for call {call_id}")
+                except Exception as e:
+                    logger.warning(f"Error cleaning up recorder: {e}")
+            self.audio_media = None
                 
-            emit_event(EventType.CALL_DISCONNECTED, call_id=call_id,reason=ci.lastReason)
-            if self in self.acc.calls:
-                self.acc.calls.remove(self)
+            emit_event(EventType.CALL_DISCONNECTED, agent_id=self.agent_id, call_id=call_id,reason=ci.lastReason)
 
     def onCallMediaState(self, prm):
         """Called when media state changes"""
@@ -57,6 +64,9 @@ class Call(pj.Call):
             logger.info("Call media state changed")
             ci = self.getInfo()
 
+            # Media may have been renegotiated, look it up again next time
+            self.audio_media = None
+
             # Check if the call is active
             if ci.state != pj.PJSIP_INV_STATE_CONFIRMED:
                 return
@@ -64,6 +74,20 @@ class Call(pj.Call):
             logger.warning(f"Error onMediaState: {e}")
         
 
+    def get_active_audio_media(self):
+        """
+        Get the call's active audio media, looked up once and then cached
+        
+        Returns:
+            pj.AudioMedia: The audio media or None
+        """
+        if self.audio_media is None:
+            for media in self.getInfo().media:
+                if media.type == pj.PJMEDIA_TYPE_AUDIO and media.status == pj.PJSUA_CALL_MEDIA_ACTIVE:
+                    self.audio_media = self.getAudioMedia(media.index)
+                    break
+        return self.audio_media
+
     def start_recording(self, call_id=None):
         """
         Start recording the call
@@ -76,7 +100,7 @@ class Call(pj.Call):
         try:
             logger.info(f"In Recording")
             if not call_id:
-                call_id = self.getInfo().callIdString
+                call_id = self.call_id or self.getInfo().callIdString
 
             # Generate output path
             timestamp = time.strftime("%Y%m%d-%H%M%S")
@@ -106,7 +130,7 @@ class Call(pj.Call):
                 return False
                 
             # Save recorder reference
-            audio_recorders[call_id] = recorder
+            call_registry.add(call_id, self, self.agent_id).recorder = recorder
             logger.info(f"Started recording to {output_path}")
                 
             return True
@@ -123,18 +147,19 @@ class Call(pj.Call):
             str: Path to the recording file or None if failed
         """
         try:
-            call_id = self.getInfo().callIdString
+            call_id = self.call_id or self.getInfo().callIdString
             recording_path = None
+            entry = call_registry.get(call_id)
             
             # Get the recording path before stopping
-            if call_id in audio_recorders:
-                recorder = audio_recorders[call_id]
+            if entry is not None and entry.recorder is not None:
+                recorder = entry.recorder
                 if hasattr(recorder, 'output_path'):
                     recording_path = recorder.output_path
                 
                 # Stop recording
                 success = AudioRecorder.stop_recording(self, recorder)
-                del audio_recorders[call_id]
+                entry.recorder = None
                 
                 if success:
                     logger.info(f"Stopped recording to {recording_path}")
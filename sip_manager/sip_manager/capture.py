@@ -0,0 +1,164 @@
+import threading
+import logging
+import numpy as np
+import pjsua2 as pj
+from .level import dtype_map
+
+logger = logging.getLogger(__name__)
+
+
+class RingBuffer:
+    """
+    Fixed size ring buffer of PCM samples.
+    Written from the media thread, read from the PJSUA thread.
+    """
+
+    def __init__(self, capacity, dtype=np.int16):
+        """
+        Args:
+            capacity: Number of samples kept in the buffer
+            dtype: numpy dtype of the samples
+        """
+        self.capacity = max(1, int(capacity))
+        self.dtype = dtype
+        self.buffer = np.zeros(self.capacity, dtype=dtype)
+        self.write_pos = 0
+        self.total_written = 0
+        self.lock = threading.Lock()
+
+    def write(self, samples):
+        """Append samples, overwriting the oldest ones when full"""
+        count = len(samples)
+        if count == 0:
+            return
+        with self.lock:
+            if count >= self.capacity:
+                samples = samples[-self.capacity:]
+                self.buffer[:] = samples
+                self.write_pos = 0
+            else:
+                end = self.write_pos + count
+                if end <= self.capacity:
+                    self.buffer[self.write_pos:end] = samples
+                else:
+                    first = self.capacity - self.write_pos
+                    self.buffer[self.write_pos:] = samples[:first]
+                    self.buffer[:count - first] = samples[first:]
+                self.write_pos = end % self.capacity
+            self.total_written += count
+
+    def latest(self, count):
+        """
+        Get the most recent samples in chronological order
+
+        Args:
+            count: Number of samples wanted
+
+        Returns:
+            numpy array with at most count samples
+        """
+        with self.lock:
+            count = min(int(count), self.capacity, self.total_written)
+            start = (self.write_pos - count) % self.capacity
+            if start + count <= self.capacity:
+                return self.buffer[start:start + count].copy()
+            return np.concatenate((self.buffer[start:], self.buffer[:self.write_pos]))
+
+    def read_range(self, start_sample, end_sample):
+        """
+        Get samples by absolute position since capture started
+
+        Args:
+            start_sample: First sample index (inclusive)
+            end_sample: Last sample index (exclusive)
+
+        Returns:
+            numpy array of the part of the range still held in the buffer
+        """
+        with self.lock:
+            oldest = max(0, self.total_written - self.capacity)
+            start_sample = max(int(start_sample), oldest)
+            end_sample = min(int(end_sample), self.total_written)
+            if end_sample <= start_sample:
+                return np.zeros(0, dtype=self.dtype)
+            # Positions are taken under the lock, a frame written meanwhile would shift them
+            start = (self.write_pos - (self.total_written - start_sample)) % self.capacity
+            count = end_sample - start_sample
+            if start + count <= self.capacity:
+                return self.buffer[start:start + count].copy()
+            return np.concatenate((self.buffer[start:], self.buffer[:start + count - self.capacity]))
+
+
+class CapturePort(pj.AudioMediaPort):
+    """
+    Media port that receives the caller's audio frames straight from the
+    conference bridge and keeps them in memory for voice activity detection.
+    """
+
+    def __init__(self, call_id, config):
+        """
+        Args:
+            call_id: ID of the call being captured
+            config: sip_manager configuration
+        """
+        pj.AudioMediaPort.__init__(self)
+        self.call_id = call_id
+        self.sample_rate = config.sample_rate
+        self.sample_width = config.sample_width
+        self.channel_count = config.channel_count
+        self.dtype = dtype_map.get(self.sample_width, np.int16)
+        self.frames_received = 0
+        self.vad = None
+        self.vad_slot = None
+
+        buffer_ms = getattr(config, 'capture_buffer_ms', 10000)
+        if not getattr(config, 'record_to_file', True):
+            # Speech segments are cut from the ring, it has to hold the longest one
+            buffer_ms = max(buffer_ms, getattr(config, 'max_segment_ms', 30000))
+        capacity = int(self.sample_rate * buffer_ms / 1000)
+        self.ring = RingBuffer(capacity, dtype=self.dtype)
+
+        fmt = pj.MediaFormatAudio()
+        fmt.init(pj.PJMEDIA_FORMAT_PCM,
+                 self.sample_rate,
+                 self.channel_count,
+                 config.ptime * 1000,
+                 self.sample_width * 8)
+        self.createPort(f"capture-{call_id}", fmt)
+
+    def onFrameReceived(self, frame):
+        """Called by the media thread for every frame sent to this port"""
+        try:
+            if frame.type != pj.PJMEDIA_FRAME_TYPE_AUDIO or frame.size == 0:
+                return
+            samples = np.frombuffer(bytes(frame.buf), dtype=self.dtype)
+            if self.channel_count > 1:
+                samples = samples[::self.channel_count]  # use first channel
+            self.ring.write(samples)
+            slot = self.vad_slot
+            if slot is not None:
+                self.vad.write(slot, samples)
+            self.frames_received += 1
+        except Exception as e:
+            logger.error(f"Error capturing frame for call {self.call_id}: {e}")
+
+    @property
+    def bytes_captured(self):
+        """Number of PCM bytes captured so far (single channel)"""
+        return self.ring.total_written * self.sample_width
+
+    def latest(self, duration_ms):
+        """Get the last duration_ms of captured audio as numpy samples"""
+        return self.ring.latest(int(self.sample_rate * duration_ms / 1000))
+
+    def read_pcm(self, start_ms, end_ms):
+        """Get captured audio between two offsets as raw PCM bytes"""
+        start = int(start_ms * self.sample_rate / 1000)
+        end = int(end_ms * self.sample_rate / 1000)
+        samples = self.ring.read_range(start, end)
+        wanted = min(end, self.ring.total_written) - start
+        if len(samples) < wanted:
+            lost_ms = (wanted - len(samples)) * 1000 // self.sample_rate
+            logger.warning(f"Call {self.call_id}: the first {lost_ms}ms of the audio from {start_ms}ms "
+                           f"are no longer held, raise capture_buffer_ms or max_segment_ms")
+        return samples.tobytes()
@@ -0,0 +1,134 @@
+import logging
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+
+class CommandType:
+    PLAY_WAV = "play_wav"
+    ENQUEUE_WAV = "enqueue_wav"
+    PLAY_STREAM = "play_stream"
+    STREAM_WRITE = "stream_write"
+    STREAM_END = "stream_end"
+    SKIP_AUDIO = "skip_audio"
+    CLEAR_AUDIO_QUEUE = "clear_audio_queue"
+    STOP_AUDIO = "stop_audio"
+    HANGUP = "hangup"
+    PAUSE_RECORDING = "pause_recording"
+    RESUME_RECORDING = "resume_recording"
+    TRANSFER = "transfer"
+    # Posted by a player when its file has been played to the end
+    PLAYBACK_EOF = "playback_eof"
+
+
+class CommandChannel:
+    """
+    Hands commands from any thread to the PJSUA thread.
+
+    put() appends to a deque and sets a wake event, the PJSUA thread calls
+    drain() once per loop iteration and runs everything that is pending, so
+    a burst of commands is executed in one pass instead of one per loop.
+    Enqueue to execute latency is tracked per command type.
+    """
+
+    def __init__(self):
+        self.pending = deque()
+        self.wake = threading.Event()
+        self.metrics_lock = threading.Lock()
+        self.stats = {}
+
+    def put(self, command_type, **params):
+        """
+        Queue a command for the PJSUA thread
+
+        Args:
+            command_type: One of CommandType
+            **params: Parameters of the command (call_id, file_path, ...)
+        """
+        params['type'] = command_type
+        params['enqueued_at'] = time.monotonic()
+        params.setdefault('timestamp', time.time())
+        self.pending.append(params)
+        self.wake.set()
+
+    def wait(self, timeout):
+        """
+        Block until a command is queued or the timeout passes
+
+        Args:
+            timeout: Seconds to wait at most
+
+        Returns:
+            bool: True if a command is waiting
+        """
+        if self.pending:
+            return True
+        self.wake.wait(timeout)
+        self.wake.clear()
+        return bool(self.pending)
+
+    def drain(self, handler):
+        """
+        Run every pending command, must be called on the PJSUA thread
+
+        Args:
+            handler: Function called with each command dict
+
+        Returns:
+            int: Number of commands run
+        """
+        count = 0
+        while self.pending:
+            try:
+                command = self.pending.popleft()
+            except IndexError:
+                break
+            started = time.monotonic()
+            failed = False
+            try:
+                handler(command)
+            except Exception as e:
+                failed = True
+                logger.error(f"Error running command {command.get('type')}: {e}")
+            self.record(command['type'], started - command['enqueued_at'], time.monotonic() - started, failed)
+            count += 1
+        return count
+
+    def record(self, command_type, latency, runtime, failed):
+        with self.metrics_lock:
+            stats = self.stats.get(command_type)
+            if stats is None:
+                stats = self.stats[command_type] = {'count': 0, 'errors': 0, 'latency': 0.0,
+                                                    'max_latency': 0.0, 'runtime': 0.0}
+            stats['count'] += 1
+            stats['latency'] += latency
+            stats['runtime'] += runtime
+            if latency > stats['max_latency']:
+                stats['max_latency'] = latency
+            if failed:
+                stats['errors'] += 1
+
+    def get_metrics(self):
+        """
+        Get command statistics
+
+        Returns:
+            dict: Pending count and per command type count, errors,
+                  enqueue to execute latency and run time in ms
+        """
+        with self.metrics_lock:
+            return {
+                'pending': len(self.pending),
+                'commands': {
+                    command_type: {
+                        'count': stats['count'],
+                        'errors': stats['errors'],
+                        'avg_latency_ms': stats['latency'] / stats['count'] * 1000,
+                        'max_latency_ms': stats['max_latency'] * 1000,
+                        'avg_runtime_ms': stats['runtime'] / stats['count'] * 1000,
+                    }
+                    for command_type, stats in self.stats.items()
+                },
+            }
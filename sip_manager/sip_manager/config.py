@@ -39,6 +39,41 @@ default_config = {
     "auto_answer" :  True,  # Pickup all incoming calls ,
     "welcome_message" :  None,
     "disconnect_message" :  None,
-    "recording_dir" :  "recordings" 
+    "recording_dir" :  "recordings",
+    "record_to_file" :  True,  # Archive the call audio to recording_dir, VAD runs from memory either way ,
+    "capture_buffer_ms" :  10000,  # How much caller audio is kept in memory per call ,
+    "max_segment_ms" :  30000,  # Longest speech segment whose audio is kept in memory when record_to_file is off ,
+    "vad_source" :  "capture",  # Where silence detection reads audio from: capture (in memory) or file (tail of the recording) ,
+    "vad_max_calls" :  256,  # Calls preallocated in the batched VAD, grows when exceeded ,
+    "vad_noise_alpha" :  0.05,  # How fast the tracked noise floor rises (0-1) ,
+    "vad_engine" :  "energy",  # Speech detector: energy (RMS + zero-crossing rate), adaptive (noise floor) or webrtc ,
+    "vad_window_ms" :  200,  # Analysis window the VAD features are computed over ,
+    "vad_attack_ms" :  60,  # How long speech must last before SPEECH_DETECTED fires ,
+    "vad_hangover_ms" :  600,  # How long silence must last before the speech segment is complete ,
+    "speech_pause_ms" :  250,  # A pause this long inside a segment fires SPEECH_PAUSED, 0 turns it off ,
+    "vad_zcr_max" :  0.4,  # energy: highest zero-crossing rate still counted as speech ,
+    "vad_noise_ratio" :  3.0,  # adaptive: how far above the noise floor speech has to be ,
+    "vad_min_rms" :  30,  # adaptive: RMS below this is never speech ,
+    "vad_webrtc_mode" :  2,  # webrtc: aggressiveness 0-3, needs the webrtcvad package ,
+    "vad_webrtc_ratio" :  0.5,  # webrtc: fraction of frames per tick that must be speech ,
+    "vad_frame_ms" :  20,  # webrtc: classifier frame length, 10, 20 or 30 ,
+    "event_dispatch" :  "async",  # sync runs event listeners on the PJSUA thread, async on a worker pool ordered per call ,
+    "event_workers" :  4,  # Worker threads delivering events in async mode ,
+    "event_queue_size" :  0,  # Events waiting per worker before new ones are dropped, 0 is unbounded ,
+    "thread_count" :  1,  # PJSUA worker threads polling SIP/media, 0 makes the PJSUA thread poll them itself ,
+    "main_thread_only" :  False,  # Run PJSUA callbacks on the PJSUA thread only, implies polling like thread_count 0 ,
+    "command_poll_ms" :  2,  # With thread_count 0 the PJSUA thread polls SIP/media this often ,
+    "command_idle_ms" :  100,  # With thread_count > 0 the PJSUA thread sleeps this long when no command arrives ,
+    "workers" :  1,  # SIP agent processes, more than 1 runs a supervised pool using one core each ,
+    "pool_distribution" :  "redirect",  # redirect: a distributor on public_port 302s each call to the least loaded worker, none: workers only listen on public_port + n ,
+    "pool_heartbeat_interval" :  1.0,  # Seconds between worker heartbeats ,
+    "pool_heartbeat_timeout" :  5.0,  # Seconds without a heartbeat before a worker is restarted ,
+    "pool_start_timeout" :  30.0,  # Seconds a new worker has to send its first heartbeat ,
+    "pool_start_method" :  "spawn",  # multiprocessing start method for the workers ,
+    "stream_prebuffer_ms" :  60,  # Streamed audio (e.g. TTS) buffered before playback starts, absorbs jitter of the producer ,
+    "prompt_cache" :  True,  # Convert WAV files played often to clock_rate mono 16 bit once, in the background ,
+    "prompt_cache_dir" :  "prompt_cache",  # Converted files by content hash, None turns the cache off ,
+    "prompt_cache_disk_mb" :  256,  # Size of the converted files kept, least recently played ones are removed ,
+    "prompt_cache_min_plays" :  2  # Plays of a file before it is converted, one-off TTS replies are not ,
 }
 
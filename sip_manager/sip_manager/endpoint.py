@@ -1,8 +1,6 @@
 import logging
 import time
 import pjsua2 as pj
-from .player import AudioPlayer
-from .recorder import audio_recorders
 
 logger = logging.getLogger(__name__)
 
@@ -16,12 +14,8 @@ class CustomEndpoint(pj.Endpoint):
     def onTimer(self, prm):
         self.utilTimerSchedule(self.silence_check_interval, None) 
 
-        from .recorder import audio_recorders, AudioRecorder
-        for call_id in list(audio_recorders.keys()):
-            is_silent, duration = AudioRecorder.check_for_silence(call_id)
+        from .recorder import AudioRecorder
+        for call_id, is_silent, duration in AudioRecorder.check_all_for_silence():
             if is_silent:
                 logger.info(f"[onTimer] Silence detected on call {call_id} for {duration:.2f}s")
-                # Optional: trigger stop, alert, etc.
-        
-        # Check for completed audio playback
-        AudioPlayer.check_audio_players()
\ No newline at end of file
+                # Optional: trigger stop, alert, etc.
\ No newline at end of file
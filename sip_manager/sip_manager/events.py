@@ -1,6 +1,7 @@
 import os
 import logging
 import threading
+import queue
 import time
 
 logger = logging.getLogger(__name__)
@@ -12,8 +13,11 @@ class EventType:
     SILENCE_ENDED = "silence_ended"
     SPEECH_DETECTED = "speech_detected"
     SPEECH_SEGMENT_COMPLETE = "speech_segment_complete"
+    SPEECH_PAUSED = "speech_paused"
+    SPEECH_RESUMED = "speech_resumed"
     AUDIO_PLAYING = "audio_playing"
     AUDIO_ENDED = "audio_ended"
+    PLAYBACK_QUEUE_DRAINED = "playback_queue_drained"
     RECORDING_STARTED = "recording_started"
     RECORDING_PAUSED = "recording_paused"
     RECORDING_RESUMED = "recording_resumed"
@@ -23,11 +27,180 @@ class EventType:
     AGENT_STOPPED = "agent_stopped"
     ACCOUNT_REGISTERED = "account_registered"
 
-    
+# Wildcards for listener subscriptions
+ANY_EVENT = "*"
+ANY_AGENT = None
+
+
+class EventMetrics:
+    """
+    Handler latency and queue statistics of the event manager.
+    Updated from the emitting thread and the dispatch workers.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Clear all counters"""
+        with self.lock:
+            self.emitted = 0
+            self.dropped = 0
+            self.max_queue_depth = 0
+            self.queue_wait_total = 0.0
+            self.queue_wait_max = 0.0
+            self.queue_wait_count = 0
+            self.handlers = {}
+
+    def record_enqueue(self, depth):
+        with self.lock:
+            self.emitted += 1
+            if depth > self.max_queue_depth:
+                self.max_queue_depth = depth
+
+    def record_drop(self):
+        with self.lock:
+            self.dropped += 1
+
+    def record_wait(self, seconds):
+        with self.lock:
+            self.queue_wait_total += seconds
+            self.queue_wait_count += 1
+            if seconds > self.queue_wait_max:
+                self.queue_wait_max = seconds
+
+    def record_handler(self, event_type, seconds, failed=False):
+        with self.lock:
+            stats = self.handlers.get(event_type)
+            if stats is None:
+                stats = self.handlers[event_type] = {'count': 0, 'errors': 0, 'total': 0.0, 'max': 0.0}
+            stats['count'] += 1
+            stats['total'] += seconds
+            if seconds > stats['max']:
+                stats['max'] = seconds
+            if failed:
+                stats['errors'] += 1
+
+    def snapshot(self):
+        """
+        Get the current statistics
+
+        Returns:
+            dict: Counters, queue wait and per event type handler latency in ms
+        """
+        with self.lock:
+            wait_avg = self.queue_wait_total / self.queue_wait_count if self.queue_wait_count else 0.0
+            return {
+                'emitted': self.emitted,
+                'dropped': self.dropped,
+                'max_queue_depth': self.max_queue_depth,
+                'queue_wait_avg_ms': wait_avg * 1000,
+                'queue_wait_max_ms': self.queue_wait_max * 1000,
+                'handlers': {
+                    event_type: {
+                        'count': stats['count'],
+                        'errors': stats['errors'],
+                        'avg_ms': stats['total'] / stats['count'] * 1000,
+                        'max_ms': stats['max'] * 1000,
+                    }
+                    for event_type, stats in self.handlers.items()
+                },
+            }
+
+
+class EventDispatcher:
+    """
+    Delivers events to listeners on a pool of worker threads.
+
+    Every event is routed to a worker by its call_id, so the events of one
+    call are handled in the order they were emitted while different calls
+    are handled in parallel. Emitting only enqueues, which keeps blocking
+    handlers (transcription, AI requests) off the PJSUA thread.
+    """
+
+    def __init__(self, metrics, workers=4, queue_size=0):
+        """
+        Args:
+            metrics: EventMetrics to update
+            workers: Number of worker threads
+            queue_size: Maximum events waiting per worker, 0 for unbounded
+        """
+        self.metrics = metrics
+        self.queues = [queue.Queue(maxsize=queue_size) for _ in range(max(1, int(workers)))]
+        self.threads = []
+
+    def start(self):
+        """Start the worker threads"""
+        for index, work_queue in enumerate(self.queues):
+            thread = threading.Thread(name=f"EVENT-WORKER-{index}", target=self._run, args=(work_queue,))
+            thread.daemon = True
+            thread.start()
+            self.threads.append(thread)
+        logger.info(f"Event dispatcher started with {len(self.queues)} workers")
+
+    def stop(self, timeout=5):
+        """Deliver what is queued, then stop the workers"""
+        for work_queue in self.queues:
+            work_queue.put(None)
+        for thread in self.threads:
+            thread.join(timeout=timeout)
+        self.threads = []
+
+    def submit(self, callbacks, event_type, event_data):
+        """
+        Queue an event for delivery
+
+        Args:
+            callbacks: Listeners to call, in order
+            event_type: Type of the event
+            event_data: Keyword arguments for the listeners
+        """
+        key = event_data.get('call_id') or event_data.get('agent_id')
+        work_queue = self.queues[hash(key) % len(self.queues)]
+        try:
+            work_queue.put_nowait((callbacks, event_type, event_data, time.monotonic()))
+        except queue.Full:
+            self.metrics.record_drop()
+            logger.warning(f"Event queue full, dropped {event_type} for {key}")
+            return
+        self.metrics.record_enqueue(work_queue.qsize())
+
+    def queue_depths(self):
+        """Get the number of events waiting on each worker"""
+        return [work_queue.qsize() for work_queue in self.queues]
+
+    def _run(self, work_queue):
+        while True:
+            item = work_queue.get()
+            if item is None:
+                break
+            callbacks, event_type, event_data, queued_at = item
+            self.metrics.record_wait(time.monotonic() - queued_at)
+            deliver(callbacks, event_type, event_data, self.metrics)
+
+
+def deliver(callbacks, event_type, event_data, metrics):
+    """Call each listener, timing it and containing its errors"""
+    for callback in callbacks:
+        started = time.monotonic()
+        failed = False
+        try:
+            callback(event_type, **event_data)
+        except Exception as e:
+            failed = True
+            logger.error(f"Error in event listener for {event_type}: {e}")
+        metrics.record_handler(event_type, time.monotonic() - started, failed)
+
+
 class SipEventManager:
     """
     Central event manager for SIP events across the system.
     Uses observer pattern to notify listeners of events.
+
+    Listeners are indexed by (event_type, agent_id), either of which can be
+    a wildcard, so emitting only looks up the four keys an event can match
+    instead of calling every listener of every agent.
     """
     _instance = None
     _lock = threading.Lock()
@@ -37,41 +210,116 @@ class SipEventManager:
             if cls._instance is None:
                 cls._instance = super(SipEventManager, cls).__new__(cls)
                 cls._instance.listeners = {}
+                cls._instance.listener_lock = threading.Lock()
+                cls._instance.metrics = EventMetrics()
+                cls._instance.dispatcher = None
                 cls._instance.initialize()
             return cls._instance
 
     def initialize(self):
         """Initialize the event manager"""
-        for event_type in dir(EventType):
-            if not event_type.startswith('_'):
-                self.listeners[getattr(EventType, event_type)] = []
+        self.event_types = set(getattr(EventType, name) for name in dir(EventType) if not name.startswith('_'))
         logger.info("SIP Event Manager initialized")
 
-    def add_listener(self, event_type, callback):
+    def configure(self, mode="sync", workers=4, queue_size=0):
+        """
+        Choose how events are delivered
+
+        Args:
+            mode: 'sync' calls listeners on the emitting thread,
+                  'async' hands them to a per-call ordered worker pool
+            workers: Number of worker threads in async mode
+            queue_size: Maximum events waiting per worker, 0 for unbounded
+        """
+        with self._lock:
+            if mode == "async":
+                if self.dispatcher is None:
+                    self.dispatcher = EventDispatcher(self.metrics, workers, queue_size)
+                    self.dispatcher.start()
+                return
+            if mode != "sync":
+                logger.warning(f"Unknown event dispatch mode: {mode}, using sync")
+            dispatcher, self.dispatcher = self.dispatcher, None
+        if dispatcher is not None:
+            dispatcher.stop()
+
+    def shutdown(self):
+        """Deliver queued events and stop the worker pool"""
+        self.configure("sync")
+
+    def get_metrics(self):
+        """
+        Get event delivery statistics
+
+        Returns:
+            dict: Counters, current queue depth per worker and handler latency
+        """
+        metrics = self.metrics.snapshot()
+        dispatcher = self.dispatcher
+        metrics['mode'] = "async" if dispatcher else "sync"
+        metrics['queue_depth'] = dispatcher.queue_depths() if dispatcher else []
+        return metrics
+
+    def add_listener(self, event_type, callback, agent_id=ANY_AGENT):
         """
         Add a listener for a specific event type
         
         Args:
-            event_type: Type of event to listen for
+            event_type: Type of event to listen for, ANY_EVENT for all
             callback: Function to call when event occurs
+            agent_id: Only receive events of this agent, ANY_AGENT for all
         """
-        if event_type in self.listeners:
-            self.listeners[event_type].append(callback)
-            logger.debug(f"Added listener for {event_type}")
-        else:
+        if event_type != ANY_EVENT and event_type not in self.event_types:
             logger.warning(f"Unknown event type: {event_type}")
+            return
+        key = (event_type, agent_id)
+        with self.listener_lock:
+            # Tuples are replaced, never mutated, so emit can read without the lock
+            self.listeners[key] = self.listeners.get(key, ()) + (callback,)
+        logger.debug(f"Added listener for {event_type} (agent {agent_id})")
 
-    def remove_listener(self, event_type, callback):
+    def remove_listener(self, event_type, callback, agent_id=ANY_AGENT):
         """
         Remove a listener for a specific event type
         
         Args:
             event_type: Type of event to remove listener from
             callback: Function to remove
+            agent_id: Agent the listener was registered for
         """
-        if event_type in self.listeners and callback in self.listeners[event_type]:
-            self.listeners[event_type].remove(callback)
-            logger.debug(f"Removed listener for {event_type}")
+        key = (event_type, agent_id)
+        with self.listener_lock:
+            callbacks = list(self.listeners.get(key, ()))
+            if callback not in callbacks:
+                return
+            callbacks.remove(callback)
+            if callbacks:
+                self.listeners[key] = tuple(callbacks)
+            else:
+                del self.listeners[key]
+        logger.debug(f"Removed listener for {event_type} (agent {agent_id})")
+
+    def match_listeners(self, event_type, agent_id):
+        """
+        Get the listeners an event is delivered to
+
+        Args:
+            event_type: Type of the event
+            agent_id: Agent that emitted it, events without one reach every agent
+
+        Returns:
+            tuple: Callbacks in call order
+        """
+        listeners = self.listeners
+        if agent_id is None:
+            return tuple(callback
+                         for (listen_type, _), callbacks in list(listeners.items())
+                         if listen_type == event_type or listen_type == ANY_EVENT
+                         for callback in callbacks)
+        return (listeners.get((event_type, agent_id), ()) +
+                listeners.get((event_type, ANY_AGENT), ()) +
+                listeners.get((ANY_EVENT, agent_id), ()) +
+                listeners.get((ANY_EVENT, ANY_AGENT), ()))
 
     def emit_event(self, event_type, **kwargs):
         """
@@ -79,49 +327,52 @@ class SipEventManager:
         
         Args:
             event_type: Type of event to emit
-            **kwargs: Data to pass to listeners
-        """
-        logger.info(f"EVENT EMITTED: {event_type} with {len(event_manager.listeners.get(event_type, []))} listeners")
-
-        if event_type in self.listeners:
-            # Create timestamp if not provided
-            if 'timestamp' not in kwargs:
-                kwargs['timestamp'] = time.time()
-                
-            event_data = kwargs
-            
-            for callback in self.listeners[event_type]:
-                try:
-                    callback(event_type, **event_data)
-                except Exception as e:
-                    logger.error(f"Error in event listener for {event_type}: {e}")
-            
-            logger.debug(f"Emitted {event_type} event with data: {event_data}")
-        else:
+            **kwargs: Data to pass to listeners, agent_id scopes the event to one agent
+        """
+        if event_type not in self.event_types:
             logger.warning(f"Attempted to emit unknown event type: {event_type}")
+            return
+
+        callbacks = self.match_listeners(event_type, kwargs.get('agent_id'))
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"EVENT EMITTED: {event_type} for agent {kwargs.get('agent_id')} with {len(callbacks)} listeners")
+        if not callbacks:
+            return
+
+        # Create timestamp if not provided
+        if 'timestamp' not in kwargs:
+            kwargs['timestamp'] = time.time()
+
+        dispatcher = self.dispatcher
+        if dispatcher is not None:
+            dispatcher.submit(callbacks, event_type, kwargs)
+        else:
+            deliver(callbacks, event_type, kwargs, self.metrics)
 
 # Create singleton instance
 event_manager = SipEventManager()
 
-def register_listener(event_type, callback):
+def register_listener(event_type, callback, agent_id=ANY_AGENT):
     """
     Register a listener for a specific event type
     
     Args:
-        event_type: Type of event to listen for
+        event_type: Type of event to listen for, ANY_EVENT for all
         callback: Function to call when event occurs
+        agent_id: Only receive events of this agent, ANY_AGENT for all
     """
-    event_manager.add_listener(event_type, callback)
+    event_manager.add_listener(event_type, callback, agent_id)
 
-def unregister_listener(event_type, callback):
+def unregister_listener(event_type, callback, agent_id=ANY_AGENT):
     """
     Unregister a listener for a specific event type
     
     Args:
         event_type: Type of event to remove listener from
         callback: Function to remove
+        agent_id: Agent the listener was registered for
     """
-    event_manager.remove_listener(event_type, callback)
+    event_manager.remove_listener(event_type, callback, agent_id)
 
 def emit_event(event_type, **kwargs):
     """
@@ -131,4 +382,28 @@ def emit_event(event_type, **kwargs):
         event_type: Type of event to emit
         **kwargs: Data to pass to listeners
     """
-    event_manager.emit_event(event_type, **kwargs)
\ No newline at end of file
+    event_manager.emit_event(event_type, **kwargs)
+
+def configure_events(config):
+    """
+    Apply the event dispatch settings from a sip_manager config
+
+    Args:
+        config: sip_manager configuration
+    """
+    event_manager.configure(mode=getattr(config, 'event_dispatch', 'sync'),
+                            workers=getattr(config, 'event_workers', 4),
+                            queue_size=getattr(config, 'event_queue_size', 0))
+
+def get_event_metrics():
+    """
+    Get event delivery statistics
+
+    Returns:
+        dict: Counters, current queue depth per worker and handler latency
+    """
+    return event_manager.get_metrics()
+
+def shutdown_events():
+    """Deliver queued events and stop the dispatch workers"""
+    event_manager.shutdown()
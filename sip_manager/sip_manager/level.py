@@ -0,0 +1,69 @@
+import os
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+dtype_map = {1: np.uint8, 2: np.int16, 4: np.int32}
+
+
+class TailReader:
+    """
+    Reads the samples appended to a recording since the last check.
+    Keeps the file open between reads instead of reopening it on every tick.
+    """
+
+    def __init__(self, file_path, sample_width=2):
+        """
+        Args:
+            file_path: Path to the PCM or WAV recording
+            sample_width: Sample width in bytes
+        """
+        self.file_path = file_path
+        self.sample_width = sample_width
+        self.dtype = dtype_map.get(sample_width, np.int16)
+        # The recorder writes a canonical 44 byte header in front of WAV data
+        self.header_bytes = 44 if file_path.endswith('.wav') else 0
+        self.handle = None
+
+    def open(self):
+        """Open the recording, returns False if it does not exist yet"""
+        if self.handle is None:
+            try:
+                self.handle = open(self.file_path, 'rb')
+            except FileNotFoundError:
+                return False
+        return True
+
+    def read_new(self, last_size):
+        """
+        Read the bytes appended after last_size
+
+        Args:
+            last_size: File offset already consumed
+
+        Returns:
+            tuple: (numpy array of new samples, new file offset)
+        """
+        if not self.open():
+            return np.zeros(0, dtype=self.dtype), last_size
+
+        start = max(last_size, self.header_bytes)
+        file_size = os.fstat(self.handle.fileno()).st_size
+        # Only consume whole samples, the rest is picked up next time
+        available = (file_size - start) // self.sample_width * self.sample_width
+        if available <= 0:
+            return np.zeros(0, dtype=self.dtype), start
+
+        self.handle.seek(start)
+        raw = self.handle.read(available)
+        return np.frombuffer(raw, dtype=self.dtype), start + len(raw)
+
+    def close(self):
+        """Close the file handle"""
+        if self.handle is not None:
+            try:
+                self.handle.close()
+            except Exception as e:
+                logger.warning(f"Error closing {self.file_path}: {e}")
+            self.handle = None
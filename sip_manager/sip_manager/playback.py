@@ -0,0 +1,337 @@
+import time
+import wave
+import logging
+import threading
+from collections import deque
+import pjsua2 as pj
+from .events import emit_event, EventType
+from .commands import CommandType
+from .stream import StreamBuffer, StreamPort
+from .prompt_cache import get_prompt_cache
+
+logger = logging.getLogger(__name__)
+
+
+class QueuedPlayer(pj.AudioMediaPlayer):
+    """
+    Player of one queue item that reports the end of its file.
+
+    onEof2 runs on the media thread where the player may not be destroyed.
+    It calls on_eof, which lets the queue connect the next item right
+    there, and posts PLAYBACK_EOF to the agent's command channel, the PJSUA
+    thread then releases the player.
+    """
+
+    def __init__(self, file_path, duration, call_id, item_id, commands=None):
+        pj.AudioMediaPlayer.__init__(self)
+        self.file_path = file_path
+        self.duration = duration
+        self.call_id = call_id
+        self.item_id = item_id
+        self.commands = commands
+        self.start_time = None
+        self.eof = False
+        self.on_eof = None
+
+    def onEof2(self):
+        if self.eof:
+            return
+        self.eof = True
+        if self.on_eof is not None:
+            self.on_eof(self)
+        if self.commands is not None:
+            self.commands.put(CommandType.PLAYBACK_EOF, call_id=self.call_id, item_id=self.item_id)
+
+
+def create_player(source, call_id, item_id, commands=None):
+    """
+    Open a WAV file or stream as a player that is not connected to anything yet
+
+    Args:
+        source: Path to the WAV file or a StreamBuffer
+        call_id: Call-ID string of the call it is played to
+        item_id: ID of the queue item
+        commands: Command channel the end of file is reported to
+
+    Returns:
+        QueuedPlayer or StreamPort: The player, None on error
+    """
+    if isinstance(source, StreamBuffer):
+        try:
+            return StreamPort(source, call_id, item_id, commands)
+        except Exception as e:
+            logger.error(f"Error opening {source.name} for playback: {e}")
+            return None
+
+    file_path = source
+    cache = get_prompt_cache()
+    # A hot prompt is played from its copy at the bridge clock rate
+    play_path = cache.resolve(file_path) if cache is not None else file_path
+
+    try:
+        with wave.open(play_path, 'rb') as wf:
+            duration = wf.getnframes() / float(wf.getframerate())
+        player = QueuedPlayer(file_path, duration, call_id, item_id, commands)
+        player.createPlayer(play_path, pj.PJMEDIA_FILE_NO_LOOP)
+        return player
+    except Exception as e:
+        logger.error(f"Error opening {file_path} for playback: {e}")
+        return None
+
+
+class PlaybackQueue:
+    """
+    Files and streams waiting to be played to one call, played back to back.
+
+    The item after the current one is always opened ahead of time. When
+    the current item reaches its end, its player's end of file callback
+    connects that next item to the call on the media thread, so the next
+    frame already comes from it. The end is also reported through the
+    command channel, and the PJSUA thread then disconnects and releases
+    the finished player and opens the item after. AUDIO_PLAYING and
+    AUDIO_ENDED are emitted per item and PLAYBACK_QUEUE_DRAINED once the
+    last item has finished.
+    Must only be used on the PJSUA thread, apart from handoff().
+    """
+
+    def __init__(self, call_id, call, agent_id=None, commands=None):
+        """
+        Args:
+            call_id: Call-ID string of the call
+            call: The Call to play to
+            agent_id: Agent the call belongs to
+            commands: Command channel of the agent, receives PLAYBACK_EOF
+        """
+        self.call_id = call_id
+        self.call = call
+        self.agent_id = agent_id
+        self.commands = commands
+        if commands is None:
+            logger.warning(f"No command channel for call {call_id}, playback will not advance on its own")
+        self.pending = deque()
+        self.preloaded = None
+        self.current = None
+        # Preloaded item the media thread already connected when the current one ended
+        self.handed_off = None
+        self.audio_media = None
+        # Guards preloaded and handed_off against the media thread, no PJSUA call is made while holding it
+        self.lock = threading.Lock()
+        self.next_item_id = 0
+
+    @property
+    def idle(self):
+        """True when nothing is playing or waiting"""
+        return self.current is None and self.handed_off is None and self.preloaded is None and not self.pending
+
+    def __len__(self):
+        return len(self.pending) + (1 if self.preloaded is not None else 0)
+
+    def handoff(self, player):
+        """
+        Connect the preloaded item when the current one ends, called on the
+        media thread from the player's end of file callback
+
+        Args:
+            player: The player that reached its end
+        """
+        with self.lock:
+            next_player = self.preloaded
+            if player is not self.current or next_player is None or self.audio_media is None:
+                return
+            self.preloaded = None
+            try:
+                next_player.startTransmit(self.audio_media)
+            except Exception as e:
+                logger.error(f"Error connecting the next item to call {self.call_id}: {e}")
+                self.preloaded = next_player
+                return
+            next_player.start_time = time.time()
+            self.handed_off = next_player
+
+    def settle(self):
+        """Finish the item whose successor the media thread already connected"""
+        if self.handed_off is not None:
+            self.finish_current()
+
+    def enqueue(self, source):
+        """
+        Add a file or stream to the end of the queue, playback starts if idle
+
+        Args:
+            source: Path to the WAV file or a StreamBuffer
+
+        Returns:
+            int: ID of the queued item
+        """
+        item_id = self.next_item_id
+        self.next_item_id += 1
+        self.pending.append((item_id, source))
+        if self.current is None:
+            self.start_next()
+        else:
+            self.preload()
+        return item_id
+
+    def play_now(self, source):
+        """
+        Interrupt whatever is playing, drop the queue and play a file or stream
+
+        Returns:
+            int: ID of the item
+        """
+        self.clear()
+        self.settle()
+        self.end_current(skipped=True)
+        return self.enqueue(source)
+
+    def skip(self):
+        """
+        End the current item and go on with the next one
+
+        Returns:
+            bool: True if an item was skipped
+        """
+        self.settle()
+        if self.current is None:
+            return False
+        self.finish_current(skipped=True)
+        return True
+
+    def clear(self):
+        """
+        Drop the items waiting behind the current one
+
+        Returns:
+            int: Number of items dropped
+        """
+        with self.lock:
+            dropped = len(self)
+            self.pending.clear()
+            player, self.preloaded = self.preloaded, None
+        # Released outside the lock, destroying a player takes the bridge's lock
+        del player
+        return dropped
+
+    def stop(self):
+        """Drop the queue and end the current item"""
+        self.clear()
+        self.skip()
+
+    def close(self):
+        """Disconnect and release every player, e.g. when the call ended"""
+        self.clear()
+        self.settle()
+        player, self.current = self.current, None
+        self.release(player)
+
+    def preload(self):
+        """Open the next item so it can start without delay"""
+        while self.preloaded is None and self.pending:
+            item_id, source = self.pending.popleft()
+            player = create_player(source, self.call_id, item_id, self.commands)
+            if player is not None:
+                player.on_eof = self.handoff
+                with self.lock:
+                    self.preloaded = player
+
+    def release(self, player):
+        """Disconnect a player from the call before its last reference is dropped"""
+        if player is None or self.audio_media is None:
+            return
+        try:
+            player.stopTransmit(self.audio_media)
+        except Exception as e:
+            logger.warning(f"Error disconnecting {player.file_path} from call {self.call_id}: {e}")
+
+    def start_next(self):
+        """
+        Connect the next item to the call
+
+        Returns:
+            bool: True if an item started
+        """
+        with self.lock:
+            player, self.handed_off = self.handed_off, None
+        if player is None:
+            # Nothing was connected on the media thread, connect the next item here
+            self.preload()
+            with self.lock:
+                player, self.preloaded = self.preloaded, None
+            if player is None:
+                return False
+
+            audio_media = self.call.get_active_audio_media()
+            if audio_media is None:
+                logger.warning(f"No active audio media for call {self.call_id}, dropping playback queue")
+                self.clear()
+                return False
+
+            self.audio_media = audio_media
+            player.startTransmit(audio_media)
+            player.start_time = time.time()
+        self.current = player
+        logger.info(f"Started playing {player.file_path} to call {self.call_id}")
+        emit_event(EventType.AUDIO_PLAYING,
+                   agent_id=self.agent_id,
+                   call_id=self.call_id,
+                   file_path=player.file_path,
+                   duration=player.duration,
+                   item_id=player.item_id,
+                   queued=len(self))
+
+        # Have the item after this one ready as well
+        self.preload()
+        return True
+
+    def end_current(self, skipped=False):
+        """
+        Disconnect the current item without starting the next one
+
+        Returns:
+            bool: True if an item was playing
+        """
+        player, self.current = self.current, None
+        if player is None:
+            return False
+        stream = getattr(player, 'stream', None)
+        if stream is not None and stream.underruns:
+            logger.warning(f"Stream {stream.name} on call {self.call_id} ran dry {stream.underruns} times")
+        # Disconnected here, dropping the last reference then destroys the player
+        self.release(player)
+        emit_event(EventType.AUDIO_ENDED,
+                   agent_id=self.agent_id,
+                   call_id=self.call_id,
+                   file_path=player.file_path,
+                   duration=player.duration,
+                   played=time.time() - player.start_time,
+                   item_id=player.item_id,
+                   skipped=skipped)
+        return True
+
+    def finish_current(self, skipped=False):
+        """End the current item, start the next one or report the queue drained"""
+        if not self.end_current(skipped):
+            return
+        if not self.start_next():
+            logger.info(f"Playback queue drained for call {self.call_id}")
+            emit_event(EventType.PLAYBACK_QUEUE_DRAINED,
+                       agent_id=self.agent_id,
+                       call_id=self.call_id)
+
+    def item_finished(self, item_id):
+        """
+        Handle the end of file of an item, late reports of items that were
+        already skipped or stopped are ignored
+
+        Args:
+            item_id: Item whose player reached the end of its file
+
+        Returns:
+            bool: True if it was the current item
+        """
+        player = self.current
+        if player is None or player.item_id != item_id:
+            return False
+        logger.info(f"Audio playback finished for call {self.call_id}")
+        self.finish_current()
+        return True
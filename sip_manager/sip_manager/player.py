@@ -1,28 +1,55 @@
 import os
-import time
-import wave
 import logging
-import pjsua2 as pj
-from .events import emit_event, EventType
+from .playback import PlaybackQueue
 
 logger = logging.getLogger(__name__)
 
-# Global dict to track players
-audio_players = {}
-
 
 class AudioPlayer:
     @staticmethod
-    def play_wav_to_call(account, wav_file_path, call_id=None):
+    def get_playback(account, call_id=None):
+        """
+        Get the playback queue of a call, creating it on first use
+
+        Args:
+            account: The SIP account with active calls
+            call_id: ID of the call, the first call if not given
+
+        Returns:
+            PlaybackQueue: The queue or None if the call can not play audio
+        """
+        # Find the call by ID if provided
+        if call_id:
+            entry = account.calls.get(call_id)
+            if entry is None:
+                logger.warning(f"Call with ID {call_id} not found")
+                return None
+        else:
+            # Fallback to first call if no specific call requested
+            entry = account.calls.first()
+            if entry is None:
+                logger.warning("No active calls to play audio to")
+                return None
+
+        if not entry.confirmed:
+            logger.warning("Call is not in confirmed state")
+            return None
+
+        if entry.playback is None:
+            entry.playback = PlaybackQueue(entry.call_id, entry.call, account.agent_id, account.commands)
+        return entry.playback
+
+    @staticmethod
+    def play_wav_to_call(account, wav_file_path, call_id=None, enqueue=False):
         """
         Play a WAV file through a specific SIP call.
-        
+
         Args:
             account: The SIP account with active calls
             wav_file_path: Path to the WAV file to play
-            call: Specific call object to play audio to (optional)
             call_id: ID of the call to play audio to (optional)
-                
+            enqueue: Play after what is already queued instead of interrupting it
+
         Returns:
             bool: True if successful, False otherwise
         """
@@ -31,122 +58,102 @@ class AudioPlayer:
             if not os.path.exists(wav_file_path):
                 logger.error(f"WAV file not found: {wav_file_path}")
                 return False
-                
-            # Find the call by ID if provided
-            selected_call = None
-            if call_id:
-                # Find call by ID in the account's calls
-                for c in account.calls:
-                    if c.getInfo().callIdString == call_id:
-                        selected_call = c
-                        break
-                if not selected_call:
-                    logger.warning(f"Call with ID {call_id} not found")
-                    return False
-            elif account.calls:
-                # Fallback to first call if no specific call requested
-                selected_call = account.calls[0]
-            else:
-                logger.warning("No active calls to play audio to")
-                return False
-                
-            
-            # Get call info to confirm we're connected
-            call_info = selected_call.getInfo()
-            
-            if call_info.state != pj.PJSIP_INV_STATE_CONFIRMED:
-                logger.warning("Call is not in confirmed state")
+
+            playback = AudioPlayer.get_playback(account, call_id)
+            if playback is None:
                 return False
-                
-            # Clean up any existing player for this call
-            if call_id in audio_players:
-                try:
-                    logger.info(f"Stopping previous audio player for call {call_id}")
-                    player = audio_players[call_id]
-                    player.stop()
-                    # Emit audio ended event
-                    emit_event(EventType.AUDIO_ENDED, call_id=call_id)
-                    del audio_players[call_id]
-                except Exception as e:
-                    logger.warning(f"Error cleaning up previous player: {e}")
-            
-            # Create player
-            player = pj.AudioMediaPlayer()
-            
-            # Get file duration using wave module
-            with wave.open(wav_file_path, 'rb') as wf:
-                frames = wf.getnframes()
-                rate = wf.getframerate()
-                duration = frames / float(rate)
-                logger.info(f"WAV duration: {duration} seconds")
-            
-            # Initialize player with the WAV file
-            player.createPlayer(wav_file_path, pj.PJMEDIA_FILE_NO_LOOP)
-            
-            # Store in global dict to prevent garbage collection
-            audio_players[call_id] = player
-            # Add file path and duration to player for reference
-            player.file_path = wav_file_path
-            player.duration = duration
-            
-            # Get the call media
-            for mi in call_info.media:
-                logger.info(f"Media {mi.index}: type={mi.type}, status={mi.status}")
-                if mi.type == pj.PJMEDIA_TYPE_AUDIO and mi.status == pj.PJSUA_CALL_MEDIA_ACTIVE:
-                    # Get the audio media from the call
-                    call_med = selected_call.getMedia(mi.index)
-                    aud_med = pj.AudioMedia.typecastFromMedia(call_med)
-                    
-                    # Connect the player to the call audio
-                    player.startTransmit(aud_med)
-                    
-                    logger.info(f"Started playing {wav_file_path} to call {call_id}")
-                    
-                    # Emit audio playing event
-                    emit_event(EventType.AUDIO_PLAYING, 
-                              call_id=call_id,
-                              file_path=wav_file_path,
-                              duration=duration)
-                    
-                    # Schedule a timer to emit audio ended event when playback completes
-                    # Since we don't have direct callbacks from PJSUA for playback completion,
-                    # we can check the status in the endpoint timer
-                    
-                    return True
-                    
-            logger.warning("No active audio media found in call")
-            return False
-            
+
+            if enqueue:
+                playback.enqueue(wav_file_path)
+                logger.info(f"Queued {wav_file_path} for call {playback.call_id}, {len(playback)} waiting")
+            else:
+                playback.play_now(wav_file_path)
+            return playback.current is not None
+
         except Exception as e:
             logger.error(f"Error playing WAV file: {e}")
             return False
-            
+
     @staticmethod
-    def check_audio_players():
+    def play_stream_to_call(account, stream, call_id=None, enqueue=False):
         """
-        Check if any audio players have finished playback.
-        This should be called periodically from the SIP agent's timer.
+        Play PCM that is still being produced through a specific SIP call.
+
+        Args:
+            account: The SIP account with active calls
+            stream: StreamBuffer the producer writes to
+            call_id: ID of the call to play audio to (optional)
+            enqueue: Play after what is already queued instead of interrupting it
+
+        Returns:
+            bool: True if successful, False otherwise
         """
         try:
-            current_time = time.time()
-            for call_id in list(audio_players.keys()):
-                try:
-                    player = audio_players[call_id]
-                    # Check if the player has finished
-                    if hasattr(player, 'start_time') and hasattr(player, 'duration'):
-                        elapsed = current_time - player.start_time
-                        if elapsed >= player.duration:
-                            # Playback finished
-                            logger.info(f"Audio playback finished for call {call_id}")
-                            # Emit audio ended event
-                            emit_event(EventType.AUDIO_ENDED, 
-                                      call_id=call_id,
-                                      file_path=player.file_path,
-                                      duration=player.duration)
-                            # Cleanup
-                            player.stop()
-                            del audio_players[call_id]
-                except Exception as e:
-                    logger.error(f"Error checking audio player for call {call_id}: {e}")
+            playback = AudioPlayer.get_playback(account, call_id)
+            if playback is None:
+                return False
+
+            if enqueue:
+                playback.enqueue(stream)
+            else:
+                playback.play_now(stream)
+            return True
+
         except Exception as e:
-            logger.error(f"Error in check_audio_players: {e}")
\ No newline at end of file
+            logger.error(f"Error playing stream: {e}")
+            return False
+
+    @staticmethod
+    def stop_audio(account, call_id):
+        """
+        Stop the audio playing on a call and drop its queue
+
+        Args:
+            account: The SIP account the call belongs to
+            call_id: ID of the call
+
+        Returns:
+            bool: True if something was playing
+        """
+        entry = account.calls.get(call_id)
+        if entry is None or entry.playback is None or entry.playback.idle:
+            return False
+        logger.info(f"Stopping audio for call {call_id}")
+        entry.playback.stop()
+        return True
+
+    @staticmethod
+    def skip_audio(account, call_id):
+        """Skip to the next queued item of a call"""
+        entry = account.calls.get(call_id)
+        if entry is None or entry.playback is None:
+            return False
+        return entry.playback.skip()
+
+    @staticmethod
+    def clear_queue(account, call_id):
+        """Drop the items queued behind the one that is playing"""
+        entry = account.calls.get(call_id)
+        if entry is None or entry.playback is None:
+            return False
+        dropped = entry.playback.clear()
+        logger.info(f"Cleared {dropped} queued items for call {call_id}")
+        return True
+
+    @staticmethod
+    def playback_eof(account, call_id, item_id):
+        """
+        Finish an item whose player reached the end of its file
+
+        Args:
+            account: The SIP account the call belongs to
+            call_id: ID of the call
+            item_id: Item the player was playing
+
+        Returns:
+            bool: True if the item was still the current one
+        """
+        entry = account.calls.get(call_id)
+        if entry is None or entry.playback is None:
+            return False
+        return entry.playback.item_finished(item_id)
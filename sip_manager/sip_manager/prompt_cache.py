@@ -0,0 +1,262 @@
+import os
+import wave
+import hashlib
+import logging
+import queue
+import threading
+from collections import OrderedDict
+import numpy as np
+from .level import dtype_map
+from .resample import Resampler
+
+logger = logging.getLogger(__name__)
+
+
+def read_wav(file_path):
+    """
+    Read a WAV file as mono 16 bit samples
+
+    Args:
+        file_path: Path to the WAV file
+
+    Returns:
+        tuple: (numpy int16 array, sample rate)
+    """
+    with wave.open(file_path, 'rb') as wf:
+        channels = wf.getnchannels()
+        width = wf.getsampwidth()
+        rate = wf.getframerate()
+        data = wf.readframes(wf.getnframes())
+
+    samples = np.frombuffer(data, dtype=dtype_map.get(width, np.int16))
+    if channels > 1:
+        samples = samples[::channels]  # use first channel
+    if width == 1:
+        samples = (samples.astype(np.int16) - 128) << 8
+    elif width == 4:
+        samples = (samples >> 16).astype(np.int16)
+    return samples.astype(np.int16, copy=False), rate
+
+
+def write_wav(file_path, samples, rate):
+    """Write mono 16 bit samples as a WAV file, atomically"""
+    tmp_path = f"{file_path}.tmp"
+    with wave.open(tmp_path, 'wb') as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(rate)
+        wf.writeframes(samples.astype('<i2').tobytes())
+    os.replace(tmp_path, file_path)
+
+
+def content_hash(file_path):
+    """Get the SHA-1 of a file's content"""
+    sha = hashlib.sha1()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(65536), b''):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+class PromptCache:
+    """
+    Prompts converted to the bridge's native format on disk.
+
+    Only prompts played at least min_plays times are converted, so the
+    greetings and fillers played on every call are, one-off TTS replies
+    are not. The conversion to mono 16 bit at clock_rate runs on a
+    background thread and its result is written to cache_dir, named by the
+    hash of the source file's content. Until it is ready the source file
+    is played as is. The converted files are played with an
+    AudioMediaPlayer like any other file, so the bridge neither resamples
+    nor decodes a hot prompt for every call. cache_dir holds disk_mb at
+    most, the least recently played files are removed first.
+    """
+
+    def __init__(self, sample_rate=8000, cache_dir="prompt_cache", disk_mb=256, min_plays=2, max_tracked=4096):
+        """
+        Args:
+            sample_rate: Clock rate of the conference bridge
+            cache_dir: Directory for converted files
+            disk_mb: Size of the converted files kept in cache_dir
+            min_plays: Plays of a file before it is converted
+            max_tracked: Unconverted files whose plays are counted
+        """
+        self.sample_rate = sample_rate
+        self.cache_dir = cache_dir
+        self.disk_limit = int(disk_mb * 1024 * 1024)
+        self.disk_used = 0
+        self.min_plays = max(1, min_plays)
+        self.max_tracked = max_tracked
+        # content hash -> size of the converted file, least recently played first
+        self.files = OrderedDict()
+        # (path, mtime, size) -> content hash of the source, saves rehashing unchanged files
+        self.converted = {}
+        # (path, mtime, size) -> plays of a file that is not converted yet
+        self.plays = OrderedDict()
+        self.pending = set()
+        self.queue = queue.Queue()
+        self.lock = threading.Lock()
+        self.thread = None
+        self.hits = 0
+        self.misses = 0
+        self.conversions = 0
+        self.errors = 0
+        os.makedirs(cache_dir, exist_ok=True)
+        self.scan()
+
+    def scan(self):
+        """Pick up the files converted by earlier runs, oldest first"""
+        suffix = f"-{self.sample_rate}.wav"
+        found = []
+        with os.scandir(self.cache_dir) as entries:
+            for entry in entries:
+                if not entry.name.endswith(suffix):
+                    continue
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                found.append((stat.st_mtime, entry.name[:-len(suffix)], stat.st_size))
+        with self.lock:
+            for _, digest, size in sorted(found):
+                self.files[digest] = size
+                self.disk_used += size
+            evicted = self.evict()
+        self.remove(evicted)
+
+    def cached_path(self, digest):
+        return os.path.join(self.cache_dir, f"{digest}-{self.sample_rate}.wav")
+
+    def resolve(self, file_path):
+        """
+        Get the file to play for a prompt, called on the PJSUA thread
+
+        Only stats the file. A prompt reaching min_plays is queued for
+        conversion, which runs on the cache's own thread.
+
+        Args:
+            file_path: Path to the WAV file
+
+        Returns:
+            str: Path of the converted file if it is ready, file_path otherwise
+        """
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            return file_path
+        key = (file_path, stat.st_mtime_ns, stat.st_size)
+        with self.lock:
+            digest = self.converted.get(key)
+            if digest is not None:
+                if digest in self.files:
+                    self.files.move_to_end(digest)
+                    self.hits += 1
+                    return self.cached_path(digest)
+                # Evicted since, converted again if it is still played
+                del self.converted[key]
+            self.misses += 1
+            if key in self.pending:
+                return file_path
+            plays = self.plays.pop(key, 0) + 1
+            if plays < self.min_plays:
+                self.plays[key] = plays
+                while len(self.plays) > self.max_tracked:
+                    self.plays.popitem(last=False)
+                return file_path
+            self.pending.add(key)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name="prompt-cache", daemon=True)
+                self.thread.start()
+        self.queue.put(key)
+        return file_path
+
+    def run(self):
+        while True:
+            key = self.queue.get()
+            try:
+                self.convert(key)
+            except Exception as e:
+                with self.lock:
+                    self.errors += 1
+                logger.error(f"Error converting prompt {key[0]}: {e}")
+            finally:
+                with self.lock:
+                    self.pending.discard(key)
+                self.queue.task_done()
+
+    def convert(self, key):
+        """Convert a prompt to the bridge clock rate unless an identical one already is"""
+        file_path = key[0]
+        digest = content_hash(file_path)
+        cached_path = self.cached_path(digest)
+        with self.lock:
+            known = digest in self.files
+        if not known:
+            samples, rate = read_wav(file_path)
+            if rate != self.sample_rate:
+                logger.debug(f"Converting prompt {file_path} from {rate} Hz to {self.sample_rate} Hz")
+                samples = Resampler(rate, self.sample_rate).process(samples)
+            write_wav(cached_path, samples, self.sample_rate)
+        size = os.path.getsize(cached_path)
+        with self.lock:
+            if digest not in self.files:
+                self.files[digest] = size
+                self.disk_used += size
+                self.conversions += 1
+            self.files.move_to_end(digest)
+            self.converted[key] = digest
+            evicted = self.evict(keep=digest)
+        self.remove(evicted)
+
+    def evict(self, keep=None):
+        """Drop the least recently played files over the disk limit, returns their paths"""
+        evicted = []
+        while self.disk_used > self.disk_limit and self.files:
+            digest, size = next(iter(self.files.items()))
+            if digest == keep:
+                break
+            del self.files[digest]
+            self.disk_used -= size
+            evicted.append(self.cached_path(digest))
+        return evicted
+
+    def remove(self, paths):
+        # A player that still has a removed file open keeps reading it
+        for path in paths:
+            try:
+                os.remove(path)
+            except OSError as e:
+                logger.warning(f"Error removing cached prompt {path}: {e}")
+
+    def get_metrics(self):
+        """Get hit/miss counts, conversions and the disk space held"""
+        with self.lock:
+            return {
+                'prompts': len(self.files),
+                'hits': self.hits,
+                'misses': self.misses,
+                'conversions': self.conversions,
+                'pending': len(self.pending),
+                'errors': self.errors,
+                'disk_bytes': self.disk_used,
+            }
+
+
+prompt_cache = None
+
+
+def get_prompt_cache(config=None):
+    """
+    Get the process wide PromptCache, creating it from config on first use.
+    Returns None while it is not configured or when prompt_cache is off.
+    """
+    global prompt_cache
+    if prompt_cache is None and config is not None and getattr(config, 'prompt_cache', True):
+        cache_dir = getattr(config, 'prompt_cache_dir', "prompt_cache")
+        if cache_dir:
+            prompt_cache = PromptCache(sample_rate=config.clock_rate,
+                                       cache_dir=cache_dir,
+                                       disk_mb=getattr(config, 'prompt_cache_disk_mb', 256),
+                                       min_plays=getattr(config, 'prompt_cache_min_plays', 2))
+    return prompt_cache
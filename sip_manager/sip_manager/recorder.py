@@ -5,22 +5,57 @@ import logging
 import pjsua2 as pj
 import numpy as np
 from .events import emit_event, EventType
+from .capture import CapturePort
+from .level import TailReader
+from .vad import get_batch_vad
+from .registry import call_registry
 
 
 logger = logging.getLogger(__name__)
-audio_recorders = {}
 
 class AudioRecorder:
+    @staticmethod
+    def media_ports(recorder):
+        """Ports the call audio is transmitted to: the capture port and, if archiving, the file recorder"""
+        ports = []
+        if recorder.capture is not None:
+            ports.append(recorder.capture)
+        if recorder.file_recording:
+            ports.append(recorder)
+        return ports
+
     @staticmethod
     def start_recording(call, output_path, config):
 
 
         try:
-            call_info = call.getInfo()
-            call_id = call_info.callIdString
+            call_id = call.call_id or call.getInfo().callIdString
             logger.info(f"Setting up recording for call {call_id}")
-            recorder = pj.AudioMediaRecorder()
-            recorder.call_id                = call_info.callIdString
+            record_to_file = getattr(config, 'record_to_file', True)
+            vad_source = getattr(config, 'vad_source', 'capture')
+            if vad_source == 'file' and not record_to_file:
+                logger.warning("vad_source 'file' needs record_to_file, using the capture port")
+                vad_source = 'capture'
+
+            capture = CapturePort(call_id, config) if vad_source == 'capture' else None
+            if record_to_file:
+                recorder = pj.AudioMediaRecorder()
+            else:
+                # Without an archive file the capture port holds the call state
+                recorder = capture
+                output_path = None
+            recorder.capture                = capture
+            recorder.file_recording         = record_to_file
+            recorder.vad_source             = vad_source
+            recorder.tail_reader            = TailReader(output_path, config.sample_width) if vad_source == 'file' else None
+            recorder.vad                    = get_batch_vad(config)
+            recorder.vad_slot               = recorder.vad.add(call_id)
+            if capture is not None:
+                # The capture port writes frames straight into the call's VAD row
+                capture.vad = recorder.vad
+                capture.vad_slot = recorder.vad_slot
+            recorder.call_id                = call_id
+            recorder.agent_id               = call.agent_id
             recorder.output_path            = output_path
             recorder.last_size              = 0
             recorder.last_check_time        = time.time()
@@ -30,6 +65,9 @@ class AudioRecorder:
             recorder.sample_rate            = config.sample_rate
             recorder.sample_width           = config.sample_width
             recorder.silence_detected       = False
+            recorder.speech_pause_ms        = getattr(config, 'speech_pause_ms', 0)
+            recorder.pause_reported         = False
+            recorder.silent_period          = 0
             recorder.call_ref               = call
             recorder.history_length         = 10
             recorder.volume_history         = []
@@ -38,27 +76,25 @@ class AudioRecorder:
             recorder.recording_start_time    = time.time()
             recorder.recording_start_time_ms = int(recorder.recording_start_time * 1000)
             recorder.silence_start_time_ms   = None
-            recorder.current_speech_start_ms = 0
+            recorder.current_speech_start_ms = None
             recorder.recording_start_time_ms = 0
 
 
-            recorder.createRecorder(output_path)
-
-            for media in call_info.media:
-                if media.type == pj.PJMEDIA_TYPE_AUDIO and media.status == pj.PJSUA_CALL_MEDIA_ACTIVE:
-                    try:
-                        audio_media = call.getAudioMedia(media.index)
-                        recorder.audio_media = audio_media
-                        audio_media.startTransmit(recorder)
-                        emit_event(EventType.RECORDING_STARTED, call_id=recorder.call_id,output_path=output_path)
-
-                        logger.info("Connected audio to recorder")
-                        break
-                    except Exception as e:
-                        logger.error(f"Error getting audio media: {e}")
+            if record_to_file:
+                recorder.createRecorder(output_path)
 
+            try:
+                audio_media = call.get_active_audio_media()
+                if audio_media is not None:
+                    recorder.audio_media = audio_media
+                    for port in AudioRecorder.media_ports(recorder):
+                        audio_media.startTransmit(port)
+                    emit_event(EventType.RECORDING_STARTED, agent_id=recorder.agent_id, call_id=recorder.call_id,output_path=output_path)
+
+                    logger.info("Connected audio to recorder")
+            except Exception as e:
+                logger.error(f"Error getting audio media: {e}")
 
-            audio_recorders[call_id] = recorder
             return recorder
         except Exception as e:
             logger.error(f"Error setting up recording: {e}")
@@ -68,9 +104,10 @@ class AudioRecorder:
     def pause_recording(recorder):
         try:
             if hasattr(recorder, 'audio_media'):
-                recorder.audio_media.stopTransmit(recorder)
+                for port in AudioRecorder.media_ports(recorder):
+                    recorder.audio_media.stopTransmit(port)
                 logger.info(f"Paused recording: {recorder.output_path}")
-                emit_event(EventType.RECORDING_PAUSED, call_id=recorder.call_id,output_path=recorder.output_path)
+                emit_event(EventType.RECORDING_PAUSED, agent_id=recorder.agent_id, call_id=recorder.call_id,output_path=recorder.output_path)
                 return True
         except Exception as e:
             logger.warning(f"Pause failed: {e}")
@@ -80,9 +117,10 @@ class AudioRecorder:
     def resume_recording(recorder):
         try:
             if hasattr(recorder, 'audio_media'):
-                recorder.audio_media.startTransmit(recorder)
+                for port in AudioRecorder.media_ports(recorder):
+                    recorder.audio_media.startTransmit(port)
                 logger.info(f"Resumed recording: {recorder.output_path}")
-                emit_event(EventType.RECORDING_RESUMED, call_id=recorder.call_id,output_path=recorder.output_path)
+                emit_event(EventType.RECORDING_RESUMED, agent_id=recorder.agent_id, call_id=recorder.call_id,output_path=recorder.output_path)
                 return True
         except Exception as e:
             logger.warning(f"Resume failed: {e}")
@@ -91,26 +129,30 @@ class AudioRecorder:
     @staticmethod
     def stop_recording(call, recorder=None):
         try:
-            call_id = call.getInfo().callIdString
-            if not recorder and call_id in audio_recorders:
-                recorder = audio_recorders[call_id]
+            call_id = call.call_id or call.getInfo().callIdString
+            entry = call_registry.get(call_id)
+            if not recorder and entry is not None:
+                recorder = entry.recorder
             if not recorder:
                 logger.warning("No recorder found to stop")
                 return False
 
             logger.info(f"Stopping recording for call {call_id}")
             if hasattr(recorder, 'audio_media'):
-                recorder.audio_media.stopTransmit(recorder)
-                emit_event(EventType.RECORDING_STOPPED, call_id=recorder.call_id,output_path=output_path)
+                for port in AudioRecorder.media_ports(recorder):
+                    recorder.audio_media.stopTransmit(port)
+                emit_event(EventType.RECORDING_STOPPED, agent_id=recorder.agent_id, call_id=recorder.call_id,output_path=recorder.output_path)
+
+            AudioRecorder.release(recorder)
 
             try:
-                if hasattr(recorder, 'close'):
+                if recorder.file_recording and hasattr(recorder, 'close'):
                     recorder.close()
             except Exception as e:
                 logger.warning(f"Error closing recorder: {e}")
 
-            if call_id in audio_recorders:
-                del audio_recorders[call_id]
+            if entry is not None and entry.recorder is recorder:
+                entry.recorder = None
 
             logger.info(f"Stopped recording call {call_id}")
             return True
@@ -165,12 +207,74 @@ class AudioRecorder:
             return 0
 
 
+    @staticmethod
+    def release(recorder):
+        """Free the VAD row and file handle held by a recorder"""
+        if recorder.capture is not None:
+            recorder.capture.vad_slot = None
+        recorder.vad.remove(recorder.call_id)
+        if recorder.tail_reader:
+            recorder.tail_reader.close()
+
+    @staticmethod
+    def check_all_for_silence():
+        """
+        Run silence detection for every live call.
+        Features for all calls are computed in one batched pass, then each
+        call's state machine is advanced with its own results.
+
+        Returns:
+            list: (call_id, is_silent, duration) for every call
+        """
+        vad = None
+        recorders = call_registry.recorders()
+        for call_id, recorder in recorders:
+            vad = recorder.vad
+            if recorder.vad_source == 'file':
+                # Only the bytes appended since the last check are read
+                samples, recorder.last_size = recorder.tail_reader.read_new(recorder.last_size)
+                vad.write(recorder.vad_slot, samples)
+
+        if vad is None:
+            return []
+
+        vad.process()
+
+        results = []
+        for call_id, recorder in recorders:
+            is_silent, duration = AudioRecorder.check_for_silence(call_id)
+            results.append((call_id, is_silent, duration))
+        return results
+
+    @staticmethod
+    def speech_segment(recorder, start_ms, end_ms):
+        """
+        Describe the speech between two times of the recording
+
+        Returns:
+            dict: Times, PCM byte positions and, without an archive file, the audio itself
+        """
+        segment = {
+            'audio_path': recorder.output_path,
+            'start_ms': start_ms,
+            'end_ms': end_ms,
+            'duration_ms': end_ms - start_ms,
+            # Calculate PCM byte position based on sample rate and width
+            'pcm_start_byte': int(start_ms * recorder.sample_rate * recorder.sample_width / 1000),
+            'pcm_end_byte': int(end_ms * recorder.sample_rate * recorder.sample_width / 1000)
+        }
+        if not recorder.file_recording:
+            # No archive file to cut the segment from, hand over the audio itself
+            segment['pcm_data'] = recorder.capture.read_pcm(start_ms, end_ms)
+        return segment
+
     @staticmethod
     def check_for_silence(call_id, on_silence_callback=None, on_silence_end_callback=None):
-        if call_id not in audio_recorders:
+        entry = call_registry.get(call_id)
+        if entry is None or entry.recorder is None:
             return False, 0
 
-        recorder = audio_recorders[call_id]
+        recorder = entry.recorder
         current_time = time.time()
         # Calculate time relative to recording start (in ms)
         current_ms = int((current_time - recorder.recording_start_time) * 1000)
@@ -180,72 +284,60 @@ class AudioRecorder:
             #    return False, 0
             recorder.last_check_time = current_time
 
-            if not os.path.exists(recorder.output_path):
-                logger.info("Audio file not found")
-                return False, 0
-
-            current_size = os.path.getsize(recorder.output_path)
+            # Features were computed for all calls by the last BatchVad.process()
+            rms, zcr, noise_floor, total = recorder.vad.features(recorder.vad_slot)
+            current_size = total * recorder.sample_width
 
             if current_size > 10000:
-                rms = AudioRecorder.analyze_pcm_audio_level(recorder.output_path,
-                                sample_rate=recorder.sample_rate, 
-                                sample_width=recorder.sample_width, 
-                                sample_duration=float(recorder.silence_duration/1000))
 
                 recorder.volume_history.append(rms)
 
                 if len(recorder.volume_history) > recorder.history_length:
                     recorder.volume_history.pop(0)
                 
-                logger.info(f"[check_for_silence] RMS: {rms:.2f}, THRESH: {recorder.silence_threshold}")
+                logger.debug(f"[check_for_silence] RMS: {rms:.2f}, ZCR: {zcr:.3f}, NOISE: {noise_floor:.2f}, THRESH: {recorder.silence_threshold}")
 
-                if rms < recorder.silence_threshold:
+                # The engine already applied attack and hangover to this decision
+                engine = recorder.vad.engine
+                if not recorder.vad.is_speech(recorder.vad_slot):
                     # We're in a silence period
                     if recorder.silence_start_time_ms is None:
-                        # First time detecting silence, record the start time
-                        recorder.silence_start_time_ms = current_ms
+                        # Silence is only reported once the hangover ran out, it began that long ago
+                        recorder.silence_start_time_ms = max(0, current_ms - engine.hangover_ms)
                         
                         # If we were in speech before, record the speech segment
                         if recorder.current_speech_start_ms is not None:
-                            speech_segment = {
-                                'audio_path': recorder.output_path,
-                                'start_ms': recorder.current_speech_start_ms,
-                                'end_ms': current_ms,
-                                'duration_ms': current_ms - recorder.current_speech_start_ms,
-                                # Calculate PCM byte position based on sample rate and width
-                                'pcm_start_byte': int(recorder.current_speech_start_ms * 
-                                                recorder.sample_rate * recorder.sample_width / 1000),
-                                'pcm_end_byte': int(current_ms * 
-                                                recorder.sample_rate * recorder.sample_width / 1000)
-                            }
+                            end_ms = max(recorder.silence_start_time_ms, recorder.current_speech_start_ms)
+                            speech_segment = AudioRecorder.speech_segment(recorder, recorder.current_speech_start_ms, end_ms)
                             recorder.speech_segments.append(speech_segment)
                             logger.info(f"[check_for_silence] SPEECH SEGMENT RECORDED: {speech_segment['start_ms']} to {speech_segment['end_ms']} ({speech_segment['duration_ms']}ms), PCM bytes: {speech_segment['pcm_start_byte']} to {speech_segment['pcm_end_byte']}")
                             
                             # Emit speech segment complete event
                             emit_event(EventType.SPEECH_SEGMENT_COMPLETE, 
+                                    agent_id=recorder.agent_id,
                                     call_id=call_id, 
                                     segment=speech_segment)
 
                             # Reset speech tracking
                             recorder.current_speech_start_ms = None
+                            recorder.pause_reported = False
                         
                         logger.info(f"[check_for_silence] SILENCE BEGAN AT: {recorder.silence_start_time_ms}ms")
                     
                     silence_duration_ms = current_ms - recorder.silence_start_time_ms
                     silence_duration = silence_duration_ms / 1000.0  # For logging in seconds
-                    logger.info(f"[check_for_silence] SILENCE DETECTED: {silence_duration:.2f}s ({silence_duration_ms}ms)")
+                    logger.debug(f"[check_for_silence] SILENCE DETECTED: {silence_duration:.2f}s ({silence_duration_ms}ms)")
                     
                     recorder.silent_period += recorder.silence_check_interval
                     
-                    logger.info(f"[check_for_silence] SILENCE STATS: current={silence_duration:.2f}s, threshold={recorder.silence_duration:.2f}s")
-                    
-                    if silence_duration >= recorder.silence_duration:
-                        logger.info(f"[check_for_silence] SILENT EVENT ACTIVE: {silence_duration:.2f}s")
+                    # silence_duration is configured in ms
+                    if silence_duration_ms >= recorder.silence_duration:
                         if not recorder.silence_detected:
                             recorder.silence_detected = True
                             logger.info(f"BEGIN SILENCE EVENT (RMS: {rms:.2f}) for call {call_id}")
                             # Emit silence detected event
                             emit_event(EventType.SILENCE_DETECTED, 
+                                    agent_id=recorder.agent_id,
                                     call_id=call_id, 
                                     duration=silence_duration,
                                     rms=rms)
@@ -262,6 +354,7 @@ class AudioRecorder:
                         
                         # Emit silence ended event
                         emit_event(EventType.SILENCE_ENDED, 
+                                agent_id=recorder.agent_id,
                                 call_id=call_id, 
                                 duration=silence_duration)
 
@@ -271,11 +364,33 @@ class AudioRecorder:
                     
                     # If we're starting a new speech segment after silence
                     if recorder.current_speech_start_ms is None:
-                        recorder.current_speech_start_ms = current_ms
+                        # Speech had to last attack_ms before it was reported, start the segment there
+                        recorder.current_speech_start_ms = max(0, current_ms - engine.attack_ms - recorder.silence_check_interval)
                         logger.info(f"[check_for_silence] NEW SPEECH SEGMENT STARTED AT: {recorder.current_speech_start_ms}ms")
                     
                         # Emit speech detected event
                         emit_event(EventType.SPEECH_DETECTED, 
+                                agent_id=recorder.agent_id,
+                                call_id=call_id,
+                                start_ms=recorder.current_speech_start_ms)
+
+                    # A pause shorter than the hangover keeps the segment open, report it so
+                    # listeners can work on the segment so far, and report when it is over
+                    pause_ms = int(engine.silence_ms[recorder.vad_slot])
+                    if recorder.speech_pause_ms and not recorder.pause_reported and pause_ms >= recorder.speech_pause_ms:
+                        recorder.pause_reported = True
+                        end_ms = max(current_ms - pause_ms, recorder.current_speech_start_ms)
+                        partial_segment = AudioRecorder.speech_segment(recorder, recorder.current_speech_start_ms, end_ms)
+                        logger.info(f"[check_for_silence] SPEECH PAUSED: {partial_segment['start_ms']} to {partial_segment['end_ms']}")
+                        emit_event(EventType.SPEECH_PAUSED,
+                                agent_id=recorder.agent_id,
+                                call_id=call_id,
+                                segment=partial_segment)
+                    elif recorder.pause_reported and pause_ms == 0:
+                        recorder.pause_reported = False
+                        logger.info(f"[check_for_silence] SPEECH RESUMED AT: {current_ms}ms")
+                        emit_event(EventType.SPEECH_RESUMED,
+                                agent_id=recorder.agent_id,
                                 call_id=call_id,
                                 start_ms=recorder.current_speech_start_ms)
 
@@ -283,8 +398,6 @@ class AudioRecorder:
                     recorder.silence_start_time_ms = None
                     recorder.silent_period = 0
                     recorder.silence_detected = False
-                    
-                    logger.info("[check_for_silence] IN SPEECH EVENT")
 
         except Exception as e:
             logger.error(f"Error checking for silence: {e}")
@@ -0,0 +1,106 @@
+import time
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class CallEntry:
+    """Everything known about one live call"""
+
+    __slots__ = ('call_id', 'call', 'agent_id', 'confirmed', 'recorder', 'playback', 'created')
+
+    def __init__(self, call_id, call, agent_id=None):
+        """
+        Args:
+            call_id: Call-ID string of the call
+            call: The pj.Call object, kept alive by the registry
+            agent_id: Agent the call belongs to
+        """
+        self.call_id = call_id
+        self.call = call
+        self.agent_id = agent_id
+        self.confirmed = False
+        self.recorder = None
+        self.playback = None
+        self.created = time.time()
+
+
+class CallRegistry:
+    """
+    Live calls keyed by Call-ID string, together with their recorder and
+    playback queue. Lookups are a dict access, nothing on the hot path has to call
+    getInfo() through SWIG to find a call.
+
+    Written on the PJSUA thread only, the lock keeps iteration from other
+    threads consistent.
+    """
+
+    def __init__(self):
+        self.entries = {}
+        self.lock = threading.Lock()
+
+    def add(self, call_id, call, agent_id=None):
+        """
+        Register a call, returns the existing entry if it is already known
+
+        Args:
+            call_id: Call-ID string of the call
+            call: The pj.Call object
+            agent_id: Agent the call belongs to
+
+        Returns:
+            CallEntry: Entry of the call
+        """
+        with self.lock:
+            entry = self.entries.get(call_id)
+            if entry is None:
+                entry = self.entries[call_id] = CallEntry(call_id, call, agent_id)
+                logger.debug(f"Registered call {call_id}, {len(self.entries)} active")
+            return entry
+
+    def get(self, call_id):
+        """Get the entry of a call or None"""
+        return self.entries.get(call_id)
+
+    def find_call(self, call_id):
+        """Get the pj.Call of a call or None"""
+        entry = self.entries.get(call_id)
+        return entry.call if entry else None
+
+    def first(self):
+        """Get the oldest entry or None"""
+        with self.lock:
+            return next(iter(self.entries.values()), None)
+
+    def remove(self, call_id):
+        """
+        Evict a call
+
+        Returns:
+            CallEntry: The removed entry or None
+        """
+        with self.lock:
+            entry = self.entries.pop(call_id, None)
+        if entry is not None:
+            logger.debug(f"Removed call {call_id}, {len(self.entries)} active")
+        return entry
+
+    def recorders(self):
+        """Get (call_id, recorder) of every call that is being recorded"""
+        with self.lock:
+            return [(call_id, entry.recorder) for call_id, entry in self.entries.items() if entry.recorder is not None]
+
+    def __contains__(self, call_id):
+        return call_id in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __iter__(self):
+        with self.lock:
+            return iter(list(self.entries.values()))
+
+
+# PJSUA is a singleton per process, so is its set of calls
+call_registry = CallRegistry()
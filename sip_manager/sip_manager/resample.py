@@ -0,0 +1,88 @@
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def lowpass_taps(cutoff, count=31):
+    """
+    Windowed sinc low pass filter
+
+    Args:
+        cutoff: Cutoff frequency as a fraction of the sample rate (0 - 0.5)
+        count: Number of taps
+
+    Returns:
+        numpy array of filter taps with unity gain
+    """
+    n = np.arange(count) - (count - 1) / 2.0
+    taps = 2 * cutoff * np.sinc(2 * cutoff * n) * np.hamming(count)
+    return (taps / taps.sum()).astype(np.float32)
+
+
+class Resampler:
+    """
+    Converts 16 bit PCM between sample rates chunk by chunk.
+
+    State is carried across process() calls so chunks of any size can be
+    fed as they arrive and the output is continuous. Downsampling runs a
+    low pass filter first so e.g. 24 kHz TTS audio does not alias into
+    the 8 kHz call.
+    """
+
+    def __init__(self, source_rate, target_rate, taps=31):
+        """
+        Args:
+            source_rate: Sample rate of the input
+            target_rate: Sample rate of the output
+            taps: Length of the anti aliasing filter
+        """
+        self.source_rate = int(source_rate)
+        self.target_rate = int(target_rate)
+        self.step = self.source_rate / float(self.target_rate)
+        self.filter = None
+        self.history = None
+        if self.target_rate < self.source_rate:
+            # Keep a little below the new Nyquist frequency
+            self.filter = lowpass_taps(0.45 / self.step, taps)
+            self.history = np.zeros(taps - 1, dtype=np.float32)
+        # Position of the next output sample relative to self.last
+        self.position = 0.0
+        self.last = None
+
+    @property
+    def passthrough(self):
+        return self.source_rate == self.target_rate
+
+    def process(self, samples):
+        """
+        Resample the next chunk
+
+        Args:
+            samples: numpy int16 array at the source rate
+
+        Returns:
+            numpy int16 array at the target rate
+        """
+        if self.passthrough or len(samples) == 0:
+            return samples
+
+        x = samples.astype(np.float32)
+        if self.filter is not None:
+            x = np.concatenate((self.history, x))
+            self.history = x[-len(self.history):]
+            x = np.convolve(x, self.filter, mode='valid')
+
+        if self.last is not None:
+            x = np.concatenate(([self.last], x))
+        end = len(x) - 1
+        if end < self.position:
+            count = 0
+        else:
+            count = int((end - self.position) // self.step) + 1
+        positions = self.position + self.step * np.arange(count)
+        out = np.interp(positions, np.arange(len(x)), x)
+
+        self.position = self.position + count * self.step - end
+        self.last = x[-1]
+        return np.clip(np.round(out), -32768, 32767).astype(np.int16)
@@ -0,0 +1,215 @@
+import itertools
+import threading
+import logging
+from collections import deque
+import numpy as np
+import pjsua2 as pj
+from .resample import Resampler
+from .commands import CommandType
+
+logger = logging.getLogger(__name__)
+
+stream_ids = itertools.count(1)
+
+
+class StreamBuffer:
+    """
+    PCM that is still arriving, e.g. a TTS response being streamed.
+
+    A producer thread calls write() with 16 bit mono chunks at the source
+    rate, they are resampled to the bridge clock rate right away. The media
+    thread reads one frame at a time through a StreamPort, when the
+    producer has fallen behind the frame is padded with silence and an
+    underrun is counted. Playback only starts once prebuffer_ms is buffered
+    or the producer has finished.
+    """
+
+    def __init__(self, source_rate, sample_rate=8000, ptime=20, prebuffer_ms=60, name=None):
+        """
+        Args:
+            source_rate: Sample rate of the PCM passed to write()
+            sample_rate: Clock rate of the conference bridge
+            ptime: Frame length of the port in ms
+            prebuffer_ms: Audio buffered before playback starts
+            name: Shown as file_path in the playback events
+        """
+        self.source_rate = source_rate
+        self.sample_rate = sample_rate
+        self.ptime = ptime
+        self.name = name or f"stream-{next(stream_ids)}"
+        self.resampler = Resampler(source_rate, sample_rate)
+        self.prebuffer = int(sample_rate * prebuffer_ms / 1000)
+        self.chunks = deque()
+        self.offset = 0  # samples of chunks[0] already played
+        self.buffered = 0
+        self.partial = b''
+        self.lock = threading.Lock()
+        self.started = False
+        self.finished = False
+        self.samples_written = 0
+        self.samples_played = 0
+        self.underruns = 0
+
+    def write(self, pcm):
+        """
+        Append PCM from the producer
+
+        Args:
+            pcm: 16 bit little endian mono PCM bytes at source_rate,
+                 chunks do not have to end on a sample boundary
+        """
+        if self.finished:
+            logger.warning(f"Write to finished stream {self.name} ignored")
+            return
+        if self.partial:
+            pcm = self.partial + pcm
+            self.partial = b''
+        if len(pcm) % 2:
+            self.partial = pcm[-1:]
+            pcm = pcm[:-1]
+        if not pcm:
+            return
+        self.append(self.resampler.process(np.frombuffer(pcm, dtype='<i2')))
+
+    def append(self, samples):
+        """
+        Append samples that are already at the bridge clock rate
+
+        Args:
+            samples: numpy int16 array
+        """
+        with self.lock:
+            self.chunks.append(samples)
+            self.buffered += len(samples)
+            self.samples_written += len(samples)
+
+    def finish(self):
+        """Mark the end of the stream, playback ends once the buffer is empty"""
+        self.finished = True
+
+    @property
+    def drained(self):
+        """True when the producer has finished and everything was played"""
+        return self.finished and self.buffered == 0
+
+    @property
+    def duration(self):
+        """Seconds of audio written so far"""
+        return self.samples_written / float(self.sample_rate)
+
+    def read(self, count):
+        """
+        Take the next frame, called from the media thread
+
+        Args:
+            count: Samples per frame
+
+        Returns:
+            bytes: count samples of 16 bit PCM, padded with silence
+        """
+        out = np.zeros(count, dtype=np.int16)
+        with self.lock:
+            if not self.started:
+                if self.buffered < self.prebuffer and not self.finished:
+                    return out.tobytes()
+                self.started = True
+
+            filled = 0
+            while filled < count and self.chunks:
+                chunk = self.chunks[0]
+                take = min(count - filled, len(chunk) - self.offset)
+                out[filled:filled + take] = chunk[self.offset:self.offset + take]
+                filled += take
+                self.offset += take
+                if self.offset >= len(chunk):
+                    self.chunks.popleft()
+                    self.offset = 0
+
+            self.buffered -= filled
+            self.samples_played += filled
+            if filled < count and not self.finished:
+                self.underruns += 1
+        return out.tobytes()
+
+    def get_stats(self):
+        """Get seconds written and played and the number of underruns"""
+        return {
+            'written': self.samples_written / float(self.sample_rate),
+            'played': self.samples_played / float(self.sample_rate),
+            'underruns': self.underruns,
+        }
+
+
+class StreamPort(pj.AudioMediaPort):
+    """
+    Media port that plays a StreamBuffer to the conference bridge.
+
+    Used by the playback queue like a file player: at the end of the
+    stream it calls on_eof and reports PLAYBACK_EOF through the agent's
+    command channel.
+    """
+
+    def __init__(self, stream, call_id, item_id, commands=None):
+        """
+        Args:
+            stream: StreamBuffer to play
+            call_id: Call-ID string of the call it is played to
+            item_id: ID of the queue item
+            commands: Command channel the end of the stream is reported to
+        """
+        pj.AudioMediaPort.__init__(self)
+        self.stream = stream
+        self.file_path = stream.name
+        self.call_id = call_id
+        self.item_id = item_id
+        self.commands = commands
+        self.start_time = None
+        self.eof = False
+        self.on_eof = None
+        self.samples_per_frame = int(stream.sample_rate * stream.ptime / 1000)
+
+        fmt = pj.MediaFormatAudio()
+        fmt.init(pj.PJMEDIA_FORMAT_PCM,
+                 stream.sample_rate,
+                 1,
+                 stream.ptime * 1000,
+                 16)
+        self.createPort(f"{stream.name}-{call_id}", fmt)
+
+    @property
+    def duration(self):
+        return self.stream.duration
+
+    def onFrameRequested(self, frame):
+        """Called by the media thread for every frame the bridge needs"""
+        try:
+            pcm = self.stream.read(self.samples_per_frame)
+            frame.type = pj.PJMEDIA_FRAME_TYPE_AUDIO
+            frame.buf = pj.ByteVector(pcm)
+            frame.size = len(pcm)
+
+            if self.stream.drained and not self.eof:
+                self.eof = True
+                if self.on_eof is not None:
+                    self.on_eof(self)
+                if self.commands is not None:
+                    self.commands.put(CommandType.PLAYBACK_EOF, call_id=self.call_id, item_id=self.item_id)
+        except Exception as e:
+            logger.error(f"Error streaming frame to call {self.call_id}: {e}")
+
+
+def create_stream(config, source_rate):
+    """
+    Create a stream buffer matching the agent's media settings
+
+    Args:
+        config: sip_manager configuration
+        source_rate: Sample rate of the PCM that will be written
+
+    Returns:
+        StreamBuffer: The buffer
+    """
+    return StreamBuffer(source_rate,
+                        sample_rate=config.clock_rate,
+                        ptime=config.ptime,
+                        prebuffer_ms=getattr(config, 'stream_prebuffer_ms', 60))
@@ -0,0 +1,588 @@
+import os
+import copy
+import time
+import queue
+import pickle
+import logging
+import threading
+import functools
+import multiprocessing
+import pjsua2 as pj
+from .events import EventType, emit_event, register_listener, unregister_listener, configure_events, ANY_EVENT
+from .commands import CommandType
+from .account import Account
+from .stream import stream_ids
+
+logger = logging.getLogger(__name__)
+
+# Values that always survive the trip to the supervisor
+plain_types = (str, int, float, bool, bytes, type(None))
+
+
+def portable(data):
+    """
+    Drop the event values that cannot be sent to another process,
+    e.g. the SWIG CallInfo attached to CALL_ANSWERED
+
+    Args:
+        data: Event keyword arguments
+
+    Returns:
+        dict: The picklable part of data
+    """
+    result = {}
+    for key, value in data.items():
+        if not isinstance(value, plain_types):
+            try:
+                pickle.dumps(value)
+            except Exception:
+                continue
+        result[key] = value
+    return result
+
+
+def setup_worker_logging(name):
+    """Give a spawned process a log handler, it does not inherit the parent's"""
+    if not logging.getLogger().handlers:
+        logging.basicConfig(format=f"%(asctime)s [{name}] %(name)s %(levelname)s: %(message)s")
+
+
+def worker_main(index, config, agent_id, commands, messages, heartbeat_interval):
+    """
+    Entry point of a worker process: runs one SIP agent with its own
+    endpoint and transport, forwards its events and runs the commands the
+    supervisor routes to it.
+
+    Args:
+        index: Worker number
+        config: sip_manager configuration with this worker's public_port
+        agent_id: ID of the worker's agent
+        commands: Queue of command dicts from the supervisor, None stops
+        messages: Queue of events and heartbeats to the supervisor
+        heartbeat_interval: Seconds between heartbeats, they are sent on this
+            timer however many commands arrive in between
+    """
+    from . import create_agent, get_event_metrics, shutdown_events
+
+    setup_worker_logging(agent_id)
+    agent = create_agent(config, agent_id=agent_id)
+
+    def forward(event_type, **data):
+        try:
+            messages.put(('event', index, event_type, portable(data)))
+        except Exception as e:
+            logger.error(f"Error forwarding {event_type} to supervisor: {e}")
+
+    register_listener(ANY_EVENT, forward)
+
+    if not agent.start_nonblocking():
+        logger.error(f"Worker {index} failed to start its agent")
+        messages.put(('failed', index, None))
+        return
+
+    try:
+        next_heartbeat = time.monotonic()
+        while agent.is_running():
+            try:
+                cmd = commands.get(timeout=max(0, next_heartbeat - time.monotonic()))
+            except queue.Empty:
+                cmd = False
+            if cmd is None:
+                break
+            if cmd:
+                command_type = cmd.pop('type')
+                agent.send_command(command_type, **cmd)
+            now = time.monotonic()
+            if now >= next_heartbeat:
+                next_heartbeat = now + heartbeat_interval
+                messages.put(('heartbeat', index, {
+                    'pid': os.getpid(),
+                    # Heartbeats come from this loop, the age tells whether the PJSUA thread still runs
+                    'loop_age': agent.loop_age(),
+                    'commands': agent.command_metrics(),
+                    'events': get_event_metrics(),
+                    'prompts': agent.prompt_cache_metrics(),
+                }))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        agent.stop()
+        unregister_listener(ANY_EVENT, forward)
+        shutdown_events()
+
+
+class RedirectCall(pj.Call):
+    """Incoming call on the distributor, only lives until the redirect is sent"""
+
+    def __init__(self, acc, call_id):
+        pj.Call.__init__(self, acc, call_id)
+        self.acc = acc
+
+    def onCallState(self, prm):
+        if self.getInfo().state == pj.PJSIP_INV_STATE_DISCONNECTED and self in self.acc.redirects:
+            self.acc.redirects.remove(self)
+
+
+class RedirectAccount(Account):
+    """
+    Account of the distributor: answers every INVITE with a 302 pointing at
+    the worker that currently has the fewest calls.
+    """
+
+    def __init__(self, config, agent_id=None, commands=None, targets=None, call_counts=None):
+        """
+        Args:
+            config: sip_manager configuration
+            agent_id: ID of the distributor
+            commands: Command channel of the distributor agent
+            targets: SIP URI of each worker
+            call_counts: Shared array with the active calls of each worker
+        """
+        Account.__init__(self, config, agent_id=agent_id, commands=commands)
+        self.targets = targets or []
+        self.call_counts = call_counts
+        # Calls being redirected, they never enter the call registry
+        self.redirects = []
+
+    def onIncomingCall(self, prm):
+        call = RedirectCall(self, prm.callId)
+        self.redirects.append(call)
+        try:
+            index = min(range(len(self.targets)), key=lambda i: self.call_counts[i])
+            call_prm = pj.CallOpParam()
+            call_prm.statusCode = 302  # Moved Temporarily
+            # pjsua puts the target URI of a 3xx answer in its Contact header
+            call_prm.txOption.targetUri = self.targets[index]
+            call.answer(call_prm)
+            logger.info(f"Redirected call {prm.callId} to worker {index}: {self.targets[index]}")
+        except Exception as e:
+            logger.error(f"Error redirecting call: {e}")
+
+
+def distributor_main(config, targets, call_counts, stop):
+    """
+    Entry point of the distributor process, which owns the public port and
+    redirects incoming calls to the workers
+
+    Args:
+        config: sip_manager configuration
+        targets: SIP URI of each worker
+        call_counts: Shared array with the active calls of each worker
+        stop: Event set by the supervisor to shut down
+    """
+    from .agent import SipAgent
+
+    setup_worker_logging("distributor")
+    agent = SipAgent(config, agent_id="distributor")
+    agent.account_class = functools.partial(RedirectAccount, targets=targets, call_counts=call_counts)
+    agent.register_account()
+    try:
+        while not stop.is_set():
+            agent.ep.libHandleEvents(100)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        agent.stop()
+
+
+class PooledStream:
+    """
+    Producer side of a stream played by a pool worker, every chunk is sent
+    to the worker as a STREAM_WRITE command.
+    """
+
+    def __init__(self, pool, call_id, stream_id):
+        self.pool = pool
+        self.call_id = call_id
+        self.stream_id = stream_id
+
+    def write(self, pcm):
+        """Send 16 bit mono PCM to the worker"""
+        self.pool.send_command(CommandType.STREAM_WRITE, call_id=self.call_id, stream_id=self.stream_id, pcm=bytes(pcm))
+
+    def finish(self):
+        """Mark the end of the stream"""
+        self.pool.send_command(CommandType.STREAM_END, call_id=self.call_id, stream_id=self.stream_id)
+
+
+class AgentPool:
+    """
+    Runs N SIP agents in separate processes so media, VAD and event
+    handling use every core instead of sharing one GIL.
+
+    Every worker gets its own endpoint and transport on public_port + n.
+    Incoming calls are spread over them either by a distributor on
+    public_port that redirects each INVITE to the least loaded worker, or
+    by whatever sits in front (registrar, proxy, SRV records). Events of all
+    workers are re-emitted here under the pool's agent ID, and commands are
+    routed to the worker that owns the call, so the pool can be used like
+    the wrapper returned by create_agent().
+    """
+
+    def __init__(self, config, agent_id=None):
+        """
+        Args:
+            config: sip_manager configuration
+            agent_id: ID the pool's events are emitted under
+        """
+        self.config = config
+        self.id = agent_id or f"pool-{os.getpid()}"
+        self.EventType = EventType
+        self.size = max(1, int(getattr(config, 'workers', 1)))
+        self.distribution = getattr(config, 'pool_distribution', 'redirect')
+        self.heartbeat_interval = getattr(config, 'pool_heartbeat_interval', 1.0)
+        self.heartbeat_timeout = getattr(config, 'pool_heartbeat_timeout', 5.0)
+        self.start_timeout = getattr(config, 'pool_start_timeout', 30.0)
+        self.context = multiprocessing.get_context(getattr(config, 'pool_start_method', 'spawn'))
+
+        base_port = config.public_port + (1 if self.distribution == 'redirect' else 0)
+        self.ports = [base_port + index for index in range(self.size)]
+        host = config.public_ip or config.bound_address
+        user = config.username or "echomatrix"
+        self.targets = [f"sip:{user}@{host}:{port}" for port in self.ports]
+
+        self.messages = self.context.Queue()
+        self.call_counts = self.context.Array('i', self.size)
+        self.workers = [None] * self.size
+        self.call_owner = {}
+        self.lock = threading.Lock()
+        self.running = threading.Event()
+        self.distributor = None
+        self.distributor_stop = None
+        self._threads = []
+
+    def _worker_config(self, index):
+        worker_config = copy.deepcopy(self.config)
+        worker_config.public_port = self.ports[index]
+        if self.distribution == 'redirect':
+            # Only the distributor's contact may be registered, otherwise
+            # the registrar forks INVITEs past it straight to the workers
+            worker_config.register = False
+        return worker_config
+
+    def _start_worker(self, index):
+        commands = self.context.Queue()
+        process = self.context.Process(
+            name=f"{self.id}-{index}",
+            target=worker_main,
+            args=(index, self._worker_config(index), f"{self.id}-{index}", commands,
+                  self.messages, self.heartbeat_interval))
+        process.daemon = True
+        process.start()
+        restarts = self.workers[index]['restarts'] + 1 if self.workers[index] else 0
+        self.workers[index] = {
+            'process': process,
+            'commands': commands,
+            'port': self.ports[index],
+            'started': time.time(),
+            'last_heartbeat': time.time(),
+            # Time the PJSUA thread last ran its loop, as of the last heartbeat
+            'last_loop': None,
+            'ready': False,
+            'restarts': restarts,
+            'stats': {},
+        }
+        self.call_counts[index] = 0
+        logger.info(f"Started worker {index} (pid {process.pid}) on port {self.ports[index]}")
+
+    def start_nonblocking(self):
+        """Start the workers, the distributor and the supervisor threads"""
+        if self.running.is_set():
+            logger.warning("Agent pool already running")
+            return False
+
+        self.running.set()
+        for index in range(self.size):
+            self._start_worker(index)
+
+        if self.distribution == 'redirect':
+            self.distributor_stop = self.context.Event()
+            self.distributor = self.context.Process(
+                name=f"{self.id}-distributor",
+                target=distributor_main,
+                args=(copy.deepcopy(self.config), self.targets, self.call_counts, self.distributor_stop))
+            self.distributor.daemon = True
+            self.distributor.start()
+            logger.info(f"Started distributor on port {self.config.public_port}")
+
+        for name, target in (("POOL-EVENTS", self._pump_messages), ("POOL-MONITOR", self._monitor)):
+            thread = threading.Thread(name=name, target=target)
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
+
+        logger.info(f"Agent pool {self.id} started with {self.size} workers")
+        return True
+
+    def stop(self):
+        """Stop the distributor and all workers"""
+        if not self.running.is_set():
+            logger.info("Agent pool not running")
+            return
+
+        logger.info(f"Stopping agent pool {self.id}")
+        self.running.clear()
+        if self.distributor_stop is not None:
+            self.distributor_stop.set()
+        for worker in self.workers:
+            if worker:
+                worker['commands'].put(None)
+
+        processes = [worker['process'] for worker in self.workers if worker]
+        if self.distributor is not None:
+            processes.append(self.distributor)
+        for process in processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                logger.warning(f"{process.name} did not exit cleanly, terminating")
+                process.terminate()
+
+        self.messages.put(None)
+        for thread in self._threads:
+            thread.join(timeout=5)
+        self._threads = []
+        self.distributor = None
+        emit_event(EventType.AGENT_STOPPED, agent_id=self.id)
+
+    def is_running(self):
+        """Check if the pool is running"""
+        return self.running.is_set()
+
+    def _pump_messages(self):
+        """Re-emit worker events under the pool's agent ID and track call ownership"""
+        while True:
+            try:
+                message = self.messages.get(timeout=self.heartbeat_interval)
+            except queue.Empty:
+                if not self.running.is_set():
+                    break
+                continue
+            if message is None:
+                break
+            try:
+                kind, index, *payload = message
+                worker = self.workers[index]
+                if worker:
+                    worker['last_heartbeat'] = time.time()
+                    worker['ready'] = True
+                if kind == 'heartbeat':
+                    if worker:
+                        worker['stats'] = payload[0]
+                        loop_age = payload[0].get('loop_age')
+                        if loop_age is not None:
+                            worker['last_loop'] = time.time() - loop_age
+                elif kind == 'event':
+                    self._handle_event(index, *payload)
+                elif kind == 'failed':
+                    logger.error(f"Worker {index} failed to start")
+            except Exception as e:
+                logger.error(f"Error handling message from worker: {e}")
+
+    def _handle_event(self, index, event_type, data):
+        call_id = data.get('call_id')
+        if call_id:
+            with self.lock:
+                if event_type == EventType.CALL_ANSWERED and call_id not in self.call_owner:
+                    self.call_counts[index] += 1
+                if event_type == EventType.CALL_DISCONNECTED:
+                    if self.call_owner.pop(call_id, None) is not None:
+                        self.call_counts[index] = max(0, self.call_counts[index] - 1)
+                else:
+                    self.call_owner[call_id] = index
+
+        data['worker'] = index
+        data['worker_agent_id'] = data.get('agent_id')
+        data['agent_id'] = self.id
+        emit_event(event_type, **data)
+
+    def _monitor(self):
+        """Check the workers once per heartbeat interval"""
+        while self.running.is_set():
+            time.sleep(self.heartbeat_interval)
+            self._check_workers()
+
+    def _check_workers(self):
+        """
+        Restart workers that died, stopped sending heartbeats or whose
+        PJSUA thread stopped running its loop
+
+        Returns:
+            list: Indexes of the restarted workers
+        """
+        restarted = []
+        for index, worker in enumerate(self.workers):
+            if not self.running.is_set() or worker is None:
+                break
+            process = worker['process']
+            silent = time.time() - worker['last_heartbeat']
+            stuck = time.time() - worker['last_loop'] if worker['last_loop'] is not None else 0
+            # A worker gets start_timeout to come up before its first heartbeat
+            timeout = self.heartbeat_timeout if worker['ready'] else max(self.heartbeat_timeout, self.start_timeout)
+            if not process.is_alive():
+                logger.error(f"Worker {index} exited with code {process.exitcode}, restarting")
+            elif silent > timeout or stuck > self.heartbeat_timeout:
+                if silent > timeout:
+                    logger.error(f"Worker {index} missed heartbeats for {silent:.1f}s, restarting")
+                else:
+                    logger.error(f"Worker {index} PJSUA thread stuck for {stuck:.1f}s, restarting")
+                process.terminate()
+                process.join(timeout=5)
+            else:
+                continue
+            self._forget_calls(index)
+            self._start_worker(index)
+            restarted.append(index)
+        return restarted
+
+    def _forget_calls(self, index):
+        """Drop the calls owned by a worker that is restarted"""
+        with self.lock:
+            for call_id in [c for c, owner in self.call_owner.items() if owner == index]:
+                del self.call_owner[call_id]
+
+    def worker_status(self):
+        """
+        Get the health and load of every worker
+
+        Returns:
+            list: One dict per worker with pid, port, alive, healthy, calls,
+                  heartbeat age, PJSUA loop age, restarts and its command/event metrics
+        """
+        status = []
+        now = time.time()
+        for index, worker in enumerate(self.workers):
+            if worker is None:
+                continue
+            age = now - worker['last_heartbeat']
+            loop_age = now - worker['last_loop'] if worker['last_loop'] is not None else None
+            alive = worker['process'].is_alive()
+            status.append({
+                'worker': index,
+                'pid': worker['process'].pid,
+                'port': worker['port'],
+                'alive': alive,
+                'healthy': alive and age <= self.heartbeat_timeout and (loop_age or 0) <= self.heartbeat_timeout,
+                'calls': self.call_counts[index],
+                'heartbeat_age': age,
+                'loop_age': loop_age,
+                'restarts': worker['restarts'],
+                'commands': worker['stats'].get('commands', {}),
+                'events': worker['stats'].get('events', {}),
+            })
+        return status
+
+    def register_event(self, event_type, callback):
+        """Register an event listener for the events of every worker"""
+        return register_listener(event_type, callback, agent_id=self.id)
+
+    def unregister_event(self, event_type, callback):
+        """Unregister an event listener"""
+        return unregister_listener(event_type, callback, agent_id=self.id)
+
+    def emit_event(self, event_type, **kwargs):
+        """Emit an event"""
+        kwargs['agent_id'] = self.id
+        return emit_event(event_type, **kwargs)
+
+    def send_command(self, command_type, **params):
+        """
+        Send a command to the worker that owns the call
+
+        Args:
+            command_type: One of CommandType
+            **params: Parameters of the command, call_id selects the worker
+
+        Returns:
+            bool: True if successfully queued, False otherwise
+        """
+        if not self.is_running():
+            logger.error(f"Agent pool not running, cannot send {command_type}")
+            return False
+
+        call_id = params.get('call_id')
+        with self.lock:
+            index = self.call_owner.get(call_id)
+        if index is None:
+            logger.warning(f"No worker owns call {call_id}, dropping {command_type}")
+            return False
+
+        params['type'] = command_type
+        self.workers[index]['commands'].put(params)
+        return True
+
+    def play_wav_to_call(self, file_path, call_id):
+        """Queue a WAV file to play on a specific call"""
+        return self.send_command(CommandType.PLAY_WAV, file_path=file_path, call_id=call_id)
+
+    def enqueue_wav_to_call(self, file_path, call_id):
+        """
+        Queue a WAV file to play after what is already playing on a call
+        
+        Args:
+            file_path: Path to the WAV file
+            call_id: ID of the call to play the file on
+        """
+        return self.send_command(CommandType.ENQUEUE_WAV, file_path=file_path, call_id=call_id)
+
+    def play_stream(self, call_id, sample_rate, enqueue=False):
+        """
+        Start playing PCM that is still being produced on the worker that owns the call
+
+        Args:
+            call_id: ID of the call to play the stream on
+            sample_rate: Sample rate of the PCM that will be written
+            enqueue: Play after what is already queued instead of interrupting it
+
+        Returns:
+            PooledStream: Forwards write() and finish() to the worker, None on error
+        """
+        stream_id = f"{self.id}-{next(stream_ids)}"
+        if not self.send_command(CommandType.PLAY_STREAM, call_id=call_id, stream_id=stream_id,
+                                 sample_rate=sample_rate, enqueue=enqueue):
+            return None
+        return PooledStream(self, call_id, stream_id)
+
+    def skip_audio(self, call_id):
+        """Queue skipping to the next queued item of a call"""
+        return self.send_command(CommandType.SKIP_AUDIO, call_id=call_id)
+
+    def clear_audio_queue(self, call_id):
+        """Queue dropping the items waiting behind the one playing on a call"""
+        return self.send_command(CommandType.CLEAR_AUDIO_QUEUE, call_id=call_id)
+
+    def stop_audio(self, call_id):
+        """Queue stopping the audio playing on a call"""
+        return self.send_command(CommandType.STOP_AUDIO, call_id=call_id)
+
+    def hangup(self, call_id, status_code=None):
+        """Queue hanging up a call"""
+        return self.send_command(CommandType.HANGUP, call_id=call_id, status_code=status_code)
+
+    def pause_recording(self, call_id):
+        """Queue pausing the recording of a call"""
+        return self.send_command(CommandType.PAUSE_RECORDING, call_id=call_id)
+
+    def resume_recording(self, call_id):
+        """Queue resuming the recording of a call"""
+        return self.send_command(CommandType.RESUME_RECORDING, call_id=call_id)
+
+    def transfer(self, call_id, destination):
+        """Queue a blind transfer"""
+        return self.send_command(CommandType.TRANSFER, call_id=call_id, destination=destination)
+
+
+def create_agent_pool(config, agent_id=None):
+    """
+    Create a pool of SIP agent processes that acts as one logical agent
+
+    Args:
+        config: sip_manager configuration, workers sets the pool size
+        agent_id: ID the pool's events are emitted under
+
+    Returns:
+        AgentPool: The pool, start it with start_nonblocking()
+    """
+    from .log import set_logging
+    set_logging(config.log_level)
+    configure_events(config)
+    return AgentPool(config, agent_id=agent_id)
@@ -0,0 +1,278 @@
+import threading
+import logging
+import numpy as np
+from .vad_engine import create_vad_engine
+
+logger = logging.getLogger(__name__)
+
+
+class BatchVad:
+    """
+    Voice activity features for every live call in one vectorised pass.
+
+    Each call owns a row of a preallocated 2-D array that is used as a ring
+    buffer holding its analysis window. Capture ports write new frames into
+    their row and update the row's running sum of squares and count of
+    zero crossings, so a write costs O(new samples). Once per tick
+    process() turns those sums into RMS, zero-crossing rate and a noise
+    floor for all rows at once without allocating, then hands them to the
+    VadEngine for the speech/silence decision.
+
+    Writes come from the media thread and process() runs on the PJSUA
+    thread, both hold the lock so add() can not swap the arrays under them.
+    """
+
+    def __init__(self, window, sample_width=2, max_calls=256, noise_alpha=0.05, engine=None):
+        """
+        Args:
+            window: Analysis window length in samples
+            sample_width: Sample width in bytes
+            max_calls: Number of rows preallocated, grows when exceeded
+            noise_alpha: How fast the noise floor rises towards the signal (0-1)
+            engine: VadEngine making the speech decision for each row
+        """
+        self.window = max(2, int(window))
+        self.sample_width = sample_width
+        self.noise_alpha = noise_alpha
+        self.engine = engine
+        self.lock = threading.Lock()
+        self.slots = {}
+        self.free = []
+        self.high_water = 0
+        self._allocate(max(1, int(max_calls)))
+
+    def _allocate(self, rows):
+        """(Re)allocate all per-row arrays, keeping existing rows"""
+        old_rows = getattr(self, 'rows', 0)
+        w = self.window
+
+        def grow(name, shape, dtype):
+            new = np.zeros(shape, dtype=dtype)
+            old = getattr(self, name, None)
+            if old is not None:
+                new[:old_rows] = old
+            setattr(self, name, new)
+
+        grow('windows', (rows, w), np.float32)
+        # flips[slot, i]: the sample at i has another sign than the one written before it
+        grow('flips', (rows, w), bool)
+        grow('write_pos', rows, np.int64)
+        grow('total', rows, np.int64)
+        grow('sum_squares', rows, np.float64)
+        grow('crossings', rows, np.int64)
+        grow('fresh', rows, bool)
+        grow('rms', rows, np.float32)
+        grow('zcr', rows, np.float32)
+        grow('noise_floor', rows, np.float32)
+
+        # Scratch space for process()
+        self._counts = np.zeros(rows, dtype=np.float64)
+        self._means = np.zeros(rows, dtype=np.float64)
+        self._tmp = np.zeros(rows, dtype=np.float32)
+        self._mask = np.zeros(rows, dtype=bool)
+        if self.engine is not None:
+            self.engine.resize(rows)
+        self.rows = rows
+
+    def add(self, call_id):
+        """
+        Reserve a row for a call
+
+        Args:
+            call_id: ID of the call
+
+        Returns:
+            int: Row index for the call
+        """
+        with self.lock:
+            if call_id in self.slots:
+                return self.slots[call_id]
+            if self.free:
+                slot = self.free.pop()
+            else:
+                if self.high_water == self.rows:
+                    logger.info(f"Growing VAD batch from {self.rows} to {self.rows * 2} calls")
+                    self._allocate(self.rows * 2)
+                slot = self.high_water
+                self.high_water += 1
+            self._clear(slot)
+            self.rms[slot] = 0
+            self.zcr[slot] = 0
+            self.noise_floor[slot] = 0
+            self.fresh[slot] = True
+            if self.engine is not None:
+                self.engine.reset(slot)
+            self.slots[call_id] = slot
+            return slot
+
+    def remove(self, call_id):
+        """Release the row held by a call"""
+        with self.lock:
+            slot = self.slots.pop(call_id, None)
+            if slot is not None:
+                self._clear(slot)
+                if self.engine is not None:
+                    self.engine.reset(slot)
+                self.free.append(slot)
+
+    def _clear(self, slot):
+        """Empty a row, unused positions of a row are always zero"""
+        self.windows[slot] = 0
+        self.flips[slot] = False
+        self.write_pos[slot] = 0
+        self.total[slot] = 0
+        self.sum_squares[slot] = 0
+        self.crossings[slot] = 0
+
+    def write(self, slot, samples):
+        """
+        Append new samples to a call's window
+
+        Args:
+            slot: Row index returned by add()
+            samples: numpy array of new samples, oldest first
+        """
+        n = len(samples)
+        if n == 0:
+            return
+        samples = samples.astype(np.float32)
+        if self.sample_width == 1:
+            samples -= 128  # convert unsigned to signed center
+
+        w = self.window
+        with self.lock:
+            row = self.windows[slot]
+            flips = self.flips[slot]
+            pos = int(self.write_pos[slot])
+            held = min(int(self.total[slot]), w)
+            if n >= w:
+                row[:] = samples[-w:]
+                np.not_equal(np.signbit(row[1:]), np.signbit(row[:-1]), out=flips[1:])
+                flips[0] = False
+                pos = 0
+                self.sum_squares[slot] = np.dot(row.astype(np.float64), row)
+                self.crossings[slot] = np.count_nonzero(flips)
+            else:
+                # Whether each new sample changes sign, the first one against the newest held
+                signs = np.signbit(samples)
+                new_flips = np.empty(n, dtype=bool)
+                new_flips[0] = held > 0 and signs[0] != np.signbit(row[(pos - 1) % w])
+                np.not_equal(signs[1:], signs[:-1], out=new_flips[1:])
+                squares = np.dot(samples.astype(np.float64), samples)
+
+                # The positions written over hold the oldest samples, or zeros if not full
+                end = pos + n
+                if end <= w:
+                    dropped = row[pos:end].astype(np.float64)
+                    self.sum_squares[slot] -= np.dot(dropped, dropped)
+                    self.crossings[slot] -= np.count_nonzero(flips[pos:end])
+                    row[pos:end] = samples
+                    flips[pos:end] = new_flips
+                else:
+                    first = w - pos
+                    dropped = np.concatenate((row[pos:], row[:n - first])).astype(np.float64)
+                    self.sum_squares[slot] -= np.dot(dropped, dropped)
+                    self.crossings[slot] -= np.count_nonzero(flips[pos:]) + np.count_nonzero(flips[:n - first])
+                    row[pos:] = samples[:first]
+                    row[:n - first] = samples[first:]
+                    flips[pos:] = new_flips[:first]
+                    flips[:n - first] = new_flips[first:]
+                self.sum_squares[slot] += squares
+                self.crossings[slot] += np.count_nonzero(new_flips)
+                pos = end % w
+
+                if held + n > w:
+                    # The oldest sample has no predecessor left to cross from
+                    if flips[pos]:
+                        flips[pos] = False
+                        self.crossings[slot] -= 1
+                if end >= w:
+                    # Once per lap the sum is recomputed, rounding errors do not pile up
+                    self.sum_squares[slot] = np.dot(row.astype(np.float64), row)
+            self.write_pos[slot] = pos
+            self.total[slot] += n
+
+    def process(self):
+        """Compute RMS, zero-crossing rate and noise floor for every row and run the engine"""
+        with self.lock:
+            n = self.high_water
+            if n == 0:
+                return
+
+            counts = self._counts[:n]
+            means = self._means[:n]
+            rms = self.rms[:n]
+            zcr = self.zcr[:n]
+            noise = self.noise_floor[:n]
+            tmp = self._tmp[:n]
+            mask = self._mask[:n]
+
+            # Rows that have not filled their window yet only average what they have
+            np.minimum(self.total[:n], self.window, out=counts, casting='unsafe')
+            np.maximum(counts, 1, out=counts)
+
+            # The running sums already cover each window
+            np.divide(self.sum_squares[:n], counts, out=means)
+            np.maximum(means, 0, out=means)
+            np.sqrt(means, out=rms, casting='same_kind')
+            np.divide(self.crossings[:n], counts, out=means)
+            np.copyto(zcr, means, casting='same_kind')
+
+            # Noise floor follows drops immediately and rises slowly,
+            # it is held while the engine considers the call to be speaking
+            np.subtract(rms, noise, out=tmp)
+            np.multiply(tmp, self.noise_alpha, out=tmp)
+            np.add(tmp, noise, out=tmp)
+            if self.engine is not None:
+                np.copyto(tmp, noise, where=self.engine.speaking[:n])
+            np.minimum(tmp, rms, out=noise)
+            np.copyto(noise, rms, where=self.fresh[:n])
+            np.equal(self.total[:n], 0, out=mask)
+            np.logical_and(self.fresh[:n], mask, out=self.fresh[:n])
+
+            if self.engine is not None:
+                self.engine.update(self, n)
+
+    def recent(self, slot, count):
+        """Get the last count samples of a call's window in chronological order"""
+        count = min(int(count), self.window)
+        row = self.windows[slot]
+        start = (int(self.write_pos[slot]) - count) % self.window
+        if start + count <= self.window:
+            return row[start:start + count]
+        return np.concatenate((row[start:], row[:start + count - self.window]))
+
+    def features(self, slot):
+        """
+        Get the last computed features of a call
+
+        Returns:
+            tuple: (rms, zcr, noise_floor, total samples seen)
+        """
+        return float(self.rms[slot]), float(self.zcr[slot]), float(self.noise_floor[slot]), int(self.total[slot])
+
+    def is_speech(self, slot):
+        """Get the engine's smoothed decision for a call"""
+        if self.engine is None:
+            return False
+        return bool(self.engine.speaking[slot])
+
+
+batch_vad = None
+
+
+def get_batch_vad(config):
+    """
+    Get the process wide BatchVad, creating it from config on first use.
+    PJSUA is a singleton per process so one batch covers every call.
+    """
+    global batch_vad
+    if batch_vad is None:
+        window_ms = getattr(config, 'vad_window_ms', config.silence_duration)
+        window = config.sample_rate * window_ms / 1000
+        batch_vad = BatchVad(window,
+                             sample_width=config.sample_width,
+                             max_calls=getattr(config, 'vad_max_calls', 256),
+                             noise_alpha=getattr(config, 'vad_noise_alpha', 0.05),
+                             engine=create_vad_engine(config))
+    return batch_vad
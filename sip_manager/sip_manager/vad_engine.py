@@ -0,0 +1,224 @@
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class VadEngine:
+    """
+    Turns the per-call features of a BatchVad into speech/silence decisions.
+
+    Subclasses implement classify(), which marks the rows that look like
+    speech on this tick. The base class smooths that raw decision for all
+    rows at once: a call only switches to speech after attack_ms of
+    continuous activity and only falls back to silence after hangover_ms
+    without any, which filters clicks and short noise bursts and keeps
+    natural pauses inside one segment.
+    """
+
+    name = None
+
+    def __init__(self, config):
+        """
+        Args:
+            config: sip_manager configuration
+        """
+        self.interval_ms = config.silence_check_interval
+        self.attack_ms = getattr(config, 'vad_attack_ms', 0)
+        self.hangover_ms = getattr(config, 'vad_hangover_ms', config.silence_duration)
+        self.rows = 0
+
+    def resize(self, rows):
+        """(Re)allocate the per-row state, keeping existing rows"""
+        old_rows = self.rows
+
+        def grow(name, dtype):
+            new = np.zeros(rows, dtype=dtype)
+            old = getattr(self, name, None)
+            if old is not None:
+                new[:old_rows] = old
+            setattr(self, name, new)
+
+        grow('speech_ms', np.int64)
+        grow('silence_ms', np.int64)
+        grow('speaking', bool)
+        self._active = np.zeros(rows, dtype=bool)
+        self._idle = np.zeros(rows, dtype=bool)
+        self._hit = np.zeros(rows, dtype=bool)
+        # Scratch for classify(), so no tick allocates
+        self._scratch = np.zeros(rows, dtype=bool)
+        self.rows = rows
+
+    def reset(self, slot):
+        """Clear the state of a row when a call takes it over"""
+        self.speech_ms[slot] = 0
+        self.silence_ms[slot] = 0
+        self.speaking[slot] = False
+
+    def classify(self, batch, n, out):
+        """
+        Mark the rows whose current window looks like speech
+
+        Args:
+            batch: BatchVad holding the features
+            n: Number of rows in use
+            out: Boolean array of length n to fill
+        """
+        raise NotImplementedError
+
+    def update(self, batch, n):
+        """Classify all rows and apply attack/hangover"""
+        active = self._active[:n]
+        idle = self._idle[:n]
+        hit = self._hit[:n]
+        speech = self.speech_ms[:n]
+        silence = self.silence_ms[:n]
+        speaking = self.speaking[:n]
+
+        self.classify(batch, n, active)
+        np.greater(batch.total[:n], 0, out=hit)
+        np.logical_and(active, hit, out=active)
+        np.logical_not(active, out=idle)
+
+        # Length of the current run of active / idle ticks
+        np.add(speech, self.interval_ms, out=speech)
+        np.multiply(speech, active, out=speech)
+        np.add(silence, self.interval_ms, out=silence)
+        np.multiply(silence, idle, out=silence)
+
+        np.greater_equal(speech, self.attack_ms, out=hit)
+        np.logical_and(hit, active, out=hit)
+        np.logical_or(speaking, hit, out=speaking)
+
+        np.greater_equal(silence, self.hangover_ms, out=hit)
+        np.logical_and(hit, idle, out=hit)
+        np.logical_not(hit, out=hit)
+        np.logical_and(speaking, hit, out=speaking)
+
+
+class EnergyZcrEngine(VadEngine):
+    """
+    Speech is energy above silence_threshold with a zero-crossing rate
+    below vad_zcr_max. Hiss and line noise cross zero far more often than
+    voiced speech, so loud noise no longer opens a segment.
+    """
+
+    name = 'energy'
+
+    def __init__(self, config):
+        super().__init__(config)
+        self.threshold = config.silence_threshold
+        self.zcr_max = getattr(config, 'vad_zcr_max', 0.4)
+
+    def classify(self, batch, n, out):
+        np.greater_equal(batch.rms[:n], self.threshold, out=out)
+        np.less_equal(batch.zcr[:n], self.zcr_max, out=self._scratch[:n])
+        np.logical_and(out, self._scratch[:n], out=out)
+
+
+class AdaptiveNoiseEngine(VadEngine):
+    """
+    Speech is energy vad_noise_ratio times above the call's own noise floor.
+    Quiet lines trigger earlier and noisy lines need more than a fixed
+    threshold, vad_min_rms keeps digital silence from counting as speech.
+    """
+
+    name = 'adaptive'
+
+    def __init__(self, config):
+        super().__init__(config)
+        self.ratio = getattr(config, 'vad_noise_ratio', 3.0)
+        self.min_rms = getattr(config, 'vad_min_rms', 30)
+
+    def classify(self, batch, n, out):
+        np.multiply(batch.noise_floor[:n], self.ratio, out=batch._tmp[:n])
+        np.greater_equal(batch.rms[:n], batch._tmp[:n], out=out)
+        np.greater_equal(batch.rms[:n], self.min_rms, out=self._scratch[:n])
+        np.logical_and(out, self._scratch[:n], out=out)
+
+
+class WebRtcEngine(VadEngine):
+    """
+    Runs the WebRTC frame classifier over the frames received since the
+    last tick, a call is active when at least vad_webrtc_ratio of them are
+    speech. Needs the optional webrtcvad package and 8/16/32/48 kHz audio.
+    """
+
+    name = 'webrtc'
+    sample_rates = (8000, 16000, 32000, 48000)
+
+    def __init__(self, config):
+        super().__init__(config)
+        try:
+            import webrtcvad
+        except ImportError:
+            raise ImportError("vad_engine 'webrtc' needs the webrtcvad package (pip install webrtcvad)")
+        if config.sample_rate not in self.sample_rates:
+            raise ValueError(f"vad_engine 'webrtc' does not support a sample rate of {config.sample_rate}")
+
+        self.webrtcvad = webrtcvad
+        self.mode = getattr(config, 'vad_webrtc_mode', 2)
+        self.ratio = getattr(config, 'vad_webrtc_ratio', 0.5)
+        self.sample_rate = config.sample_rate
+        frame_ms = getattr(config, 'vad_frame_ms', 20)
+        if frame_ms not in (10, 20, 30):
+            frame_ms = 20
+        self.frame_samples = int(self.sample_rate * frame_ms / 1000)
+        self.frames = max(1, self.interval_ms // frame_ms)
+        # The classifier expects signed 16 bit samples
+        self.scale = {1: 256.0, 2: 1.0, 4: 1.0 / 65536}.get(config.sample_width, 1.0)
+        self.classifiers = {}
+
+    def reset(self, slot):
+        super().reset(slot)
+        self.classifiers.pop(slot, None)
+
+    def classify(self, batch, n, out):
+        out[:] = False
+        frames = min(self.frames, batch.window // self.frame_samples)
+        if frames == 0:
+            return
+        count = frames * self.frame_samples
+        frame_bytes = self.frame_samples * 2
+        for slot in range(n):
+            if batch.total[slot] < count:
+                continue
+            classifier = self.classifiers.get(slot)
+            if classifier is None:
+                classifier = self.webrtcvad.Vad(self.mode)
+                self.classifiers[slot] = classifier
+
+            samples = batch.recent(slot, count) * self.scale
+            pcm = np.clip(samples, -32768, 32767).astype(np.int16).tobytes()
+            votes = 0
+            for start in range(0, len(pcm), frame_bytes):
+                if classifier.is_speech(pcm[start:start + frame_bytes], self.sample_rate):
+                    votes += 1
+            out[slot] = votes >= self.ratio * frames
+
+
+vad_engines = {
+    EnergyZcrEngine.name: EnergyZcrEngine,
+    AdaptiveNoiseEngine.name: AdaptiveNoiseEngine,
+    WebRtcEngine.name: WebRtcEngine,
+}
+
+
+def create_vad_engine(config):
+    """
+    Create the VAD engine named by vad_engine in config
+
+    Args:
+        config: sip_manager configuration
+
+    Returns:
+        VadEngine: Engine instance, the energy engine when the name is unknown
+    """
+    name = getattr(config, 'vad_engine', EnergyZcrEngine.name)
+    engine_class = vad_engines.get(name)
+    if engine_class is None:
+        logger.warning(f"Unknown vad_engine '{name}', using '{EnergyZcrEngine.name}'")
+        engine_class = EnergyZcrEngine
+    engine = engine_class(config)
+    logger.info(f"VAD engine: {engine.name} (attack {engine.attack_ms}ms, hangover {engine.hangover_ms}ms)")
+    return engine
@@ -0,0 +1,14 @@
+import os
+import sys
+import pytest
+from types import SimpleNamespace
+
+# Add the parent directory to sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+
+@pytest.fixture
+def config():
+    """Provide a sip_manager configuration with the defaults"""
+    from sip_manager.config import default_config
+    return SimpleNamespace(**default_config)
@@ -0,0 +1,87 @@
+import numpy as np
+import pytest
+
+# sip_manager imports pjsua2 when it is loaded
+pytest.importorskip("pjsua2")
+
+from sip_manager.capture import RingBuffer, CapturePort
+
+
+class TestRingBuffer:
+    """Test the RingBuffer class"""
+
+    def test_latest_before_full(self):
+        """Test reading back fewer samples than the capacity"""
+        ring = RingBuffer(8)
+        ring.write(np.arange(5, dtype=np.int16))
+        assert ring.total_written == 5
+        assert ring.latest(3).tolist() == [2, 3, 4]
+        assert ring.latest(100).tolist() == [0, 1, 2, 3, 4]
+
+    def test_latest_wraps_around(self):
+        """Test that the oldest samples are overwritten in order"""
+        ring = RingBuffer(8)
+        for start in range(0, 20, 3):
+            ring.write(np.arange(start, start + 3, dtype=np.int16))
+        assert ring.total_written == 21
+        assert ring.latest(8).tolist() == list(range(13, 21))
+
+    def test_write_larger_than_capacity(self):
+        """Test that a write bigger than the buffer keeps its tail"""
+        ring = RingBuffer(4)
+        ring.write(np.arange(10, dtype=np.int16))
+        assert ring.latest(4).tolist() == [6, 7, 8, 9]
+        ring.write(np.array([10], dtype=np.int16))
+        assert ring.latest(4).tolist() == [7, 8, 9, 10]
+
+    def test_read_range(self):
+        """Test reading by absolute sample position"""
+        ring = RingBuffer(8)
+        ring.write(np.arange(6, dtype=np.int16))
+        assert ring.read_range(1, 4).tolist() == [1, 2, 3]
+        ring.write(np.arange(6, 12, dtype=np.int16))
+        # Positions 0-3 were overwritten, the range is clipped to what is held
+        assert ring.read_range(2, 7).tolist() == [4, 5, 6]
+        assert ring.read_range(9, 20).tolist() == [9, 10, 11]
+        assert ring.read_range(7, 9).tolist() == [7, 8]
+
+    def test_read_range_empty(self):
+        """Test ranges outside of what was captured"""
+        ring = RingBuffer(8)
+        ring.write(np.arange(4, dtype=np.int16))
+        assert len(ring.read_range(4, 10)) == 0
+        assert len(ring.read_range(3, 2)) == 0
+
+    def test_read_range_ignores_later_writes(self):
+        """Test that a range read between writes is not shifted by them"""
+        ring = RingBuffer(16)
+        ring.write(np.arange(10, dtype=np.int16))
+        first = ring.read_range(2, 6)
+        ring.write(np.arange(10, 14, dtype=np.int16))
+        assert first.tolist() == [2, 3, 4, 5]
+        assert ring.read_range(2, 6).tolist() == [2, 3, 4, 5]
+
+
+class TestCapturePort:
+    """Test the sizing and reads of the CapturePort"""
+
+    def test_ring_holds_longest_segment_without_file(self, config):
+        """Test that without an archive file the ring is sized from max_segment_ms"""
+        config.record_to_file = False
+        config.capture_buffer_ms = 1000
+        config.max_segment_ms = 5000
+        port = CapturePort("call-1", config)
+        assert port.ring.capacity == config.sample_rate * 5
+
+        config.record_to_file = True
+        port = CapturePort("call-2", config)
+        assert port.ring.capacity == config.sample_rate
+
+    def test_read_pcm_logs_truncation(self, config, caplog):
+        """Test that audio no longer held is reported"""
+        config.capture_buffer_ms = 100
+        port = CapturePort("call-1", config)
+        port.ring.write(np.ones(config.sample_rate, dtype=np.int16))
+        pcm = port.read_pcm(0, 1000)
+        assert len(pcm) == port.ring.capacity * 2
+        assert "no longer held" in caplog.text
@@ -0,0 +1,69 @@
+import threading
+import time
+import pytest
+
+# sip_manager imports pjsua2 when it is loaded
+pytest.importorskip("pjsua2")
+
+from sip_manager.commands import CommandChannel, CommandType
+
+
+class TestCommandChannel:
+    """Test the CommandChannel class"""
+
+    def test_drain_runs_all_pending_in_order(self):
+        """Test that one drain runs every queued command in order"""
+        channel = CommandChannel()
+        for index in range(5):
+            channel.put(CommandType.PLAY_WAV, call_id="call-1", index=index)
+        ran = []
+        assert channel.drain(lambda command: ran.append(command['index'])) == 5
+        assert ran == list(range(5))
+        assert channel.drain(ran.append) == 0
+
+    def test_put_stamps_commands(self):
+        """Test that commands carry their type and enqueue times"""
+        channel = CommandChannel()
+        channel.put(CommandType.HANGUP, call_id="call-1", timestamp=1.0)
+        commands = []
+        channel.drain(commands.append)
+        assert commands[0]['type'] == CommandType.HANGUP
+        assert commands[0]['timestamp'] == 1.0
+        assert 'enqueued_at' in commands[0]
+
+    def test_wait_wakes_on_put(self):
+        """Test that a waiting thread wakes as soon as a command is queued"""
+        channel = CommandChannel()
+        assert not channel.wait(0.01)
+        timer = threading.Timer(0.05, channel.put, args=(CommandType.STOP_AUDIO,))
+        started = time.monotonic()
+        timer.start()
+        assert channel.wait(5)
+        assert time.monotonic() - started < 1
+        timer.join()
+
+    def test_wait_returns_at_once_when_pending(self):
+        """Test that wait does not block while commands are pending"""
+        channel = CommandChannel()
+        channel.put(CommandType.STOP_AUDIO)
+        channel.drain(lambda command: None)
+        channel.put(CommandType.STOP_AUDIO)
+        started = time.monotonic()
+        assert channel.wait(5)
+        assert time.monotonic() - started < 1
+
+    def test_failing_handler_is_counted(self):
+        """Test that a failing command is recorded and the rest still run"""
+        channel = CommandChannel()
+        channel.put(CommandType.TRANSFER, ok=False)
+        channel.put(CommandType.TRANSFER, ok=True)
+
+        def handler(command):
+            if not command['ok']:
+                raise RuntimeError("broken")
+
+        assert channel.drain(handler) == 2
+        metrics = channel.get_metrics()
+        assert metrics['pending'] == 0
+        assert metrics['commands'][CommandType.TRANSFER]['count'] == 2
+        assert metrics['commands'][CommandType.TRANSFER]['errors'] == 1
@@ -0,0 +1,139 @@
+import threading
+import pytest
+
+# sip_manager imports pjsua2 when it is loaded
+pytest.importorskip("pjsua2")
+
+from sip_manager.events import (EventType, EventDispatcher, EventMetrics, event_manager,
+                                ANY_EVENT, ANY_AGENT)
+
+
+class TestEventDispatcher:
+    """Test the EventDispatcher class"""
+
+    def setup_method(self):
+        """Set up test fixtures"""
+        self.metrics = EventMetrics()
+        self.dispatcher = EventDispatcher(self.metrics, workers=4)
+        self.dispatcher.start()
+
+    def teardown_method(self):
+        """Clean up test fixtures"""
+        self.dispatcher.stop()
+
+    def test_events_of_a_call_stay_in_order(self):
+        """Test that one call's events are handled in emit order"""
+        received = {}
+        done = threading.Event()
+
+        def listener(event_type, call_id, index, **kwargs):
+            received.setdefault(call_id, []).append(index)
+            if sum(len(indexes) for indexes in received.values()) == 400:
+                done.set()
+
+        for index in range(100):
+            for call_id in ("a", "b", "c", "d"):
+                self.dispatcher.submit((listener,), EventType.SPEECH_DETECTED,
+                                       {'call_id': call_id, 'index': index})
+        assert done.wait(5)
+        for call_id in ("a", "b", "c", "d"):
+            assert received[call_id] == list(range(100))
+
+    def test_calls_are_handled_in_parallel(self):
+        """Test that a blocking listener of one call does not hold up other calls"""
+        release = threading.Event()
+        handled = threading.Event()
+
+        def listener(event_type, call_id, **kwargs):
+            if call_id == "slow":
+                release.wait(5)
+            else:
+                handled.set()
+
+        slow_queue = hash("slow") % 4
+        other = next(call_id for call_id in map(str, range(100)) if hash(call_id) % 4 != slow_queue)
+        self.dispatcher.submit((listener,), EventType.SPEECH_DETECTED, {'call_id': "slow"})
+        self.dispatcher.submit((listener,), EventType.SPEECH_DETECTED, {'call_id': other})
+        assert handled.wait(5)
+        release.set()
+
+    def test_listener_errors_are_counted(self):
+        """Test that a failing listener is recorded and does not stop the worker"""
+        done = threading.Event()
+
+        def failing(event_type, **kwargs):
+            raise ValueError("broken")
+
+        def after(event_type, **kwargs):
+            done.set()
+
+        self.dispatcher.submit((failing, after), EventType.AUDIO_ENDED, {'call_id': "a"})
+        assert done.wait(5)
+        self.dispatcher.stop()
+        stats = self.metrics.snapshot()['handlers'][EventType.AUDIO_ENDED]
+        assert stats['count'] == 2
+        assert stats['errors'] == 1
+
+    def test_full_queue_drops(self):
+        """Test that a bounded queue drops events instead of blocking the emitter"""
+        metrics = EventMetrics()
+        dispatcher = EventDispatcher(metrics, workers=1, queue_size=1)
+        # Not started, so nothing is taken off the queue
+        dispatcher.submit((), EventType.AUDIO_ENDED, {'call_id': "a"})
+        dispatcher.submit((), EventType.AUDIO_ENDED, {'call_id': "a"})
+        assert metrics.snapshot()['dropped'] == 1
+        assert dispatcher.queue_depths() == [1]
+
+
+class TestListenerIndex:
+    """Test listener matching of the SipEventManager"""
+
+    def setup_method(self):
+        """Set up test fixtures"""
+        event_manager.configure("sync")
+        self.received = []
+        self.registered = []
+
+    def teardown_method(self):
+        """Clean up test fixtures"""
+        for event_type, callback, agent_id in self.registered:
+            event_manager.remove_listener(event_type, callback, agent_id)
+
+    def listen(self, name, event_type, agent_id=ANY_AGENT):
+        def callback(event_type, **kwargs):
+            self.received.append((name, event_type, kwargs.get('agent_id')))
+        event_manager.add_listener(event_type, callback, agent_id)
+        self.registered.append((event_type, callback, agent_id))
+        return callback
+
+    def test_agent_and_type_wildcards(self):
+        """Test that an event reaches exact, per-agent, per-type and catch-all listeners"""
+        self.listen("exact", EventType.CALL_ANSWERED, "test-agent-1")
+        self.listen("other-agent", EventType.CALL_ANSWERED, "test-agent-2")
+        self.listen("any-agent", EventType.CALL_ANSWERED)
+        self.listen("any-event", ANY_EVENT, "test-agent-1")
+        self.listen("other-type", EventType.AUDIO_ENDED, "test-agent-1")
+
+        event_manager.emit_event(EventType.CALL_ANSWERED, agent_id="test-agent-1", call_id="c")
+        names = [name for name, _, _ in self.received]
+        assert names == ["exact", "any-agent", "any-event"]
+
+    def test_event_without_agent_reaches_all_agents(self):
+        """Test that an event emitted without an agent is delivered to every agent's listeners"""
+        self.listen("agent-1", EventType.AGENT_STOPPED, "test-agent-1")
+        self.listen("agent-2", EventType.AGENT_STOPPED, "test-agent-2")
+        event_manager.emit_event(EventType.AGENT_STOPPED)
+        assert sorted(name for name, _, _ in self.received) == ["agent-1", "agent-2"]
+
+    def test_remove_listener(self):
+        """Test that a removed listener no longer receives events"""
+        callback = self.listen("gone", EventType.CALL_ANSWERED, "test-agent-1")
+        event_manager.remove_listener(EventType.CALL_ANSWERED, callback, "test-agent-1")
+        self.registered.clear()
+        event_manager.emit_event(EventType.CALL_ANSWERED, agent_id="test-agent-1")
+        assert self.received == []
+
+    def test_unknown_event_type(self):
+        """Test that listeners can not subscribe to unknown event types"""
+        self.listen("unknown", "no_such_event", "test-agent-1")
+        assert event_manager.match_listeners("no_such_event", "test-agent-1") == ()
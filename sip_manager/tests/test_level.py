@@ -0,0 +1,64 @@
+import os
+import shutil
+import tempfile
+import numpy as np
+import pytest
+
+# sip_manager imports pjsua2 when it is loaded
+pytest.importorskip("pjsua2")
+
+from sip_manager.level import TailReader
+
+
+class TestTailReader:
+    """Test the TailReader class"""
+
+    def setup_method(self):
+        """Set up test fixtures"""
+        self.temp_dir = tempfile.mkdtemp()
+
+    def teardown_method(self):
+        """Clean up test fixtures"""
+        shutil.rmtree(self.temp_dir)
+
+    def test_missing_file(self):
+        """Test reading a recording that does not exist yet"""
+        reader = TailReader(os.path.join(self.temp_dir, "call.pcm"))
+        samples, offset = reader.read_new(0)
+        assert len(samples) == 0
+        assert offset == 0
+
+    def test_reads_only_appended_samples(self):
+        """Test that each read returns what was appended since the last one"""
+        path = os.path.join(self.temp_dir, "call.pcm")
+        reader = TailReader(path)
+        with open(path, 'wb') as f:
+            f.write(np.arange(4, dtype=np.int16).tobytes())
+            f.flush()
+            samples, offset = reader.read_new(0)
+            assert samples.tolist() == [0, 1, 2, 3]
+            assert offset == 8
+
+            # Half a sample is left for the next read
+            f.write(np.arange(4, 7, dtype=np.int16).tobytes() + b'\x07')
+            f.flush()
+            samples, offset = reader.read_new(offset)
+            assert samples.tolist() == [4, 5, 6]
+            assert offset == 14
+
+            samples, offset = reader.read_new(offset)
+            assert len(samples) == 0
+            assert offset == 14
+        reader.close()
+        assert reader.handle is None
+
+    def test_skips_wav_header(self):
+        """Test that the 44 byte header of a WAV recording is not read as audio"""
+        path = os.path.join(self.temp_dir, "call.wav")
+        with open(path, 'wb') as f:
+            f.write(b'\xff' * 44 + np.array([5, -5], dtype=np.int16).tobytes())
+        reader = TailReader(path)
+        samples, offset = reader.read_new(0)
+        assert samples.tolist() == [5, -5]
+        assert offset == 48
+        reader.close()
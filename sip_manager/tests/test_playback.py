@@ -0,0 +1,162 @@
+import pytest
+
+# sip_manager imports pjsua2 when it is loaded
+pytest.importorskip("pjsua2")
+
+from sip_manager import playback
+from sip_manager.playback import PlaybackQueue
+from sip_manager.commands import CommandChannel, CommandType
+from sip_manager.events import EventType, event_manager
+
+
+class StubPlayer:
+    """Player of one item, records what it was connected to"""
+
+    def __init__(self, source, call_id, item_id, commands=None):
+        self.file_path = source
+        self.duration = 1.0
+        self.call_id = call_id
+        self.item_id = item_id
+        self.commands = commands
+        self.start_time = None
+        self.on_eof = None
+        self.connected = []
+        self.disconnected = []
+
+    def startTransmit(self, media):
+        self.connected.append(media)
+
+    def stopTransmit(self, media):
+        self.disconnected.append(media)
+
+    def reach_eof(self):
+        """What the end of file callback does on the media thread"""
+        if self.on_eof is not None:
+            self.on_eof(self)
+        self.commands.put(CommandType.PLAYBACK_EOF, call_id=self.call_id, item_id=self.item_id)
+
+
+class StubCall:
+    def __init__(self):
+        self.media = object()
+
+    def get_active_audio_media(self):
+        return self.media
+
+
+@pytest.fixture
+def queue(monkeypatch):
+    """A playback queue of stub players"""
+    opened = []
+
+    def create_player(source, call_id, item_id, commands=None):
+        player = StubPlayer(source, call_id, item_id, commands)
+        opened.append(player)
+        return player
+
+    monkeypatch.setattr(playback, 'create_player', create_player)
+    event_manager.configure("sync")
+    playback_queue = PlaybackQueue("call-1", StubCall(), agent_id="test-agent", commands=CommandChannel())
+    playback_queue.opened = opened
+    return playback_queue
+
+
+def run_commands(queue):
+    """Run the PLAYBACK_EOF commands like the PJSUA thread does"""
+    queue.commands.drain(lambda command: queue.item_finished(command['item_id']))
+
+
+class TestPlaybackQueue:
+    """Test the PlaybackQueue class"""
+
+    def test_first_item_starts_and_next_is_preloaded(self, queue):
+        """Test that enqueueing plays the first item and opens the second"""
+        queue.enqueue("a.wav")
+        queue.enqueue("b.wav")
+        assert queue.current.file_path == "a.wav"
+        assert queue.preloaded.file_path == "b.wav"
+        assert queue.current.connected == [queue.call.media]
+        assert queue.preloaded.connected == []
+
+    def test_next_item_connects_on_eof(self, queue):
+        """Test that the end of file callback connects the next item before the PJSUA thread runs"""
+        queue.enqueue("a.wav")
+        queue.enqueue("b.wav")
+        queue.enqueue("c.wav")
+        first, second = queue.current, queue.preloaded
+
+        first.reach_eof()
+        # Still on the media thread: the next item is already audible
+        assert second.connected == [queue.call.media]
+        assert queue.handed_off is second
+
+        run_commands(queue)
+        assert first.disconnected == [queue.call.media]
+        assert queue.current is second
+        assert second.connected == [queue.call.media]
+        assert queue.preloaded.file_path == "c.wav"
+        assert queue.handed_off is None
+
+    def test_drained(self, queue):
+        """Test that the last item's end reports the queue drained"""
+        events = []
+        callback = lambda event_type, **data: events.append(event_type)
+        event_manager.add_listener(EventType.PLAYBACK_QUEUE_DRAINED, callback, "test-agent")
+        try:
+            queue.enqueue("a.wav")
+            queue.current.reach_eof()
+            run_commands(queue)
+        finally:
+            event_manager.remove_listener(EventType.PLAYBACK_QUEUE_DRAINED, callback, "test-agent")
+        assert queue.idle
+        assert events == [EventType.PLAYBACK_QUEUE_DRAINED]
+        assert queue.opened[0].disconnected == [queue.call.media]
+
+    def test_skip_after_handoff_skips_audible_item(self, queue):
+        """Test that skipping between the handoff and its command skips the item being heard"""
+        queue.enqueue("a.wav")
+        queue.enqueue("b.wav")
+        queue.enqueue("c.wav")
+        first = queue.current
+        first.reach_eof()
+        second = queue.handed_off
+
+        assert queue.skip()
+        assert second.disconnected == [queue.call.media]
+        assert queue.current.file_path == "c.wav"
+        # The late end of file report of the first item is ignored
+        run_commands(queue)
+        assert queue.current.file_path == "c.wav"
+
+    def test_play_now_interrupts(self, queue):
+        """Test that play_now disconnects the current item and drops the queue"""
+        queue.enqueue("a.wav")
+        queue.enqueue("b.wav")
+        first = queue.current
+        queue.play_now("urgent.wav")
+        assert first.disconnected == [queue.call.media]
+        assert queue.current.file_path == "urgent.wav"
+        assert len(queue) == 0
+
+    def test_stale_eof_does_not_hand_off(self, queue):
+        """Test that the end of a player that is no longer current connects nothing"""
+        queue.enqueue("a.wav")
+        queue.enqueue("b.wav")
+        first = queue.current
+        queue.skip()
+        second = queue.current
+        queue.enqueue("c.wav")
+        first.reach_eof()
+        assert queue.handed_off is None
+        assert queue.preloaded.connected == []
+        run_commands(queue)
+        assert queue.current is second
+
+    def test_close_disconnects_everything(self, queue):
+        """Test that closing the queue disconnects the playing item"""
+        queue.enqueue("a.wav")
+        queue.enqueue("b.wav")
+        first = queue.current
+        queue.close()
+        assert first.disconnected == [queue.call.media]
+        assert queue.idle
@@ -0,0 +1,123 @@
+import os
+import numpy as np
+import pytest
+
+# sip_manager imports pjsua2 when it is loaded
+pytest.importorskip("pjsua2")
+
+from sip_manager.prompt_cache import PromptCache, read_wav, write_wav
+
+
+def make_prompt(path, seconds=0.5, rate=24000, frequency=440):
+    t = np.arange(int(rate * seconds)) / rate
+    write_wav(str(path), (8000 * np.sin(2 * np.pi * frequency * t)).astype(np.int16), rate)
+    return str(path)
+
+
+class TestPromptCache:
+    """Test the PromptCache class"""
+
+    def setup_method(self):
+        self.cache = None
+
+    def create(self, directory, **kwargs):
+        self.cache = PromptCache(sample_rate=8000, cache_dir=str(directory), **kwargs)
+        return self.cache
+
+    def play(self, file_path):
+        """Resolve a file and wait for a conversion it started"""
+        path = self.cache.resolve(file_path)
+        self.cache.queue.join()
+        return path
+
+    def test_converted_after_min_plays(self, tmp_path):
+        """Test that a file is played as is until it was played min_plays times"""
+        prompt = make_prompt(tmp_path / "greeting.wav")
+        cache = self.create(tmp_path / "cache", min_plays=2)
+        assert self.play(prompt) == prompt
+        assert cache.get_metrics()['conversions'] == 0
+        assert self.play(prompt) == prompt
+        converted = self.play(prompt)
+        assert converted != prompt
+        samples, rate = read_wav(converted)
+        assert rate == 8000
+        assert abs(len(samples) - 4000) <= 2
+        metrics = cache.get_metrics()
+        assert metrics['conversions'] == 1
+        assert metrics['hits'] == 1
+        assert metrics['disk_bytes'] == os.path.getsize(converted)
+
+    def test_one_off_files_are_not_converted(self, tmp_path):
+        """Test that files played once never reach the disk"""
+        cache = self.create(tmp_path / "cache", min_plays=2)
+        for n in range(5):
+            prompt = make_prompt(tmp_path / f"reply_{n}.wav")
+            assert self.play(prompt) == prompt
+        assert os.listdir(tmp_path / "cache") == []
+        assert cache.get_metrics()['conversions'] == 0
+
+    def test_tracked_plays_are_bounded(self, tmp_path):
+        """Test that only max_tracked unconverted files are counted"""
+        cache = self.create(tmp_path / "cache", max_tracked=3)
+        for n in range(10):
+            self.play(make_prompt(tmp_path / f"reply_{n}.wav", seconds=0.01))
+        assert len(cache.plays) == 3
+
+    def test_same_content_is_converted_once(self, tmp_path):
+        """Test that copies of a prompt share one converted file"""
+        first = make_prompt(tmp_path / "a.wav")
+        second = make_prompt(tmp_path / "b.wav")
+        cache = self.create(tmp_path / "cache", min_plays=1)
+        self.play(first)
+        self.play(second)
+        assert self.play(first) == self.play(second)
+        assert cache.get_metrics()['conversions'] == 1
+
+    def test_changed_file_is_converted_again(self, tmp_path):
+        """Test that a rewritten prompt does not play its old copy"""
+        prompt = make_prompt(tmp_path / "greeting.wav")
+        cache = self.create(tmp_path / "cache", min_plays=1)
+        self.play(prompt)
+        old = self.play(prompt)
+        make_prompt(tmp_path / "greeting.wav", seconds=0.25, frequency=880)
+        os.utime(prompt, ns=(1, 1))
+        self.play(prompt)
+        new = self.play(prompt)
+        assert new != old
+        assert abs(len(read_wav(new)[0]) - 2000) <= 2
+
+    def test_disk_limit_evicts_least_recently_played(self, tmp_path):
+        """Test that the oldest converted files are removed over disk_mb"""
+        prompts = [make_prompt(tmp_path / f"p{n}.wav", frequency=200 + n * 100) for n in range(3)]
+        # Each converted file is 8000 bytes of samples plus the header
+        cache = self.create(tmp_path / "cache", min_plays=1, disk_mb=20000 / (1024 * 1024))
+        first = self.play(prompts[0]) and self.play(prompts[0])
+        self.play(prompts[1])
+        self.play(prompts[0])
+        self.play(prompts[2])
+        files = os.listdir(tmp_path / "cache")
+        assert len(files) == 2
+        assert os.path.basename(first) in files
+        assert cache.get_metrics()['disk_bytes'] <= 20000
+        # The evicted prompt is played as is and converted again
+        assert self.play(prompts[1]) == prompts[1]
+
+    def test_existing_files_are_picked_up(self, tmp_path):
+        """Test that converted files of an earlier run count towards the limit and are reused"""
+        prompt = make_prompt(tmp_path / "greeting.wav")
+        self.create(tmp_path / "cache", min_plays=1)
+        self.play(prompt)
+        converted = self.play(prompt)
+
+        cache = self.create(tmp_path / "cache", min_plays=1)
+        assert cache.get_metrics()['disk_bytes'] == os.path.getsize(converted)
+        self.play(prompt)
+        assert self.play(prompt) == converted
+        assert cache.get_metrics()['conversions'] == 0
+
+    def test_missing_file(self, tmp_path):
+        """Test that a missing file is passed through for the player to report"""
+        cache = self.create(tmp_path / "cache")
+        missing = str(tmp_path / "missing.wav")
+        assert cache.resolve(missing) == missing
+        assert cache.get_metrics()['misses'] == 0
@@ -0,0 +1,64 @@
+import pytest
+
+# sip_manager imports pjsua2 when it is loaded
+pytest.importorskip("pjsua2")
+
+from sip_manager.registry import CallRegistry
+
+
+class TestCallRegistry:
+    """Test the CallRegistry class"""
+
+    def setup_method(self):
+        """Set up test fixtures"""
+        self.registry = CallRegistry()
+
+    def test_add_and_lookup(self):
+        """Test that calls are found by their Call-ID"""
+        call = object()
+        entry = self.registry.add("call-1", call, agent_id="agent-1")
+        assert self.registry.get("call-1") is entry
+        assert self.registry.find_call("call-1") is call
+        assert entry.agent_id == "agent-1"
+        assert "call-1" in self.registry
+        assert len(self.registry) == 1
+        assert self.registry.get("call-2") is None
+        assert self.registry.find_call("call-2") is None
+
+    def test_add_twice_keeps_entry(self):
+        """Test that registering a known call returns its existing entry"""
+        entry = self.registry.add("call-1", object())
+        entry.confirmed = True
+        assert self.registry.add("call-1", object()) is entry
+        assert self.registry.get("call-1").confirmed
+
+    def test_remove(self):
+        """Test that a removed call is no longer known"""
+        entry = self.registry.add("call-1", object())
+        assert self.registry.remove("call-1") is entry
+        assert self.registry.remove("call-1") is None
+        assert "call-1" not in self.registry
+
+    def test_first_is_oldest(self):
+        """Test that first() returns the call registered first"""
+        assert self.registry.first() is None
+        first = self.registry.add("call-1", object())
+        self.registry.add("call-2", object())
+        assert self.registry.first() is first
+
+    def test_recorders(self):
+        """Test that only calls being recorded are listed"""
+        self.registry.add("call-1", object()).recorder = "recorder-1"
+        self.registry.add("call-2", object())
+        assert self.registry.recorders() == [("call-1", "recorder-1")]
+
+    def test_iteration_survives_removal(self):
+        """Test that removing calls while iterating does not break the iteration"""
+        for index in range(5):
+            self.registry.add(f"call-{index}", object())
+        seen = []
+        for entry in self.registry:
+            seen.append(entry.call_id)
+            self.registry.remove(entry.call_id)
+        assert len(seen) == 5
+        assert len(self.registry) == 0
@@ -0,0 +1,113 @@
+import numpy as np
+import pytest
+
+# sip_manager imports pjsua2 when it is loaded
+pytest.importorskip("pjsua2")
+
+from sip_manager.stream import StreamBuffer
+from sip_manager.resample import Resampler
+
+
+def pcm(samples):
+    return np.asarray(samples, dtype='<i2').tobytes()
+
+
+class TestStreamBuffer:
+    """Test the StreamBuffer class"""
+
+    def test_prebuffer_holds_back_playback(self):
+        """Test that silence is played until prebuffer_ms is buffered"""
+        stream = StreamBuffer(8000, sample_rate=8000, prebuffer_ms=10)
+        stream.write(pcm([1] * 40))
+        assert stream.read(40) == bytes(80)
+        stream.write(pcm([2] * 40))
+        assert np.frombuffer(stream.read(40), dtype=np.int16).tolist() == [1] * 40
+        assert not stream.started or stream.samples_played == 40
+
+    def test_finish_starts_short_stream(self):
+        """Test that a finished stream plays even below the prebuffer"""
+        stream = StreamBuffer(8000, sample_rate=8000, prebuffer_ms=1000)
+        stream.write(pcm([7] * 10))
+        stream.finish()
+        out = np.frombuffer(stream.read(20), dtype=np.int16)
+        assert out.tolist() == [7] * 10 + [0] * 10
+        assert stream.drained
+        assert stream.underruns == 0
+
+    def test_underrun_is_counted(self):
+        """Test that a producer falling behind pads with silence and counts it"""
+        stream = StreamBuffer(8000, sample_rate=8000, prebuffer_ms=0)
+        stream.write(pcm([3] * 5))
+        out = np.frombuffer(stream.read(10), dtype=np.int16)
+        assert out.tolist() == [3] * 5 + [0] * 5
+        assert stream.underruns == 1
+        assert not stream.drained
+
+    def test_odd_byte_chunks(self):
+        """Test that chunks split inside a sample are joined again"""
+        stream = StreamBuffer(8000, sample_rate=8000, prebuffer_ms=0)
+        data = pcm([256, -2, 300])
+        stream.write(data[:3])
+        stream.write(data[3:])
+        stream.finish()
+        assert np.frombuffer(stream.read(3), dtype=np.int16).tolist() == [256, -2, 300]
+
+    def test_reads_across_chunks(self):
+        """Test that a frame is assembled from several written chunks"""
+        stream = StreamBuffer(8000, sample_rate=8000, prebuffer_ms=0)
+        for value in range(1, 6):
+            stream.write(pcm([value] * 3))
+        stream.finish()
+        assert np.frombuffer(stream.read(7), dtype=np.int16).tolist() == [1, 1, 1, 2, 2, 2, 3]
+        assert np.frombuffer(stream.read(8), dtype=np.int16).tolist() == [3, 3, 4, 4, 4, 5, 5, 5]
+        assert stream.drained
+
+    def test_write_after_finish_is_ignored(self):
+        """Test that writes to a finished stream are dropped"""
+        stream = StreamBuffer(8000, sample_rate=8000)
+        stream.finish()
+        stream.write(pcm([1] * 10))
+        assert stream.samples_written == 0
+
+    def test_resamples_to_bridge_rate(self):
+        """Test that 24 kHz TTS audio is converted to the 8 kHz bridge rate"""
+        stream = StreamBuffer(24000, sample_rate=8000)
+        stream.write(pcm(np.zeros(2400)))
+        assert stream.duration == pytest.approx(0.1, abs=0.001)
+
+
+class TestResampler:
+    """Test the Resampler class"""
+
+    def tone(self, rate, frequency, seconds):
+        t = np.arange(int(rate * seconds)) / rate
+        return (8000 * np.sin(2 * np.pi * frequency * t)).astype(np.int16)
+
+    def test_passthrough(self):
+        """Test that equal rates return the input"""
+        samples = np.arange(10, dtype=np.int16)
+        assert Resampler(8000, 8000).process(samples) is samples
+
+    @pytest.mark.parametrize("source, target", [(24000, 8000), (8000, 16000), (16000, 8000)])
+    def test_length_across_chunks(self, source, target):
+        """Test that chunked input yields the expected number of output samples"""
+        resampler = Resampler(source, target)
+        signal = self.tone(source, 440, 1.0)
+        out = np.concatenate([resampler.process(chunk) for chunk in np.array_split(signal, 37)])
+        assert abs(len(out) - target) <= 2
+
+    def test_chunked_matches_whole(self):
+        """Test that feeding chunks gives the same output as one call"""
+        signal = self.tone(24000, 300, 0.5)
+        whole = Resampler(24000, 8000).process(signal)
+        resampler = Resampler(24000, 8000)
+        chunked = np.concatenate([resampler.process(chunk) for chunk in np.array_split(signal, 13)])
+        assert len(chunked) == len(whole)
+        assert np.max(np.abs(chunked.astype(int) - whole.astype(int))) <= 1
+
+    def test_downsampling_filters_aliases(self):
+        """Test that a tone above the new Nyquist frequency is suppressed"""
+        out = Resampler(24000, 8000).process(self.tone(24000, 7000, 0.5))
+        passed = Resampler(24000, 8000).process(self.tone(24000, 500, 0.5))
+        rms = lambda x: np.sqrt(np.mean(x[100:].astype(np.float64) ** 2))
+        assert rms(out) < rms(passed) / 10
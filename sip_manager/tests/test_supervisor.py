@@ -0,0 +1,273 @@
+import time
+import queue
+import pytest
+from types import SimpleNamespace
+
+# sip_manager imports pjsua2 when it is loaded
+pytest.importorskip("pjsua2")
+
+from sip_manager.supervisor import AgentPool, portable
+from sip_manager.events import EventType
+from sip_manager.commands import CommandType
+
+
+class StubProcess:
+    """Stands in for a worker process, nothing is started"""
+
+    started = []
+
+    def __init__(self, name=None, target=None, args=()):
+        self.name = name
+        self.args = args
+        self.pid = 1000 + len(StubProcess.started)
+        self.alive = False
+        self.exitcode = None
+        self.terminated = False
+        self.daemon = False
+
+    def start(self):
+        self.alive = True
+        StubProcess.started.append(self)
+
+    def is_alive(self):
+        return self.alive
+
+    def terminate(self):
+        self.terminated = True
+        self.alive = False
+        self.exitcode = -15
+
+    def join(self, timeout=None):
+        pass
+
+
+@pytest.fixture
+def pool(config):
+    """An AgentPool whose workers are stub processes with plain command queues"""
+    config.workers = 2
+    config.pool_distribution = 'none'
+    config.pool_heartbeat_timeout = 5.0
+    config.pool_start_timeout = 30.0
+    StubProcess.started = []
+    pool = AgentPool(config, agent_id="test-pool")
+    pool.context = SimpleNamespace(Process=StubProcess, Queue=queue.Queue)
+    pool.running.set()
+    for index in range(pool.size):
+        pool._start_worker(index)
+    yield pool
+    pool.running.clear()
+
+
+def commands_of(pool, index):
+    """Get the commands queued for a worker"""
+    commands = []
+    while True:
+        try:
+            commands.append(pool.workers[index]['commands'].get_nowait())
+        except queue.Empty:
+            return commands
+
+
+class TestCallRouting:
+    """Test that commands reach the worker owning the call"""
+
+    def test_routes_to_owner(self, pool):
+        """Test that a call's commands go to the worker that answered it"""
+        pool._handle_event(1, EventType.CALL_ANSWERED, {'call_id': "call-1", 'agent_id': "test-pool-1"})
+        pool._handle_event(0, EventType.CALL_ANSWERED, {'call_id': "call-2", 'agent_id': "test-pool-0"})
+        assert list(pool.call_counts) == [1, 1]
+
+        assert pool.hangup("call-1")
+        assert pool.play_wav_to_call("hello.wav", "call-2")
+        assert [command['type'] for command in commands_of(pool, 1)] == [CommandType.HANGUP]
+        assert [command['file_path'] for command in commands_of(pool, 0)] == ["hello.wav"]
+
+    def test_unknown_call(self, pool):
+        """Test that commands for a call no worker owns are dropped"""
+        assert not pool.stop_audio("nobody")
+        assert commands_of(pool, 0) == [] and commands_of(pool, 1) == []
+
+    def test_disconnect_releases_call(self, pool):
+        """Test that a disconnected call is no longer routed or counted"""
+        pool._handle_event(0, EventType.CALL_ANSWERED, {'call_id': "call-1"})
+        pool._handle_event(0, EventType.SPEECH_DETECTED, {'call_id': "call-1"})
+        assert pool.call_counts[0] == 1
+        pool._handle_event(0, EventType.CALL_DISCONNECTED, {'call_id': "call-1"})
+        assert pool.call_counts[0] == 0
+        assert "call-1" not in pool.call_owner
+        assert not pool.hangup("call-1")
+
+    def test_events_are_reemitted_under_pool_id(self, pool):
+        """Test that worker events carry the pool's agent ID and their worker"""
+        received = []
+        callback = lambda event_type, **data: received.append(data)
+        pool.register_event(EventType.SPEECH_DETECTED, callback)
+        try:
+            pool._handle_event(1, EventType.SPEECH_DETECTED, {'call_id': "call-1", 'agent_id': "test-pool-1"})
+        finally:
+            pool.unregister_event(EventType.SPEECH_DETECTED, callback)
+        deadline = time.monotonic() + 5
+        while not received and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert received[0]['agent_id'] == "test-pool"
+        assert received[0]['worker'] == 1
+        assert received[0]['worker_agent_id'] == "test-pool-1"
+
+    def test_portable_drops_unpicklable_values(self):
+        """Test that values that can not cross the process boundary are dropped"""
+        data = portable({'call_id': "call-1", 'info': (lambda: None), 'segment': {'start_ms': 1}})
+        assert data == {'call_id': "call-1", 'segment': {'start_ms': 1}}
+
+
+class TestWorkerRestarts:
+    """Test the supervision of the worker processes"""
+
+    def test_healthy_workers_are_kept(self, pool):
+        """Test that workers sending heartbeats are left alone"""
+        assert pool._check_workers() == []
+        assert len(StubProcess.started) == 2
+
+    def test_restart_on_missed_heartbeat(self, pool):
+        """Test that a hung worker is terminated and replaced"""
+        pool._handle_event(1, EventType.CALL_ANSWERED, {'call_id': "call-1"})
+        for worker in pool.workers:
+            worker['ready'] = True
+        hung = pool.workers[1]['process']
+        pool.workers[1]['last_heartbeat'] = time.time() - 10
+
+        assert pool._check_workers() == [1]
+        assert hung.terminated
+        assert pool.workers[1]['process'] is not hung
+        assert pool.workers[1]['process'].is_alive()
+        assert pool.workers[1]['restarts'] == 1
+        # Calls of the old process are gone with it
+        assert "call-1" not in pool.call_owner
+        assert pool.call_counts[1] == 0
+        assert not pool.workers[0]['process'].terminated
+
+    def test_start_timeout_before_first_heartbeat(self, pool):
+        """Test that a worker still starting up gets start_timeout, not heartbeat_timeout"""
+        pool.workers[0]['last_heartbeat'] = time.time() - 10
+        assert pool._check_workers() == []
+        pool.workers[0]['last_heartbeat'] = time.time() - 31
+        assert pool._check_workers() == [0]
+
+    def test_restart_on_exit(self, pool):
+        """Test that a worker that exited is started again"""
+        pool.workers[0]['process'].alive = False
+        pool.workers[0]['process'].exitcode = 1
+        assert pool._check_workers() == [0]
+        assert len(StubProcess.started) == 3
+
+    def test_restart_on_stuck_pjsua_thread(self, pool):
+        """Test that a worker whose heartbeats come but whose PJSUA thread is stuck is restarted"""
+        pool.messages = queue.Queue()
+        pool.messages.put(('heartbeat', 0, {'pid': 1, 'loop_age': 0.05}))
+        pool.messages.put(('heartbeat', 1, {'pid': 2, 'loop_age': 12.0}))
+        pool.messages.put(None)
+        pool._pump_messages()
+        stuck = pool.workers[1]['process']
+
+        assert [status['healthy'] for status in pool.worker_status()] == [True, False]
+        assert pool._check_workers() == [1]
+        assert stuck.terminated
+        assert pool.workers[1]['last_loop'] is None
+
+    def test_heartbeat_marks_worker_ready(self, pool):
+        """Test that any message from a worker counts as a heartbeat"""
+        pool.workers[0]['last_heartbeat'] = 0
+        pool.messages = queue.Queue()
+        pool.messages.put(('heartbeat', 0, {'pid': 1}))
+        pool.messages.put(None)
+        pool._pump_messages()
+        assert pool.workers[0]['ready']
+        assert pool.workers[0]['stats'] == {'pid': 1}
+        assert time.time() - pool.workers[0]['last_heartbeat'] < 5
+
+
+class StubAgent:
+    """Agent of a worker, records the commands it is sent"""
+
+    def __init__(self):
+        self.sent = []
+
+    def start_nonblocking(self):
+        return True
+
+    def is_running(self):
+        return True
+
+    def send_command(self, command_type, **params):
+        self.sent.append(command_type)
+
+    def loop_age(self):
+        return 0.01
+
+    def command_metrics(self):
+        return {}
+
+    def prompt_cache_metrics(self):
+        return {}
+
+    def stop(self):
+        pass
+
+
+class TestWorkerMain:
+    """Test the loop of a worker process"""
+
+    def test_heartbeats_follow_the_timer(self, config, monkeypatch):
+        """Test that a flood of commands does not send a heartbeat per command"""
+        import sip_manager
+        from sip_manager.supervisor import worker_main
+
+        agent = StubAgent()
+        monkeypatch.setattr(sip_manager, 'create_agent', lambda config, agent_id=None: agent)
+        monkeypatch.setattr(sip_manager, 'shutdown_events', lambda: None)
+        commands, messages = queue.Queue(), queue.Queue()
+        for _ in range(200):
+            commands.put({'type': CommandType.STREAM_WRITE, 'call_id': "call-1", 'pcm': b'\0' * 320})
+        commands.put(None)
+
+        worker_main(0, config, "test-worker-0", commands, messages, heartbeat_interval=60)
+
+        assert len(agent.sent) == 200
+        sent = []
+        while not messages.empty():
+            sent.append(messages.get())
+        kinds = [message[0] for message in sent]
+        assert kinds.count('heartbeat') == 1
+        heartbeat = [message for message in sent if message[0] == 'heartbeat'][0]
+        assert heartbeat[2]['loop_age'] == 0.01
+
+
+class TestPooledStream:
+    """Test streams played by a pool worker"""
+
+    def test_play_stream_forwards_to_owner(self, pool):
+        """Test that a stream's start, chunks and end are sent to the worker owning the call"""
+        pool._handle_event(1, EventType.CALL_ANSWERED, {'call_id': "call-1"})
+        stream = pool.play_stream("call-1", 24000, enqueue=True)
+        assert stream is not None
+        stream.write(b'\x01\x00' * 10)
+        stream.finish()
+
+        commands = commands_of(pool, 1)
+        assert [command['type'] for command in commands] == [
+            CommandType.PLAY_STREAM, CommandType.STREAM_WRITE, CommandType.STREAM_END]
+        assert commands[0]['stream_id'].startswith("test-pool-")
+        assert {command['stream_id'] for command in commands} == {stream.stream_id}
+        assert commands[0]['sample_rate'] == 24000
+        assert commands[0]['enqueue'] is True
+        assert commands[1]['pcm'] == b'\x01\x00' * 10
+
+    def test_stream_ids_are_unique(self, pool):
+        """Test that every stream gets its own ID"""
+        pool._handle_event(0, EventType.CALL_ANSWERED, {'call_id': "call-1"})
+        first = pool.play_stream("call-1", 8000)
+        second = pool.play_stream("call-1", 8000)
+        assert first.stream_id != second.stream_id
+
+    def test_play_stream_unknown_call(self, pool):
+        """Test that no stream is returned for a call no worker owns"""
+        assert pool.play_stream("nobody", 8000) is None
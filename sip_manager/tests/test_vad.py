@@ -0,0 +1,165 @@
+import threading
+import numpy as np
+import pytest
+
+# sip_manager imports pjsua2 when it is loaded
+pytest.importorskip("pjsua2")
+
+from sip_manager.vad import BatchVad
+from sip_manager.vad_engine import EnergyZcrEngine, AdaptiveNoiseEngine, create_vad_engine
+
+
+def window_features(samples, window):
+    """RMS and zero-crossing rate of the last window samples, computed directly"""
+    held = np.asarray(samples[-window:], dtype=np.float64)
+    rms = np.sqrt(np.mean(held * held))
+    crossings = np.count_nonzero(np.signbit(held[1:]) != np.signbit(held[:-1]))
+    return rms, crossings / len(held)
+
+
+def tone(count, amplitude=1000, period=40):
+    return (amplitude * np.sin(np.arange(count) * 2 * np.pi / period)).astype(np.int16)
+
+
+class TestBatchVad:
+    """Test the BatchVad class"""
+
+    def test_running_sums_match_window(self):
+        """Test that the incremental sums equal a full pass over the window"""
+        rng = np.random.default_rng(1)
+        vad = BatchVad(100)
+        slot = vad.add("call-1")
+        written = []
+        for size in [7, 30, 1, 64, 99, 100, 3, 250, 17, 160] * 3:
+            chunk = rng.integers(-3000, 3000, size, dtype=np.int16)
+            written.extend(chunk)
+            vad.write(slot, chunk)
+            vad.process()
+            rms, zcr = window_features(written, 100)
+            assert vad.features(slot)[0] == pytest.approx(rms, rel=1e-5)
+            assert vad.features(slot)[1] == pytest.approx(zcr)
+            assert vad.features(slot)[3] == len(written)
+
+    def test_partial_window(self):
+        """Test that a window not yet full only averages what it holds"""
+        vad = BatchVad(1000)
+        slot = vad.add("call-1")
+        vad.write(slot, np.full(10, 300, dtype=np.int16))
+        vad.process()
+        rms, zcr, noise, total = vad.features(slot)
+        assert rms == pytest.approx(300)
+        assert zcr == 0
+        assert total == 10
+
+    def test_rows_are_independent(self):
+        """Test that calls only see their own audio"""
+        vad = BatchVad(80)
+        loud = vad.add("loud")
+        quiet = vad.add("quiet")
+        vad.write(loud, tone(200, amplitude=5000))
+        vad.write(quiet, np.zeros(200, dtype=np.int16))
+        vad.process()
+        assert vad.features(loud)[0] > 3000
+        assert vad.features(quiet)[0] == 0
+
+    def test_reused_row_starts_empty(self):
+        """Test that a removed call's row is cleared for the next one"""
+        vad = BatchVad(50)
+        slot = vad.add("old")
+        vad.write(slot, tone(120))
+        vad.remove("old")
+        assert vad.add("new") == slot
+        vad.write(slot, np.full(5, 10, dtype=np.int16))
+        vad.process()
+        assert vad.features(slot)[0] == pytest.approx(10)
+        assert vad.features(slot)[3] == 5
+
+    def test_grows_past_max_calls(self):
+        """Test that rows are added beyond max_calls, keeping existing ones"""
+        vad = BatchVad(20, max_calls=2)
+        first = vad.add("call-0")
+        vad.write(first, np.full(20, 100, dtype=np.int16))
+        for i in range(1, 5):
+            vad.add(f"call-{i}")
+        assert vad.rows >= 5
+        vad.process()
+        assert vad.features(first)[0] == pytest.approx(100)
+
+    def test_unsigned_samples(self):
+        """Test that 8 bit samples are centered before the features"""
+        vad = BatchVad(10, sample_width=1)
+        slot = vad.add("call-1")
+        vad.write(slot, np.full(10, 128, dtype=np.uint8))
+        vad.process()
+        assert vad.features(slot)[0] == 0
+
+    def test_writes_during_growth(self):
+        """Test that writes from another thread survive rows being added"""
+        vad = BatchVad(64, max_calls=1)
+        slot = vad.add("call-0")
+        stop = threading.Event()
+
+        def writer():
+            while not stop.is_set():
+                vad.write(slot, np.full(16, 200, dtype=np.int16))
+
+        thread = threading.Thread(target=writer)
+        thread.start()
+        try:
+            for i in range(1, 200):
+                vad.add(f"call-{i}")
+                vad.process()
+        finally:
+            stop.set()
+            thread.join()
+        vad.process()
+        assert vad.features(slot)[0] == pytest.approx(200)
+
+
+class TestVadEngines:
+    """Test the speech decisions of the VAD engines"""
+
+    def make(self, config, engine_name, **settings):
+        config.vad_engine = engine_name
+        config.silence_check_interval = 20
+        config.vad_attack_ms = 40
+        config.vad_hangover_ms = 100
+        for name, value in settings.items():
+            setattr(config, name, value)
+        vad = BatchVad(160, engine=create_vad_engine(config))
+        return vad, vad.add("call-1")
+
+    def tick(self, vad, slot, samples, ticks):
+        decisions = []
+        for _ in range(ticks):
+            vad.write(slot, samples)
+            vad.process()
+            decisions.append(vad.is_speech(slot))
+        return decisions
+
+    def test_attack_and_hangover(self, config):
+        """Test that speech starts after attack_ms and ends after hangover_ms"""
+        vad, slot = self.make(config, 'energy', silence_threshold=100)
+        assert isinstance(vad.engine, EnergyZcrEngine)
+        assert self.tick(vad, slot, tone(160), 3) == [False, True, True]
+        # A pause shorter than the hangover keeps the call speaking
+        assert self.tick(vad, slot, np.zeros(160, dtype=np.int16), 6) == [True] * 4 + [False] * 2
+        assert vad.engine.silence_ms[slot] == 120
+
+    def test_energy_rejects_noise(self, config):
+        """Test that loud audio crossing zero too often is not speech"""
+        vad, slot = self.make(config, 'energy', silence_threshold=100, vad_zcr_max=0.4)
+        hiss = np.tile(np.array([2000, -2000], dtype=np.int16), 80)
+        assert not any(self.tick(vad, slot, hiss, 5))
+
+    def test_adaptive_follows_noise_floor(self, config):
+        """Test that the adaptive engine wants speech well above the call's noise"""
+        vad, slot = self.make(config, 'adaptive', vad_noise_ratio=3.0, vad_min_rms=30)
+        assert isinstance(vad.engine, AdaptiveNoiseEngine)
+        assert not any(self.tick(vad, slot, tone(160, amplitude=200), 10))
+        assert self.tick(vad, slot, tone(160, amplitude=5000), 3)[-1]
+
+    def test_unknown_engine(self, config):
+        """Test that an unknown engine name falls back to the energy engine"""
+        config.vad_engine = 'nope'
+        assert isinstance(create_vad_engine(config), EnergyZcrEngine)
@@ -0,0 +1,121 @@
+import time
+
+from echomatrix.call import CallStore, Call
+
+
+class TestCallStore:
+    """Test the CallStore class"""
+
+    def setup_method(self):
+        self.store = CallStore(archive_ttl=600, persisted_ttl=30, max_archived=1000)
+
+    def end(self, call_id, now):
+        self.store.get_or_create(call_id)
+        self.store.archive(call_id)
+        # Backdate the archive time
+        call, expires = self.store.archived[call_id]
+        self.store.archived[call_id] = (call, now + self.store.archive_ttl)
+
+    def test_get_or_create(self):
+        """Test that a call is created once and found again"""
+        call = self.store.get_or_create("a")
+        assert isinstance(call, Call)
+        assert self.store.get_or_create("a") is call
+        assert "a" in self.store
+        assert len(self.store) == 1
+
+    def test_archived_call_is_found_but_not_iterated(self):
+        """Test that an ended call is still found by id"""
+        call = self.store.get_or_create("a")
+        assert self.store.archive("a") is call
+        assert self.store.get("a") is call
+        assert list(self.store) == []
+
+    def test_archive_ttl_expires_on_lookup(self):
+        """Test that an ended call is evicted by a lookup once its time is up"""
+        self.end("a", time.time() - 601)
+        self.end("b", time.time())
+        assert self.store.get("a") is None
+        assert self.store.get("b") is not None
+        assert "a" not in self.store
+
+    def test_persisted_calls_expire_early(self):
+        """Test that a saved call is evicted persisted_ttl after it was saved"""
+        self.end("a", time.time())
+        self.end("b", time.time())
+        self.store.persisted("b")
+        assert self.store.expire(time.time() + 31) == 1
+        assert "a" in self.store
+        assert "b" not in self.store
+
+    def test_persisted_never_extends(self):
+        """Test that saving a call that is about to expire does not keep it longer"""
+        self.end("a", time.time() - 590)
+        self.store.persisted("a")
+        assert self.store.expire(time.time() + 11) == 1
+
+    def test_overflow_evicts_oldest(self):
+        """Test that the oldest ended calls are evicted beyond max_archived"""
+        self.store.configure(max_archived=3)
+        for n in range(5):
+            self.store.get_or_create(str(n))
+            self.store.archive(str(n))
+        assert list(self.store.archived) == ["2", "3", "4"]
+
+    def test_event_for_evicted_call(self):
+        """Test that a late event for an evicted call does not revive it"""
+        self.end("a", time.time() - 601)
+        self.store.expire()
+        late = self.store.get_or_create("a")
+        assert isinstance(late, Call)
+        assert "a" not in self.store
+        assert len(self.store) == 0
+
+    def test_expire_only_looks_at_due_calls(self):
+        """Test that expiring with nothing due leaves every call in place"""
+        for n in range(100):
+            self.end(str(n), time.time())
+        assert self.store.expire() == 0
+        assert len(self.store.archived) == 100
+
+
+class TestCall:
+    """Test the records of a Call"""
+
+    def test_events_are_reduced_to_plain_data(self):
+        """Test that objects an event carries are dropped from its record"""
+        call = Call(call_id="a")
+        call.add_event("call_answered", {'call_id': "a", 'call': object(), 'info': {'codec': "PCMU", 'port': object()}})
+        record = call.to_dict()['events'][0]
+        assert record['event_type'] == "call_answered"
+        assert record['call_id'] == "a"
+        assert record['info'] == {'codec': "PCMU"}
+        assert 'call' not in record
+
+    def test_event_history_is_bounded(self):
+        """Test that only key events are kept for the whole call"""
+        call = Call(call_id="a")
+        for n in range(Call.event_history + 50):
+            call.add_event("audio_level", {'level': n})
+        call.add_event("call_disconnected", {})
+        data = call.to_dict()
+        assert len(data['recent_events']) == Call.event_history
+        assert data['recent_events'][0]['level'] == 50
+        assert [event['event_type'] for event in data['events']] == ["call_disconnected"]
+
+    def test_chat_processed_state(self):
+        """Test that the call is processed once every message is"""
+        call = Call(call_id="a")
+        call.add_chat_message("user", "hello")
+        assert not call.update_processed_state()
+        call.chat[0].processed = time.time()
+        assert call.update_processed_state()
+        assert call.to_dict()['chat'][0]['text'] == "hello"
+
+    def test_outgoing_audio_by_reference(self):
+        """Test that played audio is recorded by path with its plain metadata"""
+        call = Call(call_id="a")
+        call.add_outgoing_audio("/tmp/reply.wav", {'text': "hi", 'samples': object()})
+        assert call.to_dict()['outgoing_audio'][0]['path'] == "/tmp/reply.wav"
+        assert call.to_dict()['outgoing_audio'][0]['text'] == "hi"
+        assert 'samples' not in call.to_dict()['outgoing_audio'][0]
@@ -0,0 +1,107 @@
+import os
+import json
+
+from echomatrix.call import Call
+from echomatrix.call_log import CallLogWriter
+
+
+class BrokenCall(Call):
+    """A call whose log can not be built"""
+
+    def to_dict(self):
+        raise ValueError("broken")
+
+
+def entry(call_id):
+    return (call_id, Call(call_id=call_id).to_dict())
+
+
+def circular(call_id):
+    """A record json can not encode"""
+    record = Call(call_id=call_id).to_dict()
+    record['metadata']['self'] = record
+    return (call_id, record)
+
+
+class TestCallLogWriter:
+    """Test the CallLogWriter class"""
+
+    def setup_method(self):
+        self.written = []
+
+    def create(self, directory, **kwargs):
+        return CallLogWriter(str(directory), on_written=self.written.append, **kwargs)
+
+    def records(self, writer):
+        with open(writer.segment_path) as f:
+            return [json.loads(line) for line in f]
+
+    def test_writes_submitted_calls(self, tmp_path):
+        """Test that queued calls are written as JSON lines when the writer stops"""
+        writer = self.create(tmp_path)
+        writer.start()
+        for n in range(3):
+            writer.submit(Call(call_id=f"call-{n}"))
+        writer.stop()
+        assert [record['id'] for record in self.records(writer)] == ["call-0", "call-1", "call-2"]
+        assert self.written == ["call-0", "call-1", "call-2"]
+        assert writer.get_metrics()['written'] == 3
+
+    def test_snapshot_failure_is_not_queued(self, tmp_path):
+        """Test that a call whose log can not be built is counted as an error and not queued"""
+        writer = self.create(tmp_path)
+        writer.submit(BrokenCall(call_id="bad"))
+        metrics = writer.get_metrics()
+        assert metrics['errors'] == 1
+        assert metrics['pending'] == 0
+
+    def test_events_after_submit_are_not_logged(self, tmp_path):
+        """Test that events added to a call after submit() neither break nor change its log"""
+        writer = self.create(tmp_path)
+        call = Call(call_id="late")
+        call.add_event("dtmf", {'digit': "1"})
+        writer.submit(call)
+        call.add_event("dtmf", {'digit': "2"})
+        writer.start()
+        writer.stop()
+        [record] = self.records(writer)
+        assert [event['digit'] for event in record['recent_events']] == ["1"]
+        assert self.written == ["late"]
+
+    def test_encoding_failure_is_not_reported_written(self, tmp_path):
+        """Test that a call whose log failed to encode is neither written nor reported"""
+        writer = self.create(tmp_path)
+        os.makedirs(writer.directory, exist_ok=True)
+        writer.write_batch([entry("good"), circular("bad"), entry("also-good")])
+        writer.close_segment()
+        assert [record['id'] for record in self.records(writer)] == ["good", "also-good"]
+        assert self.written == ["good", "also-good"]
+        metrics = writer.get_metrics()
+        assert metrics['written'] == 2
+        assert metrics['errors'] == 1
+
+    def test_batch_of_failures_opens_no_segment(self, tmp_path):
+        """Test that a batch with nothing encoded writes nothing"""
+        writer = self.create(tmp_path)
+        writer.write_batch([circular("bad")])
+        assert writer.segment is None
+        assert self.written == []
+
+    def test_yaml_export(self, tmp_path):
+        """Test that the snapshot of a call is also exported as YAML"""
+        writer = self.create(tmp_path, yaml_export=True)
+        os.makedirs(writer.directory, exist_ok=True)
+        writer.write_batch([entry("exported")])
+        writer.close_segment()
+        assert any(name.startswith("call_exported_") for name in os.listdir(tmp_path))
+
+    def test_segment_rotation(self, tmp_path):
+        """Test that a new segment is started once the current one is full"""
+        writer = self.create(tmp_path, segment_mb=1 / (1024 * 1024))
+        os.makedirs(writer.directory, exist_ok=True)
+        writer.write_batch([entry("first")])
+        first = writer.segment_path
+        writer.write_batch([entry("second")])
+        writer.close_segment()
+        assert writer.segment_path != first
+        assert len(os.listdir(tmp_path)) == 2
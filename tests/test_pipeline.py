@@ -0,0 +1,84 @@
+import threading
+
+from echomatrix.call import Call
+from echomatrix.pipeline import TurnScheduler
+
+
+class BlockingHandler:
+    """Turn handler that holds each turn until the test releases it"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.release = threading.Event()
+        self.started = threading.Semaphore(0)
+        self.turns = []
+        self.running = {}
+        self.overlaps = 0
+
+    def __call__(self, call):
+        with self.lock:
+            if self.running.get(call.id):
+                self.overlaps += 1
+            self.running[call.id] = True
+            self.turns.append(call.id)
+        self.started.release()
+        self.release.wait(5)
+        with self.lock:
+            self.running[call.id] = False
+
+
+class TestTurnScheduler:
+    """Test the TurnScheduler class"""
+
+    def setup_method(self):
+        self.handler = BlockingHandler()
+        self.scheduler = TurnScheduler(self.handler, workers=4)
+
+    def teardown_method(self):
+        self.handler.release.set()
+        self.scheduler.shutdown()
+
+    def test_calls_run_concurrently(self):
+        """Test that turns of different calls run at the same time"""
+        for call_id in ("a", "b", "c"):
+            assert self.scheduler.schedule(Call(call_id=call_id))
+        for _ in range(3):
+            assert self.handler.started.acquire(timeout=5)
+        assert sorted(self.handler.turns) == ["a", "b", "c"]
+        assert self.scheduler.pending() == 3
+
+    def test_rescheduled_call_runs_once_more(self):
+        """Test that a call scheduled while running gets one more turn, not one per schedule"""
+        call = Call(call_id="a")
+        assert self.scheduler.schedule(call)
+        assert self.handler.started.acquire(timeout=5)
+        assert self.scheduler.busy(call)
+        for _ in range(3):
+            assert not self.scheduler.schedule(call)
+        self.handler.release.set()
+        assert self.handler.started.acquire(timeout=5)
+        self.scheduler.shutdown()
+        assert self.handler.turns == ["a", "a"]
+        assert self.handler.overlaps == 0
+        assert not self.scheduler.busy(call)
+
+    def test_failing_turn(self):
+        """Test that an exception of a turn does not stop the call from being scheduled again"""
+        done = threading.Event()
+
+        def handler(call):
+            done.set()
+            raise RuntimeError("bad turn")
+
+        scheduler = TurnScheduler(handler, workers=1)
+        call = Call(call_id="a")
+        assert scheduler.schedule(call)
+        assert done.wait(5)
+        scheduler.shutdown()
+        assert not scheduler.busy(call)
+
+    def test_no_turns_after_shutdown(self):
+        """Test that calls are not accepted once the scheduler stopped"""
+        self.handler.release.set()
+        self.scheduler.shutdown()
+        assert not self.scheduler.schedule(Call(call_id="a"))
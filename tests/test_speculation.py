@@ -0,0 +1,95 @@
+import threading
+
+from echomatrix.speculation import Speculator
+
+
+class StubModel:
+    """Transcriber and reply generator whose replies are released by the test"""
+
+    def __init__(self, transcript="what time do you open"):
+        self.transcript = transcript
+        self.release = threading.Event()
+        self.requests = []
+        self.closed = threading.Event()
+
+    def transcribe(self, segment):
+        return self.transcript
+
+    def generate(self, messages):
+        self.requests.append(messages)
+        try:
+            yield "We open "
+            self.release.wait(5)
+            yield "at nine."
+        finally:
+            self.closed.set()
+
+
+class TestSpeculator:
+    """Test the Speculator class"""
+
+    def setup_method(self):
+        self.model = StubModel()
+        self.speculator = Speculator(self.model.transcribe, self.model.generate, max_per_call=3, workers=2)
+
+    def teardown_method(self):
+        self.model.release.set()
+        self.speculator.shutdown()
+
+    def test_commit_replays_and_follows(self):
+        """Test that a committed speculation yields what was generated and the rest"""
+        segment = {'start_ms': 1000, 'end_ms': 2000}
+        self.speculator.start("a", segment, [{"role": "system", "content": "Be brief"}], 1)
+        speculation = self.speculator.commit("a", {'start_ms': 1000, 'end_ms': 2500}, 1)
+        assert speculation.transcript == "what time do you open"
+        self.model.release.set()
+        assert "".join(speculation.pieces()) == "We open at nine."
+        assert self.model.requests[0][-1] == {"role": "user", "content": "what time do you open"}
+        assert self.speculator.get_metrics()['committed'] == 1
+
+    def test_commit_of_other_segment(self):
+        """Test that a speculation on another segment is cancelled instead of committed"""
+        speculation = self.speculator.start("a", {'start_ms': 1000, 'end_ms': 2000}, [], 1)
+        assert self.speculator.commit("a", {'start_ms': 3000, 'end_ms': 4000}, 1) is None
+        assert speculation.cancelled
+
+    def test_commit_after_new_messages(self):
+        """Test that a speculation based on an older conversation is not used"""
+        self.speculator.start("a", {'start_ms': 1000}, [], 1)
+        assert self.speculator.commit("a", {'start_ms': 1000}, 2) is None
+
+    def test_restart_cancels_previous(self):
+        """Test that speech resuming and pausing again replaces the running speculation"""
+        first = self.speculator.start("a", {'start_ms': 1000, 'end_ms': 2000}, [], 1)
+        second = self.speculator.start("a", {'start_ms': 1000, 'end_ms': 3000}, [], 1)
+        assert first.cancelled
+        assert not second.cancelled
+        assert self.speculator.commit("a", {'start_ms': 1000}, 1) is second
+
+    def test_cancelled_reply_closes_the_stream(self):
+        """Test that cancelling stops the generation and closes its stream"""
+        speculation = self.speculator.start("a", {'start_ms': 1000}, [], 1)
+        with speculation.condition:
+            assert speculation.condition.wait_for(lambda: speculation.parts, 5)
+        self.speculator.cancel("a")
+        self.model.release.set()
+        assert self.model.closed.wait(5)
+        assert speculation.done
+        assert self.speculator.commit("a", {'start_ms': 1000}, 1) is None
+
+    def test_limit_per_call(self):
+        """Test that no more than max_per_call speculations start per call"""
+        for _ in range(3):
+            assert self.speculator.start("a", {'start_ms': 1000}, [], 1) is not None
+        assert self.speculator.start("a", {'start_ms': 1000}, [], 1) is None
+        assert self.speculator.start("b", {'start_ms': 1000}, [], 1) is not None
+        self.speculator.forget("a")
+        assert self.speculator.start("a", {'start_ms': 1000}, [], 1) is not None
+        assert self.speculator.get_metrics()['limited'] == 1
+
+    def test_empty_transcript(self):
+        """Test that a segment without words is not answered"""
+        self.model.transcript = ""
+        self.speculator.start("a", {'start_ms': 1000}, [], 1)
+        assert self.speculator.commit("a", {'start_ms': 1000}, 1) is None
+        assert self.model.requests == []